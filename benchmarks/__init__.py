@@ -0,0 +1,5 @@
+"""
+Benchmarks del servidor Second Brain (ejecutar con `python -m benchmarks.<nombre>`)
+
+Los benchmarks que hablan HTTP con la app necesitan además `pip install httpx`.
+"""
@@ -0,0 +1,126 @@
+"""
+Benchmark de ráfagas de llamadas caras
+
+Arranca el servidor (uvicorn) con `--notes` notas y simula el fan-out de
+ChatGPT: `--clients` clientes piden a la vez, en bucle, el widget
+(`resources/read`) y una página grande de `get_notes`, todos con los mismos
+parámetros. Mientras tanto otro proceso mide la latencia de `initialize`,
+que no debería notar la ráfaga (en un proceso aparte para no medir también
+la cola del bucle de eventos de los clientes). Al final muestra cuántas peticiones se
+resolvieron compartiendo una ejecución en vuelo y cuántas se descartaron
+con la cola de admisión llena (de GET /metrics).
+
+Uso:
+    python -m benchmarks.bench_admission --notes 10000 --clients 64 --seconds 10
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.bench_cold_start import populate
+from benchmarks.bench_workers import free_port, wait_ready
+from benchmarks.harness import percentile
+
+HEAVY_CALLS = [
+    {"method": "resources/read", "params": {"uri": "ui://widget/second-brain.html"}},
+    {"method": "tools/call", "params": {"name": "get_notes", "arguments": {"limit": 1000}}},
+]
+
+
+async def burst(url: str, clients: int, deadline: float) -> Dict[str, List[float]]:
+    latencies: Dict[str, List[float]] = {"ok": [], "busy": []}
+
+    async def worker(offset: int) -> None:
+        # Un cliente (una conexión) por trabajador: un pool compartido de muchas
+        # conexiones gasta más CPU en repartirlas que el propio servidor
+        async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+            i = offset
+            while time.perf_counter() < deadline:
+                message = dict(HEAVY_CALLS[i % len(HEAVY_CALLS)], jsonrpc="2.0", id=i)
+                start = time.perf_counter()
+                response = await client.post("/mcp", json=message)
+                response.raise_for_status()
+                latencies["busy" if b'"error"' in response.content[:64] else "ok"].append(time.perf_counter() - start)
+                i += clients
+    await asyncio.gather(*(worker(i) for i in range(clients)))
+    return latencies
+
+
+def probe(url: str, seconds: float, interval: float) -> List[float]:
+    latencies = []
+    message = {"jsonrpc": "2.0", "id": 0, "method": "initialize", "params": {}}
+    deadline = time.perf_counter() + seconds
+    with httpx.Client(base_url=url, timeout=60) as client:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = client.post("/mcp", json=message)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+            time.sleep(interval)
+    return latencies
+
+
+def metric_total(text: str, name: str) -> float:
+    return sum(float(value) for value in re.findall(rf"^{name}{{[^}}]*}} (\S+)$", text, re.MULTILINE))
+
+
+async def run(url: str, clients: int, seconds: float) -> None:
+    with ProcessPoolExecutor(1) as pool:
+        probing = asyncio.wrap_future(pool.submit(probe, url, seconds, 0.01))
+        heavy = await burst(url, clients, time.perf_counter() + seconds)
+        initialize = await probing
+    async with httpx.AsyncClient(base_url=url) as client:
+        exposition = (await client.get("/metrics")).text
+
+    def summary(values: List[float]) -> str:
+        values = sorted(values)
+        if not values:
+            return "-"
+        return f"p50 {percentile(values, 50) * 1000:7.2f} ms  p99 {percentile(values, 99) * 1000:7.2f} ms"
+
+    print(f"  caras      {len(heavy['ok']):6d} ok  {summary(heavy['ok'])}  ({len(heavy['ok']) / seconds:.0f} req/s)")
+    print(f"  ocupado    {len(heavy['busy']):6d}     {summary(heavy['busy'])}")
+    print(f"  initialize {len(initialize):6d}     {summary(initialize)}")
+    print(
+        f"  coalescidas {metric_total(exposition, 'second_brain_coalesced_requests_total'):.0f}"
+        f"  descartadas {metric_total(exposition, 'second_brain_admission_shed_total'):.0f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=10_000)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="notes-admission-")
+    populate(data_dir, args.notes)
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server_python.main:app",
+         "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        env=dict(os.environ, NOTES_DATA_DIR=data_dir),
+    )
+    try:
+        asyncio.run(wait_ready(url))
+        print(f"{args.notes} notas, {args.clients} clientes durante {args.seconds:.0f} s")
+        asyncio.run(run(url, args.clients, args.seconds))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
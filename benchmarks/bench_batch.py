@@ -0,0 +1,76 @@
+"""
+Benchmark de lotes JSON-RPC en /mcp
+
+Compara 100 llamadas a herramientas enviadas una a una frente a un único lote,
+contra la app en proceso (ASGI) o contra un servidor real con --url.
+
+Uso:
+    python -m benchmarks.bench_batch --calls 100 --notes 1000
+    python -m benchmarks.bench_batch --url http://localhost:8000
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.bench_recovery import make_note
+
+
+def tool_call(request_id: int) -> dict:
+    # Mezcla de lecturas con alguna escritura intercalada
+    if request_id % 10 == 0:
+        name, arguments = "create_note", {"title": f"Nota {request_id}"}
+    elif request_id % 2:
+        name, arguments = "get_note", {"note_id": str(request_id % 50 + 1)}
+    else:
+        name, arguments = "search_notes", {"query": "arquitectura programación", "limit": 5}
+    return {"jsonrpc": "2.0", "id": request_id, "method": "tools/call", "params": {"name": name, "arguments": arguments}}
+
+
+async def run(client: httpx.AsyncClient, calls: int, rounds: int) -> None:
+    messages = [tool_call(i) for i in range(calls)]
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in messages:
+            response = await client.post("/mcp", json=message)
+            response.raise_for_status()
+    sequential = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        response = await client.post("/mcp", json=messages)
+        response.raise_for_status()
+        assert len(response.json()) == calls
+    batched = (time.perf_counter() - start) / rounds
+
+    print(f"{calls} llamadas una a una: {sequential * 1000:8.2f} ms")
+    print(f"{calls} llamadas en lote:   {batched * 1000:8.2f} ms  ({sequential / batched:.1f}x)")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--notes", type=int, default=1000, help="notas precargadas (solo en proceso)")
+    parser.add_argument("--url", help="servidor real en lugar de la app en proceso")
+    args = parser.parse_args()
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url) as client:
+            await run(client, args.calls, args.rounds)
+        return
+
+    from server_python.main import app, store
+
+    for i in range(args.notes):
+        store.create(make_note(i))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await run(client, args.calls, args.rounds)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
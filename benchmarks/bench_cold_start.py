@@ -0,0 +1,93 @@
+"""
+Benchmark de arranque en frío
+
+Lanza el servidor (uvicorn, proceso nuevo) contra un directorio de datos con
+`--notes` notas en un snapshot y mide el tiempo desde el lanzamiento hasta
+el primer `tools/call` con respuesta correcta, como la primera llamada de
+ChatGPT tras despertar el servicio. Muestra también las fases de arranque
+que el servidor publica en GET /ready.
+
+Uso:
+    python -m benchmarks.bench_cold_start --notes 0 10000 100000 --iterations 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.bench_recovery import make_note
+from benchmarks.bench_workers import free_port
+from server_python.store import LogStorage, NoteStore
+
+
+def populate(directory: str, count: int) -> None:
+    store = NoteStore(LogStorage(directory, snapshot_every=10 ** 12)).open()
+    store.create_many([make_note(i) for i in range(count)])
+    header = {"seq": store.version, "next_id": store.ids.next_id}
+    store.storage.snapshot(header, store.all(), background=False)
+    store.close()
+
+
+def cold_start(data_dir: str, tool: str, timeout: float) -> tuple:
+    """(segundos hasta el primer tools/call correcto, fases de /ready)"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    message = {"jsonrpc": "2.0", "id": 1, "method": "tools/call", "params": {"name": tool, "arguments": {}}}
+    env = dict(os.environ, NOTES_DATA_DIR=data_dir)
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server_python.main:app",
+         "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        env=env,
+    )
+    try:
+        with httpx.Client(base_url=url, timeout=timeout) as client:
+            while True:
+                if time.perf_counter() - start > timeout:
+                    raise RuntimeError(f"Sin respuesta correcta en {timeout}s")
+                try:
+                    response = client.post("/mcp", json=message)
+                except httpx.TransportError:
+                    time.sleep(0.005)
+                    continue
+                if response.status_code == 200 and "result" in response.json():
+                    elapsed = time.perf_counter() - start
+                    break
+                time.sleep(0.005)
+            phases = client.get("/ready").json().get("startup", {})
+    finally:
+        server.terminate()
+        server.wait()
+    return elapsed, phases
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, nargs="+", default=[0, 10_000, 100_000])
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--tool", default="get_notes", help="herramienta de la primera llamada")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    for count in args.notes:
+        data_dir = tempfile.mkdtemp(prefix="notes-cold-")
+        populate(data_dir, count)
+        times = []
+        for _ in range(args.iterations):
+            elapsed, phases = cold_start(data_dir, args.tool, args.timeout)
+            times.append(elapsed)
+        detail = "  ".join(f"{phase} {ms:.0f}" for phase, ms in phases.items())
+        print(
+            f"{count:8d} notas: primer {args.tool} en p50 {statistics.median(times) * 1000:7.0f} ms"
+            f"  (mín {min(times) * 1000:.0f}, máx {max(times) * 1000:.0f})  fases (ms): {detail}"
+        )
+
+
+if __name__ == "__main__":
+    main()
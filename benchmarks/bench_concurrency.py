@@ -0,0 +1,130 @@
+"""
+Prueba de estrés de escrituras concurrentes
+
+Lanza `--writers` tareas que crean y borran notas a la vez a través del
+escritor único (WriteQueue), mientras otras tareas del mismo bucle y un hilo
+aparte leen snapshots del store. Al final comprueba que:
+
+    - no se ha perdido ninguna alta y ningún ID se ha repetido
+    - cada nota se ha borrado como mucho una vez (los borrados repetidos fallan)
+    - todo snapshot leído era consistente (su longitud es la de sus notas) y
+      las versiones vistas por cada lector nunca retroceden
+    - los índices (búsqueda) tienen exactamente las notas del store
+
+y muestra el rendimiento en escrituras por segundo para cada backend.
+
+Uso:
+    python -m benchmarks.bench_concurrency --writers 50 --ops 200 --backend memory log sqlite
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from benchmarks.bench_recovery import make_note
+from server_python.search import SearchIndex
+from server_python.store import LogStorage, MemoryStorage, NoteStore, SQLiteStorage, WriteQueue
+
+
+def make_store(backend: str) -> NoteStore:
+    if backend == "memory":
+        return NoteStore(MemoryStorage()).open()
+    directory = tempfile.mkdtemp(prefix="notes-concurrency-")
+    if backend == "log":
+        return NoteStore(LogStorage(directory)).open()
+    return NoteStore(SQLiteStorage(os.path.join(directory, "notes.db"))).open()
+
+
+def check_snapshot(snapshot, versions: list) -> None:
+    notes = list(snapshot)
+    assert len(notes) == len(snapshot), f"snapshot {snapshot.version}: {len(notes)} notas, len {len(snapshot)}"
+    assert len({n["id"] for n in notes}) == len(notes), f"snapshot {snapshot.version}: IDs repetidos"
+    assert not versions or snapshot.version >= versions[-1], "la versión retrocede"
+    versions.append(snapshot.version)
+
+
+async def run(backend: str, writers: int, ops: int, seed: int) -> None:
+    store = make_store(backend)
+    index = store.subscribe(SearchIndex())
+    queue = WriteQueue(store)
+    rng = random.Random(seed)
+    created: list = []
+    deleted: Counter = Counter()
+    done = threading.Event()
+
+    async def writer(w: int) -> None:
+        for i in range(ops):
+            if created and rng.random() < 0.3:
+                # A propósito se eligen a veces notas ya borradas: el borrado debe fallar
+                note_id = rng.choice(created)
+                if await queue.delete(note_id) is not None:
+                    deleted[note_id] += 1
+            elif rng.random() < 0.1:
+                notes = await queue.create_many([make_note(w * ops + i + k) for k in range(10)])
+                created.extend(n["id"] for n in notes)
+            else:
+                note = await queue.create(make_note(w * ops + i))
+                created.append(note["id"])
+
+    async def reader() -> int:
+        versions: list = []
+        while not done.is_set():
+            check_snapshot(store.snapshot, versions)
+            await asyncio.sleep(0)
+        return len(versions)
+
+    thread_reads = []
+
+    def thread_reader() -> None:
+        versions: list = []
+        while not done.is_set():
+            check_snapshot(store.snapshot, versions)
+        thread_reads.append(len(versions))
+
+    thread = threading.Thread(target=thread_reader)
+    thread.start()
+    readers = [asyncio.create_task(reader()) for _ in range(4)]
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(writer(w) for w in range(writers)))
+        await queue.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        done.set()
+        thread.join()
+    reads = sum(await asyncio.gather(*readers)) + sum(thread_reads)
+
+    assert len(created) == len(set(created)), "IDs repetidos"
+    assert max(deleted.values(), default=0) <= 1, "una nota se borró dos veces"
+    live = set(created) - set(deleted)
+    assert {n["id"] for n in store.all()} >= live and len(store) == len(live), "el store no cuadra con las escrituras"
+    assert len(store.snapshot) == len(store) and store.snapshot.version == store.version
+    assert len(index) == len(store), f"índice con {len(index)} notas, store con {len(store)}"
+    store.close()
+
+    writes = len(created) + len(deleted)
+    print(
+        f"{backend:>7}: {writers} escritores x {ops} ops -> {len(created)} altas, {len(deleted)} bajas en {elapsed:.2f} s"
+        f"  ({writes / elapsed:,.0f} escrituras/s, versión {store.version}, {reads:,} snapshots leídos)  OK"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=50)
+    parser.add_argument("--ops", type=int, default=200, help="operaciones por escritor")
+    parser.add_argument("--backend", nargs="+", default=["memory", "log", "sqlite"], choices=["memory", "log", "sqlite"])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    for backend in args.backend:
+        asyncio.run(run(backend, args.writers, args.ops, args.seed))
+
+
+if __name__ == "__main__":
+    main()
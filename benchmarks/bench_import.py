@@ -0,0 +1,86 @@
+"""
+Benchmark de importación masiva de notas
+
+Compara el throughput (notas/s) de importar con `create_note` una a una
+frente a la herramienta `create_notes` y a POST /notes/bulk (array JSON y
+NDJSON), contra la app en proceso (ASGI). Cada escenario parte de un store
+con `--existing` notas para que se note el coste de mantener los índices.
+
+Uso:
+    python -m benchmarks.bench_import --notes 20000 --batch 5000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from benchmarks.bench_recovery import make_note
+
+
+def rpc(request_id: int, name: str, arguments: dict) -> dict:
+    return {"jsonrpc": "2.0", "id": request_id, "method": "tools/call", "params": {"name": name, "arguments": arguments}}
+
+
+async def one_by_one(client: httpx.AsyncClient, notes: list, batch: int) -> None:
+    for i, note in enumerate(notes):
+        response = await client.post("/mcp", json=rpc(i, "create_note", note))
+        response.raise_for_status()
+
+
+async def tool_batches(client: httpx.AsyncClient, notes: list, batch: int) -> None:
+    for start in range(0, len(notes), batch):
+        response = await client.post("/mcp", json=rpc(start, "create_notes", {"notes": notes[start:start + batch]}))
+        assert "result" in response.json()
+
+
+async def bulk_json(client: httpx.AsyncClient, notes: list, batch: int) -> None:
+    for start in range(0, len(notes), batch):
+        response = await client.post("/notes/bulk", json=notes[start:start + batch])
+        response.raise_for_status()
+
+
+async def bulk_ndjson(client: httpx.AsyncClient, notes: list, batch: int) -> None:
+    for start in range(0, len(notes), batch):
+        body = "".join(json.dumps(n, ensure_ascii=False) + "\n" for n in notes[start:start + batch])
+        response = await client.post("/notes/bulk", content=body.encode("utf-8"), headers={"Content-Type": "application/x-ndjson"})
+        response.raise_for_status()
+
+
+SCENARIOS = {
+    "create_note": one_by_one,
+    "create_notes": tool_batches,
+    "bulk json": bulk_json,
+    "bulk ndjson": bulk_ndjson,
+}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=20_000, help="notas a importar por escenario")
+    parser.add_argument("--batch", type=int, default=5_000, help="notas por lote")
+    parser.add_argument("--existing", type=int, default=10_000, help="notas ya presentes antes de importar")
+    parser.add_argument("--one-by-one", type=int, default=2_000, help="notas para el escenario create_note (es lento)")
+    args = parser.parse_args()
+
+    from server_python.main import app, store
+
+    store.create_many([make_note(i) for i in range(args.existing)])
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        offset = args.existing
+        for name, scenario in SCENARIOS.items():
+            count = args.one_by_one if scenario is one_by_one else args.notes
+            notes = [make_note(offset + i) for i in range(count)]
+            offset += count
+            start = time.perf_counter()
+            await scenario(client, notes, args.batch)
+            elapsed = time.perf_counter() - start
+            print(f"{name:14s} {count:8d} notas en {elapsed:7.2f} s  {count / elapsed:10,.0f} notas/s")
+    print(f"Total en el store: {len(store)} notas")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""
+Benchmark de memoria por nota
+
+Compara, para cada tamaño, la memoria que ocupan las notas:
+
+    dicts      un dict por nota indexado por ID, decodificado del JSON como
+               hace la recuperación (la representación anterior del store)
+    columnar   el NoteStore actual: bloques columnares con categorías y
+               etiquetas como códigos y fechas como ordinales
+
+Mide con tracemalloc los bytes que quedan vivos tras construir cada uno (sin
+índices secundarios), y de paso el tiempo de construcción y el de serializar
+todas las notas a JSON, que en el formato columnar materializa los dicts.
+
+Uso:
+    python -m benchmarks.bench_memory --notes 100000 1000000
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from benchmarks.bench_recovery import make_note
+from server_python.serialization import dumps, loads
+from server_python.store import MemoryStorage, NoteStore
+
+BATCH = 10_000
+
+
+def encoded_batches(count: int):
+    """Lotes de notas con ID como líneas JSON, para decodificarlas igual que al recuperar"""
+    start = date(2023, 1, 1)
+    for first in range(0, count, BATCH):
+        notes = []
+        for i in range(first, min(count, first + BATCH)):
+            note = make_note(i)
+            note["id"] = str(i + 1)
+            note["createdAt"] = (start + timedelta(days=i % 1000)).isoformat()
+            notes.append(dumps(note))
+        yield notes
+
+
+def build_dicts(count: int):
+    notes = {}
+    for batch in encoded_batches(count):
+        for line in batch:
+            note = loads(line)
+            notes[note["id"]] = note
+    return notes
+
+
+def build_columnar(count: int):
+    store = NoteStore(MemoryStorage())
+    for batch in encoded_batches(count):
+        store.create_many([loads(line) for line in batch])
+    return store
+
+
+def serialize_all(layout) -> float:
+    start = time.perf_counter()
+    if isinstance(layout, NoteStore):
+        layout.snapshot.encode()
+    else:
+        dumps(list(layout.values()))
+    return time.perf_counter() - start
+
+
+def measure(build, count: int):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    layout = build(count)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return layout, used, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'notas':>9}  {'formato':<9} {'bytes/nota':>10} {'total MB':>9} {'construir s':>11} {'serializar s':>12}")
+    for count in args.notes:
+        results = {}
+        for name, build in (("dicts", build_dicts), ("columnar", build_columnar)):
+            layout, used, elapsed = measure(build, count)
+            serialize = serialize_all(layout)
+            del layout
+            results[name] = used
+            print(
+                f"{count:9d}  {name:<9} {used / count:10.0f} {used / 2 ** 20:9.1f} {elapsed:11.2f} {serialize:12.2f}"
+            )
+        print(f"{'':9}  ahorro: {1 - results['columnar'] / results['dicts']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
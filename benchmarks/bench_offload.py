@@ -0,0 +1,108 @@
+"""
+Benchmark de latencia con renderizados grandes en curso
+
+Arranca el servidor (uvicorn) con `--notes` notas una vez por cada modo de
+NOTES_OFFLOAD y, mientras `--renderers` clientes crean una nota y piden el
+widget en bucle (cada escritura obliga a renderizarlo y comprimirlo de
+nuevo entero), otro proceso mide la latencia de `initialize`. Con el
+trabajo en el bucle de eventos, cada `initialize` que llega durante un
+renderizado espera a que termine; con el trabajo en un pool solo espera su
+turno de GIL (hilos) o nada (procesos, si hay CPUs libres).
+
+Uso:
+    python -m benchmarks.bench_offload --notes 100000 --renderers 4 --seconds 10
+    python -m benchmarks.bench_offload --modes inline,process --workers 2
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+import httpx
+
+from benchmarks.bench_admission import probe
+from benchmarks.bench_cold_start import populate
+from benchmarks.bench_workers import free_port, wait_ready
+from benchmarks.harness import percentile
+from server_python.offload import OFFLOAD_MODES, available_cpus
+
+
+async def render_loop(url: str, renderers: int, deadline: float) -> List[float]:
+    latencies: List[float] = []
+
+    async def worker(offset: int) -> None:
+        async with httpx.AsyncClient(base_url=url, timeout=120) as client:
+            i = offset
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await client.post("/notes", json={"title": f"Render {i}", "tags": ["bench"]})
+                response.raise_for_status()
+                response = await client.get("/widget")
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+                i += renderers
+    await asyncio.gather(*(worker(i) for i in range(renderers)))
+    return latencies
+
+
+async def run(url: str, renderers: int, seconds: float) -> None:
+    with ProcessPoolExecutor(1) as pool:
+        probing = asyncio.wrap_future(pool.submit(probe, url, seconds, 0.01))
+        renders = await render_loop(url, renderers, time.perf_counter() + seconds)
+        initialize = await probing
+
+    def summary(values: List[float]) -> str:
+        values = sorted(values)
+        if not values:
+            return "-"
+        return f"p50 {percentile(values, 50) * 1000:8.2f} ms  p99 {percentile(values, 99) * 1000:8.2f} ms"
+
+    print(f"    widget     {len(renders):6d}  {summary(renders)}")
+    print(f"    initialize {len(initialize):6d}  {summary(initialize)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=100_000)
+    parser.add_argument("--renderers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--modes", default=",".join(OFFLOAD_MODES))
+    parser.add_argument("--workers", type=int, default=0, help="NOTES_OFFLOAD_WORKERS (0: automático)")
+    args = parser.parse_args()
+
+    modes = args.modes.split(",")
+    for mode in modes:
+        if mode not in OFFLOAD_MODES:
+            parser.error(f"modo desconocido: {mode}")
+
+    template_dir = tempfile.mkdtemp(prefix="notes-offload-")
+    populate(template_dir, args.notes)
+    print(f"{args.notes} notas, {args.renderers} clientes renderizando durante {args.seconds:.0f} s ({available_cpus()} CPUs)")
+    for mode in modes:
+        # Cada modo parte de los mismos datos: las notas creadas por el anterior no cuentan
+        data_dir = tempfile.mkdtemp(prefix=f"notes-offload-{mode}-")
+        subprocess.run(["cp", "-a", f"{template_dir}/.", data_dir], check=True)
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server_python.main:app",
+             "--port", str(port), "--log-level", "warning", "--no-access-log"],
+            env=dict(os.environ, NOTES_DATA_DIR=data_dir, NOTES_OFFLOAD=mode, NOTES_OFFLOAD_WORKERS=str(args.workers)),
+        )
+        try:
+            asyncio.run(wait_ready(url, timeout=120))
+            print(f"  {mode}")
+            asyncio.run(run(url, args.renderers, args.seconds))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
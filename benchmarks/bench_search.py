@@ -0,0 +1,89 @@
+"""
+Benchmark del índice de búsqueda de texto completo
+
+Construye el índice con N notas sintéticas (vocabulario con distribución Zipf)
+y mide la latencia de consultas de 1 a 3 términos: p50, p95 y p99 de cada
+carga (uniforme y zipf, con términos frecuentes) en frío y en caliente. La
+cola de zipf la marcan las consultas de varios términos frecuentes.
+
+Uso:
+    python -m benchmarks.bench_search --notes 100000
+"""
+
+import argparse
+import itertools
+import random
+import statistics
+import time
+
+from server_python.search import SearchIndex
+
+SYLLABLES = ["ma", "pro", "gra", "ción", "te", "ri", "lo", "sa", "ne", "tu", "dí", "co", "ver", "al", "es", "ño"]
+
+
+def build_vocabulary(size: int, rng: random.Random) -> list:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_notes(count: int, vocabulary: list, rng: random.Random) -> list:
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    notes = []
+    for i in range(count):
+        words = rng.choices(vocabulary, cum_weights=weights, k=18)
+        notes.append({
+            "id": str(i + 1),
+            "title": " ".join(words[:4]),
+            "description": " ".join(words[4:16]),
+            "tags": words[16:],
+        })
+    return notes, weights
+
+
+def percentile(values: list, pct: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(len(values) * pct))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=100_000)
+    parser.add_argument("--vocabulary", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = build_vocabulary(args.vocabulary, rng)
+    notes, weights = make_notes(args.notes, vocabulary, rng)
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.notes_added(notes)
+    build = time.perf_counter() - start
+    print(f"índice: {len(index)} notas en {build:.2f}s ({len(index) / build:,.0f} notas/s)")
+
+    scenarios = {
+        # Términos elegidos al azar del vocabulario: la consulta típica de un usuario
+        "uniforme": lambda: rng.sample(vocabulary, rng.randint(1, 3)),
+        # Términos elegidos con la misma distribución Zipf del corpus (más frecuentes)
+        "zipf": lambda: rng.choices(vocabulary, cum_weights=weights, k=rng.randint(1, 3)),
+    }
+    for name, make_query in scenarios.items():
+        queries = [" ".join(make_query()) for _ in range(args.queries)]
+        # Primera pasada: incluye la construcción de las listas ordenadas por impacto
+        for phase in ("frío", "caliente"):
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                index.search(query, 10)
+                latencies.append((time.perf_counter() - start) * 1000)
+            print(
+                f"{name:<9} {phase:<9} p50={statistics.median(latencies):.3f}ms "
+                f"p95={percentile(latencies, 0.95):.3f}ms p99={percentile(latencies, 0.99):.3f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark de serialización de /mcp
+
+Peticiones por segundo de `tools/list` y `get_notes` por la ruta actual
+(respuestas estáticas precodificadas + JSON rápido en bytes) frente a la
+ruta anterior (cuerpo parseado por FastAPI y respuesta por jsonable_encoder),
+que se monta solo para el benchmark en /mcp-baseline.
+
+Uso:
+    python -m benchmarks.bench_serialization --notes 1000 --requests 2000
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Any, Dict
+
+import httpx
+
+from benchmarks.bench_recovery import make_note
+
+
+async def measure(client: httpx.AsyncClient, path: str, message: dict, requests: int) -> float:
+    start = time.perf_counter()
+    for i in range(requests):
+        response = await client.post(path, json=dict(message, id=i))
+        response.raise_for_status()
+    return requests / (time.perf_counter() - start)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    from server_python.main import app, rpc, store
+    from server_python.serialization import JSON_BACKEND
+
+    @app.post("/mcp-baseline")
+    async def mcp_baseline(request: Dict[str, Any]):
+        return await rpc.handle(request)
+
+    for i in range(args.notes):
+        store.create(make_note(i))
+
+    messages = {
+        "tools/list": {"jsonrpc": "2.0", "method": "tools/list"},
+        "get_notes": {"jsonrpc": "2.0", "method": "tools/call", "params": {"name": "get_notes", "arguments": {"limit": 50}}},
+        "get_notes (1000)": {"jsonrpc": "2.0", "method": "tools/call", "params": {"name": "get_notes", "arguments": {"limit": 1000}}},
+    }
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"backend JSON: {JSON_BACKEND}, notas: {len(store)}")
+        print(f"{'método':<18} {'antes (req/s)':>14} {'después (req/s)':>16}")
+        for name, message in messages.items():
+            requests = args.requests if "1000" not in name else args.requests // 10
+            await measure(client, "/mcp", message, 50)
+            before = await measure(client, "/mcp-baseline", message, requests)
+            after = await measure(client, "/mcp", message, requests)
+            print(f"{name:<18} {before:>14,.0f} {after:>16,.0f}  ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,49 @@
+"""
+Microbenchmark de búsqueda y borrado por ID en el NoteStore
+
+La latencia de get/delete debe mantenerse plana de 1k a 1M notas.
+
+Uso:
+    python -m benchmarks.bench_store --sizes 1000 10000 100000 1000000
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks.bench_recovery import make_note
+from server_python.store import NoteStore
+
+
+def bench(size: int, ops: int) -> tuple:
+    store = NoteStore().open()
+    for i in range(size):
+        store.create(make_note(i))
+    ids = random.sample([n["id"] for n in store.all()], min(ops, size))
+
+    start = time.perf_counter()
+    for note_id in ids:
+        store.get(note_id)
+    get_ns = (time.perf_counter() - start) / len(ids) * 1e9
+
+    start = time.perf_counter()
+    for note_id in ids:
+        store.delete(note_id)
+    delete_ns = (time.perf_counter() - start) / len(ids) * 1e9
+    return get_ns, delete_ns
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--ops", type=int, default=1_000)
+    args = parser.parse_args()
+
+    print(f"{'notas':>9}  {'get (ns/op)':>12}  {'delete (ns/op)':>15}")
+    for size in args.sizes:
+        get_ns, delete_ns = bench(size, args.ops)
+        print(f"{size:>9}  {get_ns:>12.0f}  {delete_ns:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Prueba de carga multi-worker sobre el store compartido (SQLite)
+
+Arranca uvicorn con 1..N workers contra la misma base SQLite, lanza
+clientes concurrentes con una mezcla de lecturas y escrituras por /mcp y
+mide el throughput de cada configuración. Al final comprueba que todos los
+workers ven el mismo número de notas (las escrituras de uno llegan a los demás).
+
+Uso:
+    python -m benchmarks.bench_workers --workers 1 2 4 --clients 64 --seconds 10
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.bench_recovery import make_note
+from server_python.store import NoteStore, SQLiteStorage
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def tool_call(request_id: int, write_every: int) -> dict:
+    if write_every and request_id % write_every == 0:
+        name, arguments = "create_note", {"title": f"Nota {request_id}", "response": "delta"}
+    elif request_id % 3 == 0:
+        name, arguments = "search_notes", {"query": "arquitectura programación", "limit": 5}
+    elif request_id % 3 == 1:
+        name, arguments = "get_note", {"note_id": str(request_id % 500 + 1)}
+    else:
+        name, arguments = "get_notes", {"limit": 20}
+    return {"jsonrpc": "2.0", "id": request_id, "method": "tools/call", "params": {"name": name, "arguments": arguments}}
+
+
+async def wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"El servidor no arrancó en {timeout}s")
+
+
+async def load(url: str, clients: int, seconds: float, write_every: int) -> int:
+    done = 0
+    deadline = time.perf_counter() + seconds
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        async def worker(offset: int) -> None:
+            nonlocal done
+            i = offset
+            while time.perf_counter() < deadline:
+                response = await client.post("/mcp", json=tool_call(i, write_every))
+                response.raise_for_status()
+                done += 1
+                i += clients
+        await asyncio.gather(*(worker(i) for i in range(clients)))
+    return done
+
+
+async def totals_seen(url: str, requests: int) -> set:
+    # Conexiones nuevas en cada petición para repartirlas entre los workers
+    seen = set()
+    for _ in range(requests):
+        async with httpx.AsyncClient(base_url=url) as client:
+            seen.add(int((await client.get("/notes", params={"limit": 1})).headers["X-Total-Count"]))
+    return seen
+
+
+async def run(workers: int, args: argparse.Namespace) -> float:
+    data_dir = Path(tempfile.mkdtemp(prefix="notes-workers-"))
+    db_path = data_dir / "notes.db"
+    store = NoteStore(SQLiteStorage(str(db_path))).open()
+    for i in range(args.notes):
+        store.create(make_note(i))
+    store.close()
+
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, NOTES_SQLITE_PATH=str(db_path))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server_python.main:app",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        env=env,
+    )
+    try:
+        await wait_ready(url)
+        # Calentamiento: que todos los workers carguen el estado
+        await load(url, args.clients, 1.0, 0)
+        done = await load(url, args.clients, args.seconds, args.write_every)
+        seen = await totals_seen(url, workers * 4)
+    finally:
+        server.terminate()
+        server.wait()
+
+    rate = done / args.seconds
+    status = "coherente" if len(seen) == 1 else f"INCOHERENTE {sorted(seen)}"
+    print(f"{workers:3d} workers: {rate:10,.0f} req/s  (total de notas visto por los workers: {status})")
+    return rate
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=64, help="clientes concurrentes")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--notes", type=int, default=1000, help="notas precargadas")
+    parser.add_argument("--write-every", type=int, default=20, help="una escritura cada N peticiones (0 = solo lecturas)")
+    args = parser.parse_args()
+
+    baseline = None
+    for workers in args.workers:
+        rate = await run(workers, args)
+        baseline = baseline or rate
+        print(f"     escalado respecto a {args.workers[0]} worker(s): {rate / baseline:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,290 @@
+"""
+Harness de benchmarks de Second Brain
+
+Recorre todos los métodos y herramientas MCP registrados en `rpc`, más los
+endpoints REST principales (/notes, /widget, /card...), con un cliente ASGI
+en proceso contra `app`, para varios tamaños del store. Cada tamaño corre en
+un subproceso nuevo, así el estado y el pico de memoria de uno no contaminan
+al siguiente.
+
+Por caso se informa: latencia de la primera llamada (fría), p50/p95/p99,
+throughput secuencial y bytes de la respuesta; por tamaño, el tiempo de
+carga y el pico de RSS. Los resultados se guardan en JSON
+(benchmarks/results/<commit>.json por defecto) y `--compare` los contrasta
+con una ejecución anterior.
+
+Uso:
+    python -m benchmarks.harness --sizes 10 1000 100000
+    python -m benchmarks.harness --sizes 1000000 --iterations 50
+    python -m benchmarks.harness --compare benchmarks/results/abc1234.json
+    python -m benchmarks.harness --only get_notes search_notes /widget
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.bench_recovery import make_note
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# Umbral a partir del cual --compare marca un caso como regresión
+REGRESSION_THRESHOLD = 1.10
+
+
+def bench_note(i: int) -> Dict[str, Any]:
+    """Nota sintética con fechas repartidas a lo largo de un año"""
+    return dict(make_note(i), createdAt=f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}")
+
+
+def rpc_call(name: str, arguments: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": 1, "method": "tools/call", "params": {"name": name, "arguments": arguments or {}}}
+
+
+def rpc_method(method: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": 1, "method": method, "params": params or {}}
+
+
+# Caso: (nombre, método HTTP, ruta, cuerpo JSON o función iteración -> cuerpo, escribe)
+Case = Tuple[str, str, str, Any, bool]
+
+
+def build_cases(size: int) -> List[Case]:
+    """Casos de lectura primero y de escritura después, para no alterar las medidas de lectura"""
+    middle = str(max(1, size // 2))
+    return [
+        # Métodos MCP
+        ("initialize", "POST", "/mcp", rpc_method("initialize"), False),
+        ("tools/list", "POST", "/mcp", rpc_method("tools/list"), False),
+        ("resources/list", "POST", "/mcp", rpc_method("resources/list"), False),
+        ("resources/read", "POST", "/mcp", rpc_method("resources/read", {"uri": "ui://widget/second-brain.html"}), False),
+        # Herramientas MCP de lectura
+        ("get_notes", "POST", "/mcp", rpc_call("get_notes"), False),
+        ("get_notes[1000]", "POST", "/mcp", rpc_call("get_notes", {"limit": 1000}), False),
+        ("query_notes", "POST", "/mcp", rpc_call("query_notes", {"tags": ["tag1", "tema1"], "tagMode": "or", "from": "2025-03-01", "to": "2025-06-30"}), False),
+        ("get_note", "POST", "/mcp", rpc_call("get_note", {"note_id": middle}), False),
+        ("search_notes", "POST", "/mcp", rpc_call("search_notes", {"query": "arquitectura programación", "limit": 10}), False),
+        ("get_graph", "POST", "/mcp", rpc_call("get_graph"), False),
+        ("find_related_notes", "POST", "/mcp", rpc_call("find_related_notes", {"note_id": middle, "limit": 10}), False),
+        # REST
+        ("GET /notes", "GET", "/notes", None, False),
+        ("GET /notes[1000]", "GET", "/notes?limit=1000", None, False),
+        ("GET /notes?tag", "GET", "/notes?tag=tag7&category=technology", None, False),
+        ("GET /notes/search", "GET", "/notes/search?q=arquitectura", None, False),
+        ("GET /notes/{id}", "GET", f"/notes/{middle}", None, False),
+        ("GET /notes/{id}/related", "GET", f"/notes/{middle}/related", None, False),
+        ("GET /graph", "GET", "/graph", None, False),
+        ("/widget", "GET", "/widget", None, False),
+        ("/card", "GET", "/card", None, False),
+        # Escrituras
+        ("create_note", "POST", "/mcp", lambda i: rpc_call("create_note", {"title": f"Bench {i}", "tags": ["bench"]}), True),
+        ("create_notes[100]", "POST", "/mcp",
+         lambda i: rpc_call("create_notes", {"notes": [bench_note(size + i * 100 + j) for j in range(100)]}), True),
+        ("delete_note", "POST", "/mcp", lambda i: rpc_call("delete_note", {"note_id": str(i + 1)}), True),
+    ]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+async def run_case(client: Any, case: Case, iterations: int, budget: float) -> Dict[str, Any]:
+    name, method, path, body, _ = case
+    latencies: List[float] = []
+    payload = 0
+    started = time.perf_counter()
+    for i in range(iterations):
+        json_body = body(i) if callable(body) else body
+        start = time.perf_counter()
+        response = await client.request(method, path, json=json_body)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code >= 400 or b'"error"' in response.content[:64]:
+            raise RuntimeError(f"{name}: respuesta {response.status_code} {response.content[:200]!r}")
+        payload = len(response.content)
+        if time.perf_counter() - started > budget:
+            break
+    total = time.perf_counter() - started
+
+    first = latencies[0]
+    warm = sorted(latencies[1:] or latencies)
+    return {
+        "iterations": len(latencies),
+        "first_ms": round(first * 1000, 3),
+        "p50_ms": round(percentile(warm, 50) * 1000, 3),
+        "p95_ms": round(percentile(warm, 95) * 1000, 3),
+        "p99_ms": round(percentile(warm, 99) * 1000, 3),
+        "mean_ms": round(sum(warm) / len(warm) * 1000, 3),
+        "rps": round(len(latencies) / total, 1),
+        "bytes": payload,
+    }
+
+
+async def run_size(size: int, iterations: int, budget: float, only: Optional[List[str]]) -> Dict[str, Any]:
+    """Se ejecuta en el subproceso: carga `size` notas y mide todos los casos"""
+    import httpx
+
+    from server_python.main import app, rpc, store
+
+    start = time.perf_counter()
+    for chunk in range(0, size, 10_000):
+        store.create_many([bench_note(i) for i in range(chunk, min(size, chunk + 10_000))])
+    load_seconds = time.perf_counter() - start
+    rss_loaded = peak_rss_mb()
+
+    cases = build_cases(size)
+    covered = {c[3]["method"] if c[3]["method"] != "tools/call" else c[3]["params"]["name"]
+               for c in cases if isinstance(c[3], dict)}
+    covered |= {c[3](0)["params"]["name"] for c in cases if callable(c[3])}
+    missing = sorted((set(rpc.methods) | set(rpc.tools)) - covered)
+    if only:
+        cases = [c for c in cases if c[0] in only]
+
+    results: Dict[str, Any] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for case in cases:
+            results[case[0]] = await run_case(client, case, iterations, budget)
+
+    return {
+        "size": size,
+        "notes": len(store),
+        "load_seconds": round(load_seconds, 3),
+        "rss_after_load_mb": rss_loaded,
+        "peak_rss_mb": peak_rss_mb(),
+        "uncovered": missing,
+        "cases": results,
+    }
+
+
+def git_revision() -> Dict[str, Any]:
+    def git(*args: str) -> str:
+        return subprocess.run(["git", *args], capture_output=True, text=True, cwd=Path(__file__).parent).stdout.strip()
+    try:
+        return {"commit": git("rev-parse", "--short", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def spawn_size(size: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """Ejecuta un tamaño en un proceso nuevo y devuelve su resultado"""
+    env = dict(os.environ)
+    env.pop("NOTES_DATA_DIR", None)
+    env.pop("NOTES_SQLITE_PATH", None)
+    tmp = None
+    if args.storage != "memory":
+        tmp = tempfile.mkdtemp(prefix="notes-bench-")
+        if args.storage == "log":
+            env["NOTES_DATA_DIR"] = tmp
+        else:
+            env["NOTES_SQLITE_PATH"] = os.path.join(tmp, "notes.db")
+    command = [sys.executable, "-m", "benchmarks.harness", "--child", str(size),
+               "--iterations", str(args.iterations), "--budget", str(args.budget)]
+    if args.only:
+        command += ["--only", *args.only]
+    completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Fallo con {size} notas:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def print_size(result: Dict[str, Any]) -> None:
+    print(f"\n== {result['size']:,} notas  (carga {result['load_seconds']:.2f} s, "
+          f"RSS tras cargar {result['rss_after_load_mb']} MB, pico {result['peak_rss_mb']} MB)")
+    print(f"{'caso':22s} {'fría ms':>9s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'req/s':>10s} {'bytes':>11s}")
+    for name, case in result["cases"].items():
+        print(f"{name:22s} {case['first_ms']:9.2f} {case['p50_ms']:9.2f} {case['p95_ms']:9.2f} "
+              f"{case['p99_ms']:9.2f} {case['rps']:10.1f} {case['bytes']:11,d}")
+    if result["uncovered"]:
+        print(f"Sin caso de benchmark: {', '.join(result['uncovered'])}")
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Tabla de p50/p99 actual frente a la línea base; marca las regresiones"""
+    base = {(r["size"], name): case for r in baseline["results"] for name, case in r["cases"].items()}
+    print(f"\nComparación con {baseline['meta'].get('commit')} (p50 más de un {REGRESSION_THRESHOLD - 1:.0%} peor = regresión)")
+    print(f"{'notas':>9s} {'caso':22s} {'p50 antes':>10s} {'p50 ahora':>10s} {'p99 antes':>10s} {'p99 ahora':>10s}")
+    for result in current["results"]:
+        for name, case in result["cases"].items():
+            old = base.get((result["size"], name))
+            if old is None:
+                continue
+            flag = " <- regresión" if case["p50_ms"] > old["p50_ms"] * REGRESSION_THRESHOLD else ""
+            print(f"{result['size']:9,d} {name:22s} {old['p50_ms']:10.2f} {case['p50_ms']:10.2f} "
+                  f"{old['p99_ms']:10.2f} {case['p99_ms']:10.2f}{flag}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1_000, 100_000])
+    parser.add_argument("--iterations", type=int, default=200, help="llamadas por caso como máximo")
+    parser.add_argument("--budget", type=float, default=5.0, help="segundos por caso como máximo")
+    parser.add_argument("--storage", choices=["memory", "log", "sqlite"], default="memory")
+    parser.add_argument("--only", nargs="+", help="medir solo estos casos")
+    parser.add_argument("--output", help="fichero JSON de resultados (por defecto benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="resultados JSON de una ejecución anterior")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        result = asyncio.run(run_size(args.child, args.iterations, args.budget, args.only))
+        print(json.dumps(result))
+        return
+
+    from server_python.serialization import JSON_BACKEND
+
+    revision = git_revision()
+    report = {
+        "meta": dict(
+            revision,
+            timestamp=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            python=platform.python_version(),
+            platform=platform.platform(),
+            json_backend=JSON_BACKEND,
+            storage=args.storage,
+            iterations=args.iterations,
+            budget=args.budget,
+        ),
+        "results": [],
+    }
+    for size in args.sizes:
+        result = spawn_size(size, args)
+        report["results"].append(result)
+        print_size(result)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{revision['commit'] or 'local'}{'-dirty' if revision['dirty'] else ''}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    print(f"\nResultados guardados en {output}")
+
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
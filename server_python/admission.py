@@ -0,0 +1,93 @@
+"""
+Control de carga para las llamadas caras del servidor
+Coalescencia de peticiones idénticas en vuelo (single-flight) y admisión con límite de concurrencia y cola acotada
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class Overloaded(Exception):
+    """La cola de admisión está llena: la petición se descarta sin ejecutarse"""
+
+
+class AdmissionGate:
+    """
+    Como mucho `limit` ejecuciones a la vez; las que llegan con el cupo lleno
+    esperan su turno en orden de llegada, hasta `max_queue`. Con la cola
+    llena, `slot()` lanza Overloaded enseguida: mejor rechazar pronto que
+    acumular peticiones que el cliente ya habrá abandonado.
+    """
+
+    def __init__(self, limit: int, max_queue: int):
+        if limit < 1:
+            raise ValueError("limit debe ser al menos 1")
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            raise Overloaded()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+
+class SingleFlight:
+    """
+    Una sola ejecución por clave: quien pide una clave que ya está en vuelo
+    espera el resultado de la primera en vez de repetir el trabajo. La clave
+    se libera al terminar, así que no es una caché: solo se comparten
+    ejecuciones que se solapan.
+
+    Si la ejecución se cancela, los que la esperaban lo reintentan (uno de
+    ellos pasa a ejecutarla); una excepción sí se comparte.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """(resultado, compartido): `compartido` si se reutilizó una ejecución en vuelo"""
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                break
+            try:
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Marcada como leída: si nadie más la esperaba, asyncio no la registra como perdida
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._calls[key]
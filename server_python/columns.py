@@ -0,0 +1,322 @@
+"""
+Representación compacta de las notas en memoria
+Bloques columnares inmutables: categorías y conjuntos de etiquetas como códigos enteros y fechas como ordinales
+"""
+
+from array import array
+from collections.abc import Mapping
+from datetime import date
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
+
+# Campos de una nota regular, en el orden en que se materializa
+FIELDS = ("id", "title", "description", "createdAt", "category", "tags")
+FIELD_SET = frozenset(FIELDS)
+
+
+class Vocabulary:
+    """Valores internados con un código entero estable (los códigos no se reutilizan)"""
+
+    def __init__(self):
+        self._codes: Dict[Hashable, int] = {}
+        self.values: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def get(self, value: Hashable) -> Optional[int]:
+        return self._codes.get(value)
+
+    def code(self, value: Hashable) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class NoteCodec:
+    """
+    Diccionarios compartidos por todos los bloques de un store: categorías,
+    etiquetas, conjuntos de etiquetas y fechas.
+
+    Las etiquetas de una nota se guardan como el código de su combinación
+    (una tupla de etiquetas internadas): las notas de un mismo tema repiten
+    combinación, y materializar la lista es copiar una tupla. Una fecha es
+    un ordinal (0 = sin fecha) si es una fecha YYYY-MM-DD que se reconstruye
+    tal cual; las conversiones se guardan para no analizar dos veces la
+    misma cadena.
+    """
+
+    def __init__(self):
+        self.categories = Vocabulary()
+        self.tags = Vocabulary()
+        self.tagsets = Vocabulary()
+        self._ordinals: Dict[str, int] = {}
+        self.dates: Dict[int, Optional[str]] = {0: None}
+
+    def date_ordinal(self, value: Any) -> Optional[int]:
+        """Ordinal de `value`, o None si no se puede representar así"""
+        if value is None:
+            return 0
+        if not isinstance(value, str):
+            return None
+        ordinal = self._ordinals.get(value)
+        if ordinal is None:
+            try:
+                parsed = date.fromisoformat(value)
+            except ValueError:
+                return None
+            if parsed.isoformat() != value:
+                return None
+            ordinal = self._ordinals[value] = parsed.toordinal()
+            self.dates[ordinal] = value
+        return ordinal
+
+    def tagset_code(self, tags: List[str]) -> int:
+        key = tuple(tags)
+        code = self.tagsets.get(key)
+        if code is None:
+            # Combinación nueva: sus etiquetas, las mismas cadenas que en las demás combinaciones
+            values, tag_code = self.tags.values, self.tags.code
+            code = self.tagsets.code(tuple(values[tag_code(tag)] for tag in tags))
+        return code
+
+    def codes(self, note: Mapping) -> Optional[Tuple[int, int, int]]:
+        """
+        Códigos (fecha, categoría, etiquetas) de una nota con exactamente los
+        campos de FIELDS, o None si no se puede representar así: etiquetas que
+        no sean una lista de valores hashables, fecha en otro formato...
+        """
+        if note.keys() != FIELD_SET or type(note["tags"]) is not list:
+            return None
+        ordinal = self.date_ordinal(note["createdAt"])
+        if ordinal is None:
+            return None
+        try:
+            return ordinal, self.categories.code(note["category"]), self.tagset_code(note["tags"])
+        except TypeError:  # valores no hashables
+            return None
+
+
+class NoteBlock:
+    """
+    Hasta CHUNK notas en columnas inmutables:
+
+        ids          tupla de IDs (las mismas cadenas que indexa el store)
+        titles       tupla de títulos
+        descriptions tupla de descripciones (o None)
+        created      ordinales de `createdAt` (array de enteros)
+        categories   código de la categoría de cada nota
+        tagsets      código de la combinación de etiquetas de cada nota
+
+    Las notas que no encajan en el esquema (campos de más o de menos, fechas
+    en otro formato...) se guardan tal cual en `raw`. Las bajas no rehacen
+    las columnas: el bloque nuevo las comparte con el anterior y solo añade
+    la posición a `deleted`, así que un bloque (y las vistas que apuntan a
+    él) no cambia nunca.
+    """
+
+    __slots__ = ("codec", "ids", "titles", "descriptions", "created", "categories",
+                 "tagsets", "raw", "deleted", "_count")
+
+    @classmethod
+    def build(cls, codec: NoteCodec, notes: Sequence[Optional[Mapping]]) -> "NoteBlock":
+        """Bloque con `notes` en orden; None deja un hueco (una nota ya borrada)"""
+        ids: List[Optional[str]] = []
+        titles: List[Optional[str]] = []
+        descriptions: List[Optional[str]] = []
+        created = array("i")
+        categories = array("I")
+        tagsets = array("I")
+        raw: Dict[int, Dict[str, Any]] = {}
+        deleted = []
+        for position, note in enumerate(notes):
+            if isinstance(note, NoteView):
+                note = note.to_dict()
+            codes = None if note is None else codec.codes(note)
+            if codes is None:
+                if note is None:
+                    deleted.append(position)
+                else:
+                    raw[position] = dict(note)
+                ids.append(None if note is None else note.get("id"))
+                titles.append(None)
+                descriptions.append(None)
+                created.append(0)
+                categories.append(0)
+                tagsets.append(0)
+                continue
+            ids.append(note["id"])
+            titles.append(note["title"])
+            descriptions.append(note["description"])
+            created.append(codes[0])
+            categories.append(codes[1])
+            tagsets.append(codes[2])
+
+        block = cls.__new__(cls)
+        block.codec = codec
+        block.ids = tuple(ids)
+        block.titles = tuple(titles)
+        block.descriptions = tuple(descriptions)
+        block.created = created
+        block.categories = categories
+        block.tagsets = tagsets
+        block.raw = raw or None
+        block.deleted = frozenset(deleted)
+        block._count = len(ids) - len(deleted)
+        return block
+
+    def __len__(self) -> int:
+        """Notas vivas del bloque"""
+        return self._count
+
+    @property
+    def slots(self) -> int:
+        """Posiciones ocupadas, contando las de notas borradas"""
+        return len(self.ids)
+
+    def positions(self) -> Iterator[int]:
+        deleted = self.deleted
+        return (i for i in range(len(self.ids)) if i not in deleted)
+
+    def __iter__(self) -> Iterator["NoteView"]:
+        return (NoteView(self, i) for i in self.positions())
+
+    def __reversed__(self) -> Iterator["NoteView"]:
+        deleted = self.deleted
+        return (NoteView(self, i) for i in reversed(range(len(self.ids))) if i not in deleted)
+
+    def view(self, position: int) -> "NoteView":
+        return NoteView(self, position)
+
+    def without(self, position: int) -> "NoteBlock":
+        """El mismo bloque con la nota de `position` borrada (comparte las columnas)"""
+        block = NoteBlock.__new__(NoteBlock)
+        for name in NoteBlock.__slots__:
+            setattr(block, name, getattr(self, name))
+        block.deleted = self.deleted | {position}
+        block._count = self._count - 1
+        return block
+
+    def replace(self, position: int, note: Mapping) -> "NoteBlock":
+        """El bloque con otra nota en `position` (se rehace entero: es raro)"""
+        notes: List[Optional[Mapping]] = [
+            None if i in self.deleted else self.note(i) for i in range(len(self.ids))
+        ]
+        notes[position] = note
+        return NoteBlock.build(self.codec, notes)
+
+    def materialize(self) -> List[Dict[str, Any]]:
+        """Las notas vivas como dicts (para serializarlas)"""
+        # El mismo trabajo que `note`, sin llamadas por campo: es el camino del widget y la exportación
+        ids, titles, descriptions, created, categories = self.ids, self.titles, self.descriptions, self.created, self.categories
+        tagsets, dates = self.tagsets, self.codec.dates
+        category_values, tagset_values = self.codec.categories.values, self.codec.tagsets.values
+        deleted, raw = self.deleted, self.raw or {}
+        notes = []
+        for i in range(len(ids)):
+            if i in deleted:
+                continue
+            if i in raw:
+                notes.append(dict(raw[i]))
+                continue
+            notes.append({
+                "id": ids[i],
+                "title": titles[i],
+                "description": descriptions[i],
+                "createdAt": dates[created[i]],
+                "category": category_values[categories[i]],
+                "tags": list(tagset_values[tagsets[i]]),
+            })
+        return notes
+
+    # Lectura de campos
+
+    def created_at(self, i: int) -> Optional[str]:
+        return self.codec.dates[self.created[i]]
+
+    def category(self, i: int) -> str:
+        return self.codec.categories.values[self.categories[i]]
+
+    def tag_list(self, i: int) -> List[str]:
+        return list(self.codec.tagsets.values[self.tagsets[i]])
+
+    def note(self, i: int) -> Dict[str, Any]:
+        """Nota de la posición `i` como dict nuevo"""
+        if self.raw is not None and i in self.raw:
+            return dict(self.raw[i])
+        return {
+            "id": self.ids[i],
+            "title": self.titles[i],
+            "description": self.descriptions[i],
+            "createdAt": self.codec.dates[self.created[i]],
+            "category": self.codec.categories.values[self.categories[i]],
+            "tags": list(self.codec.tagsets.values[self.tagsets[i]]),
+        }
+
+
+_GETTERS = {
+    "id": lambda block, i: block.ids[i],
+    "title": lambda block, i: block.titles[i],
+    "description": lambda block, i: block.descriptions[i],
+    "createdAt": NoteBlock.created_at,
+    "category": NoteBlock.category,
+    "tags": NoteBlock.tag_list,
+}
+
+
+class NoteView(Mapping):
+    """
+    Una nota de un NoteBlock, de solo lectura. Se comporta como el dict de
+    la nota (`note["title"]`, `note.get("tags")`, `dict(note)`) pero los
+    códigos se traducen al leer cada campo; `to_dict()` la materializa entera, y es
+    lo que hace la serialización JSON. `tags` es una lista nueva en cada
+    lectura: modificarla no cambia la nota.
+    """
+
+    __slots__ = ("_block", "_pos")
+
+    def __init__(self, block: NoteBlock, position: int):
+        self._block = block
+        self._pos = position
+
+    def __getitem__(self, key: str) -> Any:
+        raw = self._block.raw
+        if raw is not None and self._pos in raw:
+            return raw[self._pos][key]
+        getter = _GETTERS.get(key)
+        if getter is None:
+            raise KeyError(key)
+        return getter(self._block, self._pos)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        raw = self._block.raw
+        if raw is not None and self._pos in raw:
+            return raw[self._pos].get(key, default)
+        getter = _GETTERS.get(key)
+        return default if getter is None else getter(self._block, self._pos)
+
+    def __iter__(self) -> Iterator[str]:
+        raw = self._block.raw
+        if raw is not None and self._pos in raw:
+            return iter(raw[self._pos])
+        return iter(FIELDS)
+
+    def __len__(self) -> int:
+        raw = self._block.raw
+        if raw is not None and self._pos in raw:
+            return len(raw[self._pos])
+        return len(FIELDS)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, NoteView) and other._block is self._block and other._pos == self._pos:
+            return True
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self._block.note(self._pos)
+
+    def __repr__(self) -> str:
+        return f"NoteView({self.to_dict()!r})"
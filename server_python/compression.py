@@ -0,0 +1,214 @@
+"""
+Compresión de respuestas para Second Brain
+Assets precomprimidos en el build (.br/.gz) y compresión de respuestas dinámicas con caché
+"""
+
+import gzip
+import hashlib
+import os
+import re
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi.staticfiles import StaticFiles
+from starlette.staticfiles import NotModifiedResponse
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él las respuestas dinámicas usan solo gzip
+    brotli = None
+
+# Por debajo de este tamaño la compresión no compensa
+MIN_SIZE = 1024
+# A partir de este, `compressed_response_async` hace el hash y la compresión en un pool
+OFFLOAD_SIZE = 64 * 1024
+
+# Nombres que genera Vite con hash de contenido: index-BvX3a9kQ.js, style-4f9a2c1e.css
+HASHED_ASSET_RE = re.compile(r"-[A-Za-z0-9_-]{8,}\.[a-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+DYNAMIC_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def accepted_encodings(accept_encoding: Optional[str]) -> Dict[str, float]:
+    """Codificaciones aceptadas con su peso q (RFC 9110, sección 12.5.3)"""
+    accepted: Dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name.lower()] = q
+    return accepted
+
+
+def choose_encoding(accept_encoding: Optional[str], available: Tuple[str, ...]) -> Optional[str]:
+    """La mejor de `available` (en orden de preferencia) que el cliente acepte, o None"""
+    accepted = accepted_encodings(accept_encoding)
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def body_key(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    # Niveles moderados: se comprime en el camino de la petición (el build usa los máximos)
+    if encoding == "br":
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+class CompressionCache:
+    """
+    Respuestas ya comprimidas, por clave y codificación, con LRU acotado en bytes.
+
+    La clave identifica el contenido sin comprimir: la versión del store
+    (o el ETag) en las respuestas que dependen solo de ella, o un hash del
+    cuerpo en las demás. Así la misma respuesta nunca se comprime dos veces.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._size = 0
+
+    def get(self, data: bytes, encoding: str, key: Optional[str] = None) -> bytes:
+        if key is None:
+            key = body_key(data)
+        cached = self._lookup(key, encoding)
+        if cached is not None:
+            return cached
+        return self._store(key, encoding, compress(data, encoding))
+
+    async def get_async(
+        self, data: bytes, encoding: str, key: Optional[str], run: Callable[..., Awaitable[Any]]
+    ) -> bytes:
+        """Como `get`, pero el hash y la compresión los hace `run` (un pool); la caché se toca solo aquí"""
+        if key is None:
+            key = await run(body_key, data)
+        cached = self._lookup(key, encoding)
+        if cached is not None:
+            return cached
+        return self._store(key, encoding, await run(compress, data, encoding))
+
+    def _lookup(self, key: str, encoding: str) -> Optional[bytes]:
+        cached = self._entries.get((key, encoding))
+        metrics.cache_lookup("compression", cached is not None)
+        if cached is not None:
+            self._entries.move_to_end((key, encoding))
+        return cached
+
+    def _store(self, key: str, encoding: str, compressed: bytes) -> bytes:
+        if (key, encoding) not in self._entries:
+            self._entries[(key, encoding)] = compressed
+            self._size += len(compressed)
+        while self._size > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+        return compressed
+
+
+compression_cache = CompressionCache()
+
+
+def warm(body: bytes, key: Optional[str] = None) -> None:
+    """Deja `body` comprimido en la caché con cada codificación dinámica (arranque)"""
+    if len(body) >= MIN_SIZE:
+        for encoding in DYNAMIC_ENCODINGS:
+            compression_cache.get(body, encoding, key)
+
+
+def compressed_response(
+    body: bytes,
+    accept_encoding: Optional[str],
+    media_type: str,
+    headers: Optional[Dict[str, str]] = None,
+    key: Optional[str] = None,
+    status_code: int = 200,
+) -> Response:
+    """Respuesta comprimida según Accept-Encoding (si merece la pena), servida desde la caché"""
+    headers = dict(headers or {})
+    if len(body) >= MIN_SIZE:
+        headers["Vary"] = "Accept-Encoding"
+        encoding = choose_encoding(accept_encoding, DYNAMIC_ENCODINGS)
+        if encoding is not None:
+            body = compression_cache.get(body, encoding, key)
+            headers["Content-Encoding"] = encoding
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
+
+
+async def compressed_response_async(
+    body: bytes,
+    accept_encoding: Optional[str],
+    media_type: str,
+    headers: Optional[Dict[str, str]] = None,
+    key: Optional[str] = None,
+    status_code: int = 200,
+    run: Optional[Callable[..., Awaitable[Any]]] = None,
+) -> Response:
+    """Como `compressed_response`, pero los cuerpos grandes se comprimen con `run` (fuera del bucle de eventos)"""
+    if run is None or len(body) < OFFLOAD_SIZE:
+        return compressed_response(body, accept_encoding, media_type, headers, key, status_code)
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    encoding = choose_encoding(accept_encoding, DYNAMIC_ENCODINGS)
+    if encoding is not None:
+        body = await compression_cache.get_async(body, encoding, key, run)
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles que sirve la variante .br o .gz generada en el build si el
+    cliente la acepta, y marca como inmutables los ficheros con hash en el
+    nombre (su contenido no cambia nunca: un cambio produce otro nombre).
+    """
+
+    async def get_response(self, path: str, scope) -> Response:
+        response = await super().get_response(path, scope)
+        if not isinstance(response, FileResponse) or response.status_code != 200:
+            return response
+
+        immutable = HASHED_ASSET_RE.search(path) is not None
+        cache_control = IMMUTABLE if immutable else "no-cache"
+
+        request_headers = Headers(scope=scope)
+        original = Path(response.path)
+        available = tuple(e for e, suffix in ENCODING_SUFFIXES.items() if original.with_name(original.name + suffix).is_file())
+        encoding = choose_encoding(request_headers.get("accept-encoding"), available) if available else None
+        if encoding is None:
+            response.headers["Cache-Control"] = cache_control
+            if available:
+                response.headers["Vary"] = "Accept-Encoding"
+            return response
+
+        variant_path = original.with_name(original.name + ENCODING_SUFFIXES[encoding])
+        variant = FileResponse(
+            variant_path,
+            media_type=response.media_type,
+            headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding", "Cache-Control": cache_control},
+            stat_result=os.stat(variant_path),
+        )
+        # La variante tiene su propio ETag: revalidar contra él, no contra el del original
+        if self.is_not_modified(variant.headers, request_headers):
+            return NotModifiedResponse(variant.headers)
+        return variant
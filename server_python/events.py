@@ -0,0 +1,105 @@
+"""
+Flujo de cambios del store como Server-Sent Events
+Cada consumidor lee del log de cambios compartido del NoteStore: no hay colas por cliente
+"""
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set
+
+from .serialization import dumps
+
+# Cambios por evento como máximo; el resto sale en los eventos siguientes
+MAX_CHANGES_PER_EVENT = 500
+
+
+def format_event(event: str, data: Any, event_id: Optional[int] = None) -> bytes:
+    """Un evento SSE; `data` se codifica como JSON en una sola línea"""
+    head = b"" if event_id is None else b"id: %d\n" % event_id
+    return head + b"event: " + event.encode("ascii") + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+class ChangeFeed:
+    """
+    Listener del store que despierta a los consumidores SSE cuando hay cambios.
+
+    Cada consumidor guarda solo la última versión que envió y, al despertar,
+    pide al store los cambios desde ella (`changes_since`). Un consumidor lento
+    no acumula nada: cuando vuelve a leer recibe de una vez todo lo ocurrido
+    (coalescido), y si ya se salió del log acotado del store recibe `reset`
+    para que recargue la lista completa.
+    """
+
+    def __init__(self, store: Any):
+        self.store = store
+        self._waiters: Set[asyncio.Event] = set()
+
+    def __len__(self) -> int:
+        return len(self._waiters)
+
+    def notes_added(self, notes: List[Dict[str, Any]]) -> None:
+        self._wake()
+
+    def notes_removed(self, notes: List[Dict[str, Any]]) -> None:
+        self._wake()
+
+    def _wake(self) -> None:
+        for waiter in self._waiters:
+            waiter.set()
+
+    async def stream(
+        self,
+        since: Optional[int],
+        is_disconnected: Callable[[], Any],
+        heartbeat: float = 15.0,
+        poll_interval: float = 1.0,
+    ) -> AsyncIterator[bytes]:
+        """
+        Eventos desde la versión `since` (la actual si es None):
+            changes  {"baseVersion", "version", "changes", "total"}, con id = version
+            reset    {"version"}: `since` ya no es reconstruible, recargar las notas
+
+        Cada `poll_interval` segundos se llama a `store.refresh()` para ver
+        también las escrituras de otros workers aunque este no reciba peticiones.
+        """
+        store = self.store
+        waiter = asyncio.Event()
+        self._waiters.add(waiter)
+        try:
+            # Reintento del navegador tras una desconexión, en milisegundos
+            yield b"retry: 2000\n\n"
+            version = store.version if since is None else since
+            last_sent = time.monotonic()
+            while True:
+                waiter.clear()
+                store.refresh()
+                if version != store.version:
+                    changes = store.changes_since(version)
+                    if changes is None:
+                        version = store.version
+                        yield format_event("reset", {"version": version}, version)
+                    else:
+                        changes = changes[:MAX_CHANGES_PER_EVENT]
+                        event = {
+                            "baseVersion": version,
+                            "version": changes[-1]["version"],
+                            "changes": changes,
+                            "total": len(store),
+                        }
+                        version = event["version"]
+                        yield format_event("changes", event, version)
+                    last_sent = time.monotonic()
+                    continue
+
+                if await is_disconnected():
+                    return
+                if time.monotonic() - last_sent >= heartbeat:
+                    # Comentario SSE: mantiene viva la conexión a través de proxies
+                    yield b": ping\n\n"
+                    last_sent = time.monotonic()
+                try:
+                    await asyncio.wait_for(waiter.wait(), poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._waiters.discard(waiter)
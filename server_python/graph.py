@@ -0,0 +1,137 @@
+"""
+Grafo de conocimiento de Second Brain
+Recuentos por etiqueta y categoría y co-ocurrencias de etiquetas, mantenidos de forma incremental
+"""
+
+import bisect
+import itertools
+from typing import Any, Dict, Hashable, Iterator, List, Tuple
+
+
+class RankedCounter:
+    """
+    Contador que entrega sus claves más frecuentes sin ordenar nada.
+
+    Las claves se agrupan en cubos por recuento y los recuentos con algún
+    cubo se guardan ordenados: sumar o restar mueve la clave de un cubo al
+    vecino, y el top-N recorre los cubos de mayor a menor, así que cuesta
+    O(N) sin importar cuántas claves haya. En un empate, las claves salen en
+    el orden en que llegaron a ese recuento.
+    """
+
+    def __init__(self):
+        self._counts: Dict[Hashable, int] = {}
+        self._buckets: Dict[int, Dict[Hashable, None]] = {}
+        self._levels: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def get(self, key: Hashable) -> int:
+        return self._counts.get(key, 0)
+
+    def add(self, key: Hashable, amount: int) -> None:
+        old = self._counts.get(key, 0)
+        new = old + amount
+        if old:
+            bucket = self._buckets[old]
+            del bucket[key]
+            if not bucket:
+                del self._buckets[old]
+                del self._levels[bisect.bisect_left(self._levels, old)]
+        if new > 0:
+            self._counts[key] = new
+            bucket = self._buckets.get(new)
+            if bucket is None:
+                bucket = self._buckets[new] = {}
+                bisect.insort(self._levels, new)
+            bucket[key] = None
+        else:
+            self._counts.pop(key, None)
+
+    def top(self, n: int) -> Iterator[Tuple[Hashable, int]]:
+        """Hasta `n` pares (clave, recuento), de más a menos frecuente"""
+        pairs = ((key, count) for count in reversed(self._levels) for key in self._buckets[count])
+        return itertools.islice(pairs, max(n, 0))
+
+
+class TagGraph:
+    """
+    Grafo de etiquetas y categorías, listener del NoteStore.
+
+    Nodos: cada etiqueta y cada categoría, con su número de notas.
+    Aristas: pares de etiquetas que comparten nota (co-ocurrencia) y
+    categoría -> etiqueta, con el número de notas en que coinciden.
+
+    Cada alta o baja solo toca los contadores de las etiquetas y la categoría
+    de esa nota (O(t²) con t etiquetas), y el grafo se lee con RankedCounter
+    sin recorrer las notas.
+    """
+
+    def __init__(self):
+        self.tags = RankedCounter()
+        self.categories = RankedCounter()
+        self.cooccurrences = RankedCounter()
+        self.memberships = RankedCounter()
+        self.notes = 0
+
+    def notes_added(self, notes: List[Dict[str, Any]]) -> None:
+        for note in notes:
+            self._count(note, 1)
+
+    def notes_removed(self, notes: List[Dict[str, Any]]) -> None:
+        for note in notes:
+            self._count(note, -1)
+
+    def _count(self, note: Dict[str, Any], amount: int) -> None:
+        self.notes += amount
+        tags = sorted(set(note.get("tags") or []))
+        category = note.get("category")
+        for tag in tags:
+            self.tags.add(tag, amount)
+        if category:
+            self.categories.add(category, amount)
+            for tag in tags:
+                self.memberships.add((category, tag), amount)
+        for pair in itertools.combinations(tags, 2):
+            self.cooccurrences.add(pair, amount)
+
+    def graph(self, node_limit: int, edge_limit: int) -> Dict[str, Any]:
+        """
+        Las `node_limit` etiquetas y todas las categorías más frecuentes, y las
+        `edge_limit` aristas de más peso de cada tipo. Los extremos de una
+        arista que no estén entre los nodos se añaden, para que el grafo sea
+        dibujable tal cual.
+        """
+        nodes: Dict[str, Dict[str, Any]] = {}
+
+        def node(kind: str, label: str, count: int) -> str:
+            node_id = f"{kind}:{label}"
+            if node_id not in nodes:
+                nodes[node_id] = {"id": node_id, "type": kind, "label": label, "count": count}
+            return node_id
+
+        for category, count in self.categories.top(len(self.categories)):
+            node("category", category, count)
+        for tag, count in self.tags.top(node_limit):
+            node("tag", tag, count)
+
+        edges = []
+        for (a, b), weight in self.cooccurrences.top(edge_limit):
+            source, target = node("tag", a, self.tags.get(a)), node("tag", b, self.tags.get(b))
+            edges.append({"source": source, "target": target, "type": "cooccurrence", "weight": weight})
+        for (category, tag), weight in self.memberships.top(edge_limit):
+            source = node("category", category, self.categories.get(category))
+            target = node("tag", tag, self.tags.get(tag))
+            edges.append({"source": source, "target": target, "type": "category", "weight": weight})
+
+        return {
+            "nodes": list(nodes.values()),
+            "edges": edges,
+            "totals": {
+                "notes": self.notes,
+                "tags": len(self.tags),
+                "categories": len(self.categories),
+                "cooccurrences": len(self.cooccurrences),
+            },
+        }
@@ -0,0 +1,291 @@
+"""
+Índices secundarios del NoteStore
+Se mantienen de forma incremental como listeners (`notes_added` / `notes_removed`)
+"""
+
+import base64
+import binascii
+import bisect
+import heapq
+import itertools
+import json
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .store import paused_gc
+
+
+def id_key(note_id: str) -> Tuple[int, str]:
+    """Orden natural de IDs: "9" < "10" (los IDs se asignan como enteros crecientes)"""
+    return len(note_id), note_id
+
+
+class SortedIndex:
+    """
+    Claves ordenadas (valor, desempate por ID) para paginar sin ordenar la colección.
+
+    Cada entrada es `(key(nota), len(id), id)`: el ID va al final para poder
+    recuperar la nota y para que dos notas nunca compartan clave.
+    """
+
+    def __init__(self, key: Callable[[Dict[str, Any]], Any]):
+        self.key = key
+        self._keys: List[Tuple[Any, ...]] = []
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def entry(self, note: Dict[str, Any]) -> Tuple[Any, ...]:
+        return (self.key(note),) + id_key(note["id"])
+
+    # Lotes mayores se añaden al final y se reordenan (timsort fusiona los dos tramos ordenados)
+    INSORT_MAX = 64
+
+    def notes_added(self, notes: List[Dict[str, Any]]) -> None:
+        if len(notes) > self.INSORT_MAX:
+            self._keys.extend(sorted(map(self.entry, notes)))
+            self._keys.sort()
+            return
+        for note in notes:
+            bisect.insort(self._keys, self.entry(note))
+
+    def notes_removed(self, notes: List[Dict[str, Any]]) -> None:
+        for note in notes:
+            entry = self.entry(note)
+            pos = bisect.bisect_left(self._keys, entry)
+            if pos < len(self._keys) and self._keys[pos] == entry:
+                del self._keys[pos]
+
+    def page(self, after: Optional[Tuple[Any, ...]], limit: int, descending: bool = False) -> List[Tuple[Any, ...]]:
+        """Hasta `limit` entradas estrictamente posteriores a `after` en el orden pedido"""
+        keys = self._keys
+        if descending:
+            end = len(keys) if after is None else bisect.bisect_left(keys, after)
+            return keys[max(0, end - limit):end][::-1]
+        start = 0 if after is None else bisect.bisect_right(keys, after)
+        return keys[start:start + limit]
+
+    def range(self, low: Any = None, high: Any = None) -> List[Tuple[Any, ...]]:
+        """Entradas con `low <= clave < high` (None = sin límite), por búsqueda binaria"""
+        keys = self._keys
+        start = 0 if low is None else bisect.bisect_left(keys, (low,))
+        end = len(keys) if high is None else bisect.bisect_left(keys, (high,))
+        return keys[start:end]
+
+    def scan(
+        self, after: Optional[Tuple[Any, ...]], limit: int, descending: bool, predicate: Callable[[str], bool]
+    ) -> List[Tuple[Any, ...]]:
+        """Como `page`, pero solo entradas cuyo ID cumple `predicate` (recorre en orden hasta llenar)"""
+        keys = self._keys
+        if descending:
+            end = len(keys) if after is None else bisect.bisect_left(keys, after)
+            candidates = (keys[i] for i in range(end - 1, -1, -1))
+        else:
+            start = 0 if after is None else bisect.bisect_right(keys, after)
+            candidates = itertools.islice(keys, start, None)
+        return list(itertools.islice((e for e in candidates if predicate(e[-1])), limit))
+
+    def select(
+        self, notes: Iterable[Dict[str, Any]], after: Optional[Tuple[Any, ...]], limit: int, descending: bool = False
+    ) -> List[Tuple[Any, ...]]:
+        """Como `page`, pero solo entre `notes` (un subconjunto ya filtrado)"""
+        entries = map(self.entry, notes)
+        if after is not None:
+            entries = (e for e in entries if (e < after if descending else e > after))
+        return heapq.nlargest(limit, entries) if descending else heapq.nsmallest(limit, entries)
+
+
+# Posiciones de los bits a 1 de cada valor de byte, para decodificar bitmaps
+_BYTE_BITS = tuple(tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256))
+_NONZERO_BYTE = re.compile(rb"[^\x00]")
+
+
+class FacetIndex:
+    """
+    Bitmaps por valor de campos discretos (categoría, etiquetas): valor -> bitmap
+    con un bit por nota.
+
+    Cada nota ocupa una posición fija (slot) en todos los bitmaps. Se guardan
+    como bytearray para que altas y bajas cambien un solo bit; al consultar se
+    convierten en enteros, de modo que AND/OR entre filtros y los recuentos por
+    valor (facetas) son operaciones de enteros en C sobre n/8 bytes, sin
+    recorrer notas. Los slots de notas borradas no se reutilizan.
+    """
+
+    def __init__(self, fields: Dict[str, Callable[[Dict[str, Any]], Iterable[str]]]):
+        self.fields = fields
+        self._bitmaps: Dict[str, Dict[str, bytearray]] = {field: {} for field in fields}
+        self._sizes: Dict[str, Dict[str, int]] = {field: {} for field in fields}
+        self._slots: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._values: Dict[str, Tuple[Tuple[str, Tuple[str, ...]], ...]] = {}
+        self._all = bytearray()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    @staticmethod
+    def _set(bitmap: bytearray, slot: int) -> None:
+        byte = slot >> 3
+        if byte >= len(bitmap):
+            bitmap.extend(bytes(byte + 1 - len(bitmap)))
+        bitmap[byte] |= 1 << (slot & 7)
+
+    @staticmethod
+    def _clear(bitmap: bytearray, slot: int) -> None:
+        byte = slot >> 3
+        if byte < len(bitmap):
+            bitmap[byte] &= ~(1 << (slot & 7)) & 0xFF
+
+    def notes_added(self, notes: List[Dict[str, Any]]) -> None:
+        for note in notes:
+            note_id = note["id"]
+            if note_id in self._values:
+                self._remove(note_id)
+            slot = self._slots.get(note_id)
+            if slot is None:
+                slot = self._slots[note_id] = len(self._ids)
+                self._ids.append(note_id)
+            values = tuple((field, tuple(set(get(note)))) for field, get in self.fields.items())
+            for field, field_values in values:
+                bitmaps, sizes = self._bitmaps[field], self._sizes[field]
+                for value in field_values:
+                    bitmap = bitmaps.get(value)
+                    if bitmap is None:
+                        bitmap = bitmaps[value] = bytearray()
+                    self._set(bitmap, slot)
+                    sizes[value] = sizes.get(value, 0) + 1
+            self._set(self._all, slot)
+            self._values[note_id] = values
+
+    def notes_removed(self, notes: List[Dict[str, Any]]) -> None:
+        for note in notes:
+            if note["id"] in self._values:
+                self._remove(note["id"])
+
+    def _remove(self, note_id: str) -> None:
+        slot = self._slots[note_id]
+        for field, field_values in self._values.pop(note_id):
+            bitmaps, sizes = self._bitmaps[field], self._sizes[field]
+            for value in field_values:
+                self._clear(bitmaps[value], slot)
+                sizes[value] -= 1
+                if not sizes[value]:
+                    del bitmaps[value], sizes[value]
+        self._clear(self._all, slot)
+
+    def all(self) -> int:
+        """Bitmap con todas las notas"""
+        return int.from_bytes(self._all, "little")
+
+    def bitmap(self, field: str, value: str) -> int:
+        """Bitmap de las notas cuyo campo `field` contiene `value` (0 si ninguna)"""
+        bitmap = self._bitmaps[field].get(value)
+        return int.from_bytes(bitmap, "little") if bitmap is not None else 0
+
+    def bitmap_of(self, note_ids: Iterable[str]) -> int:
+        """Bitmap de un conjunto de IDs (p. ej. un rango de otro índice)"""
+        bitmap = bytearray(len(self._all))
+        slots = self._slots
+        for note_id in note_ids:
+            slot = slots.get(note_id)
+            if slot is not None:
+                bitmap[slot >> 3] |= 1 << (slot & 7)
+        return int.from_bytes(bitmap, "little")
+
+    def contains(self, bitmap: int) -> Callable[[str], bool]:
+        """Prueba de pertenencia O(1) por ID a `bitmap`"""
+        data = bitmap.to_bytes(len(self._all), "little")
+        slots = self._slots
+
+        def contains(note_id: str) -> bool:
+            slot = slots.get(note_id)
+            return slot is not None and data[slot >> 3] >> (slot & 7) & 1 == 1
+        return contains
+
+    def ids(self, bitmap: int) -> List[str]:
+        """IDs de las notas marcadas en `bitmap`, saltando los bytes a cero en C"""
+        data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+        ids = self._ids
+        result = []
+        for match in _NONZERO_BYTE.finditer(data):
+            base = match.start() << 3
+            result.extend(ids[base + bit] for bit in _BYTE_BITS[data[match.start()]])
+        return result
+
+    def counts(self, field: str, bitmap: int, limit: Optional[int] = None) -> Dict[str, int]:
+        """Recuento de notas de `bitmap` por valor de `field`, de más a menos frecuente"""
+        counts = []
+        for value, values_bitmap in self._bitmaps[field].items():
+            count = (int.from_bytes(values_bitmap, "little") & bitmap).bit_count()
+            if count:
+                counts.append((count, value))
+        order = lambda item: (-item[0], item[1])
+        top = heapq.nsmallest(limit, counts, key=order) if limit is not None else sorted(counts, key=order)
+        return {value: count for count, value in top}
+
+
+class LazyIndex:
+    """
+    Índice que no se construye hasta que alguien lo consulta.
+
+    Mientras nadie lo usa, los cambios del store se ignoran; en el primer
+    acceso se crea con `factory()` a partir de `source()` (las notas del
+    store en ese momento) y a partir de ahí recibe los cambios como cualquier
+    listener. Así el arranque no paga índices que quizá ninguna petición use
+    (búsqueda, facetas...): los paga la primera consulta que los necesita.
+    El resto de atributos se delegan en el índice real.
+    """
+
+    def __init__(self, factory: Callable[[], Any], source: Callable[[], List[Dict[str, Any]]]):
+        self._factory = factory
+        self._source = source
+        self._index: Any = None
+
+    @property
+    def built(self) -> bool:
+        return self._index is not None
+
+    def build(self) -> Any:
+        if self._index is None:
+            index = self._factory()
+            with paused_gc():
+                index.notes_added(self._source())
+            self._index = index
+        return self._index
+
+    def notes_added(self, notes: List[Dict[str, Any]]) -> None:
+        if self._index is not None:
+            self._index.notes_added(notes)
+
+    def notes_removed(self, notes: List[Dict[str, Any]]) -> None:
+        if self._index is not None:
+            self._index.notes_removed(notes)
+
+    def __len__(self) -> int:
+        return len(self.build())
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.build(), name)
+
+
+def encode_cursor(sort: str, order: str, entry: Tuple[Any, ...]) -> str:
+    """Cursor opaco: la última clave devuelta junto con el orden en que se pidió"""
+    raw = json.dumps([sort, order, list(entry)], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str) -> Tuple[Any, ...]:
+    """Decodifica un cursor; lanza ValueError si es inválido o de otro orden"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, cursor_order, entry = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError) as exc:
+        raise ValueError("Cursor inválido") from exc
+    if (cursor_sort, cursor_order) != (sort, order):
+        raise ValueError("El cursor pertenece a otro orden de listado")
+    if not (isinstance(entry, list) and len(entry) == 3 and isinstance(entry[1], int)):
+        raise ValueError("Cursor inválido")
+    return tuple(entry)
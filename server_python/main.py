@@ -5,16 +5,50 @@ API REST simple que sirve el widget de notas y conocimiento
 
 import os
 import json
+import gc
+import logging
+import html
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Literal, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel, Field
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+
+if not __package__:
+    if __name__ == "__main__":
+        # `python server_python/main.py`: las importaciones relativas necesitan el paquete
+        raise SystemExit("Arranca el servidor desde la raíz del repositorio: python -m server_python.main o uvicorn server_python.main:app")
+    # Comando de arranque antiguo (`cd server_python && uvicorn main:app`, el de los paneles de
+    # Render ya creados): el módulo se carga suelto, así que se engancha al paquete desde la raíz
+    import sys
+    import warnings
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    __package__ = "server_python"
+    warnings.warn("`cd server_python && uvicorn main:app` está obsoleto: usa `uvicorn server_python.main:app` desde la raíz del repositorio")
+
+from . import metrics
+from . import compression
+from .admission import SingleFlight
+from .compression import PrecompressedStaticFiles, compressed_response, compressed_response_async
+from .events import ChangeFeed
+from .graph import TagGraph
+from .indexes import FacetIndex, LazyIndex, SortedIndex, decode_cursor, encode_cursor
+from .offload import create_offloader_from_env
+from .related import RelatedIndex
+from .rendering import RenderedWidget, WidgetTemplate, compile_widget, render_widget
+from .rpc import INVALID_PARAMS, PARSE_ERROR, Dispatcher, RpcError, error_response
+from .serialization import dumps, loads
+from .search import SearchIndex, fold
+from .store import Snapshot, WriteQueue, create_store_from_env
+from .templates import TemplateCache
+
+logger = logging.getLogger(__name__)
 
 # Configuración
 # Intentar obtener BASE_URL de la variable de entorno, si no, usar la URL del request
@@ -24,9 +58,11 @@ if not BASE_URL:
     BASE_URL = os.environ.get("RENDER_EXTERNAL_URL", "http://localhost:8000")
 
 ASSETS_DIR = Path(__file__).parent.parent / "dist"
+# Cada cuánto se comprueba si `npm run build` ha cambiado la plantilla del widget
+TEMPLATE_CHECK_INTERVAL = int(os.environ.get("NOTES_TEMPLATE_CHECK_MS", "1000")) / 1000
 
-# Base de datos simple en memoria
-notes_db = [
+# Notas iniciales para un Second Brain vacío
+SEED_NOTES = [
     {
         "id": "1",
         "title": "Ideas sobre arquitectura de software",
@@ -54,6 +90,74 @@ notes_db = [
 ]
 
 
+class StartupTimer:
+    """Duración de cada fase del arranque, en ms, y si el servidor ya está listo"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.ready = False
+        self._last = time.perf_counter()
+
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.phases[phase] = round((now - self._last) * 1000, 2)
+        self._last = now
+
+
+startup = StartupTimer()
+
+# Almacén de notas (en memoria, o persistente si se configura NOTES_DATA_DIR)
+store = create_store_from_env().open(seed=SEED_NOTES)
+# Escritor único: las escrituras del servidor se aplican en orden, agrupadas
+# en lotes y (con SQLite) sin bloquear el bucle de eventos
+store_writer = WriteQueue(store)
+# Renderizado, codificación y compresión de respuestas grandes fuera del bucle de eventos
+# (NOTES_OFFLOAD: inline, thread o process; por defecto thread)
+offload = create_offloader_from_env()
+startup.mark("store")
+
+# Índice de búsqueda de texto completo, actualizado en cada alta y baja.
+# Como el de títulos y las facetas, se construye en su primera consulta y
+# no en el arranque: listar notas (el listado por defecto) no lo necesita
+search_index = store.subscribe(LazyIndex(SearchIndex, store.all))
+
+# Índices ordenados para paginar los listados
+sort_indexes = {
+    "createdAt": store.subscribe(SortedIndex(lambda n: n.get("createdAt") or "")),
+    "title": store.subscribe(LazyIndex(lambda: SortedIndex(lambda n: fold(n.get("title") or "")), store.all)),
+}
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+# Páginas a partir de este tamaño se codifican fuera del bucle de eventos
+OFFLOAD_MIN_NOTES = 200
+
+# Bitmaps por categoría y etiqueta para filtrar y contar sin recorrer las notas
+facet_index = store.subscribe(LazyIndex(lambda: FacetIndex({
+    "category": lambda n: [n["category"]] if n.get("category") else [],
+    "tags": lambda n: n.get("tags") or [],
+}), store.all))
+DEFAULT_FACET_LIMIT = 20
+
+# Vectores TF-IDF para encontrar notas relacionadas (también en su primera consulta)
+related_index = store.subscribe(LazyIndex(RelatedIndex, store.all))
+DEFAULT_RELATED_LIMIT = 5
+
+# Grafo de etiquetas y categorías (recuentos y co-ocurrencias) para el mapa de conocimiento
+tag_graph = store.subscribe(LazyIndex(TagGraph, store.all))
+DEFAULT_GRAPH_NODES = 50
+DEFAULT_GRAPH_EDGES = 100
+MAX_GRAPH_NODES = 500
+MAX_GRAPH_EDGES = 1000
+
+# Modo de respuesta de las herramientas que modifican notas
+RESPONSE_MODE_SCHEMA = {
+    "type": "string",
+    "enum": ["delta", "full"],
+    "default": "delta",
+    "description": "delta: solo el cambio y la nueva versión; full: primera página de notas (las más recientes)",
+}
+
+
 # Modelos de datos
 class Note(BaseModel):
     id: Optional[str] = None
@@ -64,121 +168,466 @@ class Note(BaseModel):
     tags: List[str] = Field(default_factory=list, description="Lista de etiquetas")
 
 
-@lru_cache(maxsize=10)
-def load_widget_html(widget_name: str) -> str:
-    """Carga el HTML del widget desde los assets compilados"""
-    # Buscar en directorios comunes donde puede estar el widget
-    possible_paths = [
-        ASSETS_DIR / f"{widget_name}.html",
-        ASSETS_DIR / widget_name / "index.html",
-        ASSETS_DIR / "src" / widget_name / "index.html",
-    ]
-    
-    # También buscar recursivamente por si está en otra ubicación
-    html_files = list(ASSETS_DIR.glob(f"**/*{widget_name}*/index.html"))
-    possible_paths.extend(html_files)
-    
-    # Buscar archivos que contengan el nombre del widget
-    html_files_by_name = list(ASSETS_DIR.glob(f"**/{widget_name}*.html"))
-    possible_paths.extend(html_files_by_name)
-    
-    # Encontrar el primer archivo que existe
-    html_file = None
-    for path in possible_paths:
-        if path.exists() and path.is_file():
-            html_file = path
+NOTE_FIELDS = tuple(Note.model_fields)
+
+# Validación de lotes de notas en una sola llamada a pydantic-core
+NOTE_LIST = TypeAdapter(List[Note])
+MAX_BULK_NOTES = 100_000
+
+
+def _listing(
+    limit: int, cursor: Optional[str], sort: str, order: str, fields: Optional[List[str]]
+) -> Tuple[SortedIndex, Optional[Tuple[Any, ...]], int]:
+    """Valida los parámetros comunes de los listados; lanza ValueError si alguno es inválido"""
+    if sort not in sort_indexes:
+        raise ValueError(f"Orden no soportado: {sort}")
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Dirección no soportada: {order}")
+    unknown = set(fields or ()) - set(NOTE_FIELDS)
+    if unknown:
+        raise ValueError(f"Campos desconocidos: {', '.join(sorted(unknown))}")
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    after = decode_cursor(cursor, sort, order) if cursor else None
+    return sort_indexes[sort], after, limit
+
+
+def _page(
+    entries: List[Tuple[Any, ...]], limit: int, sort: str, order: str, fields: Optional[List[str]]
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Notas de una página (hasta `limit + 1` entradas del índice) y el cursor siguiente"""
+    next_cursor = encode_cursor(sort, order, entries[limit - 1]) if len(entries) > limit else None
+    notes = [store.get(entry[-1]) for entry in entries[:limit]]
+    if fields:
+        notes = [dict({"id": n["id"]}, **{f: n.get(f) for f in fields}) for n in notes]
+    return notes, next_cursor
+
+
+def list_notes(
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    sort: str = "createdAt",
+    order: str = "asc",
+    fields: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Página de notas ordenada por `sort` con paginación por cursor opaco.
+    `fields` limita los campos devueltos (el ID siempre se incluye).
+    Lanza ValueError si algún parámetro es inválido.
+    """
+    index, after, limit = _listing(limit, cursor, sort, order, fields)
+    entries = index.page(after, limit + 1, descending=order == "desc")
+    notes, next_cursor = _page(entries, limit, sort, order, fields)
+    return {"notes": notes, "total": len(index), "nextCursor": next_cursor, "version": store.version}
+
+
+def query_notes(
+    categories: Optional[List[str]] = None,
+    tags: Optional[List[str]] = None,
+    tag_mode: str = "and",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    sort: str = "createdAt",
+    order: str = "asc",
+    fields: Optional[List[str]] = None,
+    facet_limit: int = DEFAULT_FACET_LIMIT,
+) -> Dict[str, Any]:
+    """
+    Notas filtradas por categoría (cualquiera de `categories`), etiquetas
+    (todas con tag_mode="and", alguna con "or") y rango de createdAt con
+    ambos extremos incluidos, paginadas igual que `list_notes`.
+
+    Los filtros se combinan como bitmaps de `facet_index` y el rango de
+    fechas sale del índice ordenado por búsqueda binaria; `facets` cuenta
+    las notas del resultado por categoría y etiqueta a partir de los mismos
+    bitmaps, sin recorrer notas. Lanza ValueError si algún parámetro es inválido.
+    """
+    if tag_mode not in ("and", "or"):
+        raise ValueError(f"Modo de etiquetas no soportado: {tag_mode}")
+    index, after, limit = _listing(limit, cursor, sort, order, fields)
+
+    matches = facet_index.all()
+    if categories:
+        any_category = 0
+        for category in categories:
+            any_category |= facet_index.bitmap("category", category)
+        matches &= any_category
+    if tags:
+        tag_bitmaps = [facet_index.bitmap("tags", tag) for tag in tags]
+        if tag_mode == "and":
+            for bitmap in tag_bitmaps:
+                matches &= bitmap
+        else:
+            any_tag = 0
+            for bitmap in tag_bitmaps:
+                any_tag |= bitmap
+            matches &= any_tag
+    if date_from or date_to:
+        # `date_to` incluye cualquier instante de ese día ("2024-05-01T10:00" <= "2024-05-01\uffff")
+        low, high = date_from or None, date_to + "\uffff" if date_to else None
+        dates = sort_indexes["createdAt"]
+        in_range = dates.range(low, high)
+        if len(in_range) <= matches.bit_count():
+            matches &= facet_index.bitmap_of(entry[-1] for entry in in_range)
+        else:
+            # Los otros filtros ya dejan menos notas que el rango: comprobar su fecha
+            key = dates.key
+            keyed = ((note_id, key(store.get(note_id))) for note_id in facet_index.ids(matches))
+            matches = facet_index.bitmap_of(
+                note_id for note_id, value in keyed
+                if (low is None or low <= value) and (high is None or value < high)
+            )
+
+    total = matches.bit_count()
+    descending = order == "desc"
+    if total * total >= (limit + 1) * len(index):
+        # Coinciden muchas: recorrer el índice en orden llena la página antes que ordenarlas todas
+        entries = index.scan(after, limit + 1, descending, facet_index.contains(matches))
+    else:
+        entries = index.select(map(store.get, facet_index.ids(matches)), after, limit + 1, descending)
+    notes, next_cursor = _page(entries, limit, sort, order, fields)
+    facet_limit = max(1, int(facet_limit))
+    return {
+        "notes": notes,
+        "total": total,
+        "nextCursor": next_cursor,
+        "facets": {
+            "category": facet_index.counts("category", matches, facet_limit),
+            "tags": facet_index.counts("tags", matches, facet_limit),
+        },
+        "version": store.version,
+    }
+
+
+def validation_message(exc: ValidationError, lines: List[int] = ()) -> str:
+    """Resumen legible de los errores de un lote (con la línea original si venía en NDJSON)"""
+    errors = []
+    for error in exc.errors(include_url=False, include_input=False)[:20]:
+        loc = list(error["loc"])
+        if lines and loc and isinstance(loc[0], int):
+            loc[0] = f"línea {lines[loc[0]]}"
+        errors.append(f"{'.'.join(map(str, loc)) or 'body'}: {error['msg']}")
+    return f"{exc.error_count()} error(es) de validación: " + "; ".join(errors)
+
+
+def parse_bulk_notes(body: bytes, ndjson: bool) -> List[Note]:
+    """
+    Valida un lote de notas (array JSON o NDJSON) en una sola pasada.
+    Lanza ValueError con los errores (y la línea, en NDJSON) si alguno es inválido.
+    """
+    lines: List[int] = []
+    if ndjson:
+        # Las líneas no vacías se unen en un array para validarlas de una vez
+        chunks = []
+        for number, line in enumerate(body.splitlines(), 1):
+            if line.strip():
+                chunks.append(line)
+                lines.append(number)
+        body = b"[" + b",".join(chunks) + b"]"
+    try:
+        notes = NOTE_LIST.validate_json(body)
+    except ValidationError as exc:
+        raise ValueError(validation_message(exc, lines))
+    if len(notes) > MAX_BULK_NOTES:
+        raise ValueError(f"Como máximo {MAX_BULK_NOTES} notas por lote")
+    return notes
+
+
+async def import_notes(notes: List[Note]) -> List[str]:
+    """Da de alta un lote ya validado con una sola escritura; devuelve los IDs asignados"""
+    today = datetime.now().strftime("%Y-%m-%d")
+    records = NOTE_LIST.dump_python(notes, exclude={"id"})
+    for record in records:
+        if not record["createdAt"]:
+            record["createdAt"] = today
+    return [note["id"] for note in await store_writer.create_many(records)]
+
+
+def notes_delta(since: int) -> Optional[Dict[str, Any]]:
+    """Cambios desde la versión `since`, o None si hay que enviar la lista completa"""
+    changes = store.changes_since(since)
+    if changes is None:
+        return None
+    return {"baseVersion": since, "version": store.version, "changes": changes, "total": len(store)}
+
+
+def note_id_argument(arguments: Dict[str, Any]) -> str:
+    """`note_id` de los argumentos de una herramienta; un número se acepta como su texto"""
+    note_id = arguments.get("note_id")
+    if isinstance(note_id, int) and not isinstance(note_id, bool):
+        return str(note_id)
+    if not isinstance(note_id, str):
+        raise RpcError(INVALID_PARAMS, "note_id debe ser un texto")
+    return note_id
+
+
+def mutation_content(arguments: Dict[str, Any], base_version: int) -> Dict[str, Any]:
+    """
+    structuredContent de una herramienta que modifica notas: los cambios desde
+    `base_version` (la versión antes de escribir). Si la escritura fue en
+    lote con otras, el delta las incluye también.
+
+    Si entre tanto hubo más cambios de los que se guardan, o con
+    response="full", lleva `reset`: una página no es la lista completa, así
+    que el widget la vuelve a pedir entera (como con el evento `reset` del
+    SSE) en lugar de quedarse solo con esas notas.
+    """
+    if arguments.get("response") == "full":
+        return dict(list_notes(order="desc"), reset=True)
+    delta = notes_delta(base_version)
+    if delta is not None:
+        return delta
+    return {"version": store.version, "total": len(store), "reset": True}
+
+
+EXPORT_CHUNK_SIZE = 1000
+
+
+def encode_export_chunk(notes: List[Dict[str, Any]], fmt: str) -> bytes:
+    """Un bloque de la exportación: notas separadas por comas (json) o una por línea (ndjson)"""
+    if fmt == "json":
+        return b",".join(map(dumps, notes))
+    return b"".join(dumps(n) + b"\n" for n in notes)
+
+
+async def export_chunks(fmt: str, chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    Exporta todas las notas por bloques, en orden de creación.
+
+    Recorre el índice por createdAt con el mismo cursor que la paginación, de
+    modo que la memoria usada es la de un bloque sea cual sea el tamaño del
+    Second Brain. Cada `yield` espera a que el servidor envíe el bloque
+    anterior, así un cliente lento frena la exportación en lugar de acumularla.
+    Las notas creadas o borradas durante la exportación pueden aparecer o no.
+    """
+    index = sort_indexes["createdAt"]
+    after = None
+    first = True
+    if fmt == "json":
+        yield b"["
+    while True:
+        entries = index.page(after, chunk_size)
+        if not entries:
             break
-    
-    if not html_file:
-        # Mostrar rutas para debug
-        all_html = list(ASSETS_DIR.glob("**/*.html"))
-        error_msg = f"""
-        <div style="padding: 20px; font-family: monospace; background: #fee; border: 2px solid #f00; border-radius: 8px;">
-            <h3>❌ Widget '{widget_name}' no encontrado</h3>
-            <p><strong>Directorio base:</strong> {ASSETS_DIR}</p>
-            <p><strong>Rutas buscadas:</strong></p>
-            <ul style="background: #fff; padding: 10px; border-radius: 4px;">
-                {''.join(f'<li>{p}</li>' for p in possible_paths[:3])}
-            </ul>
-            <p><strong>Archivos HTML disponibles:</strong></p>
-            <ul style="background: #fff; padding: 10px; border-radius: 4px;">
-                {''.join(f'<li>{f.relative_to(ASSETS_DIR)}</li>' for f in all_html) if all_html else '<li>Ninguno encontrado</li>'}
-            </ul>
-            <p><strong>✅ Solución:</strong> Ejecuta <code>npm run build</code></p>
-        </div>
-        """
-        return error_msg
-    
-    html_content = html_file.read_text()
-    
-    # Reemplazar rutas absolutas y relativas con la URL base completa
-    # Manejar diferentes formatos de rutas de assets
-    import re
-    
-    # Reemplazar rutas absolutas que empiezan con /assets/
-    html_content = re.sub(r'src="/assets/', f'src="{BASE_URL}/assets/', html_content)
-    html_content = re.sub(r'href="/assets/', f'href="{BASE_URL}/assets/', html_content)
-    html_content = re.sub(r"src='/assets/", f"src='{BASE_URL}/assets/", html_content)
-    html_content = re.sub(r"href='/assets/", f"href='{BASE_URL}/assets/", html_content)
-    
-    # También reemplazar rutas relativas
-    html_content = re.sub(r'src="./assets/', f'src="{BASE_URL}/assets/', html_content)
-    html_content = re.sub(r'href="./assets/', f'href="{BASE_URL}/assets/', html_content)
-    
-    return html_content
+        after = entries[-1]
+        notes = [n for n in map(store.get, (e[-1] for e in entries)) if n is not None]
+        if not notes:
+            continue
+        body = await offload.run(encode_export_chunk, notes, fmt)
+        yield body if first or fmt != "json" else b"," + body
+        first = False
+    if fmt == "json":
+        yield b"]"
 
 
-def create_widget_html(notes: List[Dict[str, Any]]) -> str:
-    """Crea el HTML del widget con los datos de las notas"""
-    html_template = load_widget_html("second-brain")
-    
-    # Inyectar datos de notas en el HTML en el head, antes de los scripts de React
-    notes_json = json.dumps(notes)
+class SearchResult(BaseModel):
+    note: Note
+    score: float = Field(..., description="Relevancia BM25")
+
+
+def search_notes(query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """Busca notas por texto (sin distinguir acentos ni mayúsculas)"""
+    return [
+        {"note": store.get(note_id), "score": round(score, 4)}
+        for note_id, score in search_index.search(query, limit)
+    ]
+
+
+def knowledge_graph(nodes: int = DEFAULT_GRAPH_NODES, edges: int = DEFAULT_GRAPH_EDGES) -> Dict[str, Any]:
+    """Etiquetas y categorías más frecuentes y sus conexiones, sin recorrer las notas"""
+    graph = tag_graph.graph(nodes, edges)
+    graph["version"] = store.version
+    return graph
+
+
+class RelatedResult(BaseModel):
+    note: Note
+    score: float = Field(..., description="Similitud coseno TF-IDF (0-1)")
+
+
+def related_notes(note_id: str, limit: int = DEFAULT_RELATED_LIMIT) -> List[Dict[str, Any]]:
+    """Notas más parecidas a `note_id` por título, descripción y etiquetas"""
+    return [
+        {"note": store.get(related_id), "score": round(score, 4)}
+        for related_id, score in related_index.related(note_id, limit)
+    ]
+
+
+# Plantilla del widget preparada una vez y recargada tras un nuevo `npm run build`
+widget_templates = TemplateCache(
+    ASSETS_DIR, "second-brain", BASE_URL, TEMPLATE_CHECK_INTERVAL, run=offload.run_pure
+)
+
+
+def encode_snapshot(snapshot: Snapshot) -> Tuple[bytes, float]:
+    """Las notas del snapshot como array JSON y lo que ha tardado (para las métricas)"""
+    start = time.perf_counter()
+    return snapshot.encode(), time.perf_counter() - start
+
+
+async def create_widget_html(snapshot: Snapshot, template: Optional[WidgetTemplate]) -> RenderedWidget:
+    """Crea el HTML del widget con las notas de un snapshot del store y su versión"""
+    if template is None:
+        template = await offload.run_pure(compile_widget, await widget_templates.missing_page(), BASE_URL)
     
-    # Insertar script en el head para que esté disponible antes de que React cargue
-    # Incluir también un script inline para asegurar que los datos estén disponibles
-    head_injection = f"""
-    <script>
-        // Asegurar que los datos estén disponibles antes de que React se monte
-        window.__NOTES_DATA__ = {notes_json};
-        console.log('Second Brain: Notes data loaded', window.__NOTES_DATA__);
-    </script>
+    # Las notas se codifican en un hilo (leen los bloques del snapshot, que no cambian);
+    # unir los trozos de la plantilla y el hash, que solo necesitan bytes, puede ir a otro proceso
+    notes_json, elapsed = await offload.run(encode_snapshot, snapshot)
+    metrics.serialization_time.observe(elapsed, "widget")
+    return await offload.run_pure(render_widget, template, notes_json, snapshot.version)
+
+
+class WidgetCache:
+    """
+    Widget renderizado para la versión actual del store, como texto y como bytes.
+    Se registra como listener del store y se invalida con cada cambio, así que
+    mientras el Second Brain no cambie servir el widget no renderiza nada. El
+    render se hace con `offload`, fuera del bucle de eventos. También se
+    invalida cuando `templates` recarga la plantilla.
     """
-    html_template = html_template.replace('</head>', head_injection + '</head>')
-    
-    return html_template
 
+    def __init__(self, templates: TemplateCache):
+        self.templates = templates
+        self._rendered: Optional[RenderedWidget] = None
+        self._generation = -1
+        self._renders = SingleFlight()
 
-def create_simple_card_html(notes: List[Dict[str, Any]]) -> str:
-    """Crea una card HTML simple y minimalista con las notas"""
-    total_notes = len(notes)
-    
-    # Generar items de notas
-    note_items = ""
-    for note in notes[:5]:  # Solo mostrar las primeras 5
-        category_color = {
-            "technology": "#3b82f6",
-            "learning": "#10b981",
-            "ideas": "#f59e0b",
-            "general": "#6b7280"
-        }.get(note.get("category", "general"), "#6b7280")
-        
-        tags_html = ""
-        if note.get("tags"):
-            tags_html = f"<div style='font-size: 11px; color: #9ca3af; margin-top: 4px;'>🏷️ {', '.join(note['tags'][:3])}</div>"
+    def notes_added(self, notes: List[Dict[str, Any]]) -> None:
+        self._rendered = None
+
+    def notes_removed(self, notes: List[Dict[str, Any]]) -> None:
+        self._rendered = None
+
+    async def get(self) -> RenderedWidget:
+        template = await self.templates.get()
+        generation = self.templates.generation
+        rendered = self._rendered
+        snapshot = store.snapshot
+        hit = rendered is not None and rendered.version == snapshot.version and self._generation == generation
+        metrics.cache_lookup("widget", hit)
+        if hit:
+            return rendered
         
-        note_items += f"""
+        # Un solo render por versión y plantilla aunque lo pidan varias peticiones a la vez
+        rendered, _ = await self._renders.do(
+            (snapshot.version, generation), lambda: create_widget_html(snapshot, template)
+        )
+        # Solo se cachea el widget real, nunca la página de error por falta de build;
+        # ni uno más viejo que el cacheado si otro render terminó antes
+        current = self._rendered
+        if (
+            template is not None
+            and generation == self.templates.generation
+            and (current is None or self._generation != generation or current.version <= rendered.version)
+        ):
+            self._rendered, self._generation = rendered, generation
+        return rendered
+
+
+widget_cache = store.subscribe(WidgetCache(widget_templates))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparación débil de If-None-Match (RFC 9110, sección 13.1.2)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+CATEGORY_COLORS = {
+    "technology": "#3b82f6",
+    "learning": "#10b981",
+    "ideas": "#f59e0b",
+    "general": "#6b7280"
+}
+
+
+def create_card_item_html(note: Dict[str, Any]) -> str:
+    """Fragmento HTML de una nota para la card (textos escapados)"""
+    category_color = CATEGORY_COLORS.get(note.get("category", "general"), CATEGORY_COLORS["general"])
+    escape = html.escape
+    
+    tags_html = ""
+    if note.get("tags"):
+        tags_html = f"<div style='font-size: 11px; color: #9ca3af; margin-top: 4px;'>🏷️ {escape(', '.join(note['tags'][:3]))}</div>"
+    
+    return f"""
         <div style="display: flex; align-items: start; gap: 8px; padding: 8px; border-left: 3px solid {category_color}; background: rgba(0,0,0,0.02); border-radius: 4px; margin-bottom: 8px;">
             <div style="flex: 1;">
-                <div style="font-weight: 600; color: #1f2937;">{note['title']}</div>
-                {f"<div style='font-size: 13px; color: #6b7280; margin-top: 2px;'>{note.get('description', '')}</div>" if note.get('description') else ""}
-                {f"<div style='font-size: 12px; color: #9ca3af; margin-top: 4px;'>📅 {note.get('createdAt', '')}</div>" if note.get('createdAt') else ""}
+                <div style="font-weight: 600; color: #1f2937;">{escape(note['title'])}</div>
+                {f"<div style='font-size: 13px; color: #6b7280; margin-top: 2px;'>{escape(note['description'])}</div>" if note.get('description') else ""}
+                {f"<div style='font-size: 12px; color: #9ca3af; margin-top: 4px;'>📅 {escape(note['createdAt'])}</div>" if note.get('createdAt') else ""}
                 {tags_html}
             </div>
         </div>
         """
+
+
+class CardRenderer:
+    """
+    Card de resumen con las `size` notas más recientes.
+
+    Mantiene la lista de IDs más recientes como listener del store, así que
+    montar la card no recorre el resto de notas, y cachea el fragmento HTML
+    de cada nota por (ID, contenido): el fragmento solo se reutiliza si la
+    nota no ha cambiado. Las vistas del store comparan por su posición en el
+    bloque antes que campo a campo. El escapado se hace una vez, al generar el fragmento.
+    """
+
+    def __init__(self, size: int = 5, max_fragments: int = 256):
+        self.size = size
+        self.max_fragments = max_fragments
+        self._recent: List[str] = []
+        self._fragments: "OrderedDict[str, Any]" = OrderedDict()
+
+    def notes_added(self, notes: List[Dict[str, Any]]) -> None:
+        for note in notes[-self.size:]:
+            if note["id"] in self._recent:
+                self._recent.remove(note["id"])
+            self._recent.insert(0, note["id"])
+        del self._recent[self.size:]
+
+    def notes_removed(self, notes: List[Dict[str, Any]]) -> None:
+        for note in notes:
+            self._fragments.pop(note["id"], None)
+        if any(note["id"] in self._recent for note in notes):
+            self._recent = [n["id"] for n in store.snapshot.latest(self.size)]
+
+    def fragment(self, note: Dict[str, Any]) -> str:
+        cached = self._fragments.get(note["id"])
+        hit = cached is not None and cached[0] == note
+        metrics.cache_lookup("card_fragment", hit)
+        if hit:
+            self._fragments.move_to_end(note["id"])
+            return cached[1]
+        item_html = create_card_item_html(note)
+        self._fragments[note["id"]] = (note, item_html)
+        if len(self._fragments) > self.max_fragments:
+            self._fragments.popitem(last=False)
+        return item_html
+
+    def render(self) -> str:
+        # Una nota que ya no esté (borrada entre la notificación y la petición) se omite
+        recent = [note for note in map(store.get, self._recent) if note is not None]
+        return create_simple_card_html(recent, len(store), self.fragment)
+
+
+def create_simple_card_html(
+    notes: List[Dict[str, Any]],
+    total_notes: Optional[int] = None,
+    render_item=create_card_item_html,
+) -> str:
+    """Crea una card HTML simple y minimalista con las notas"""
+    if total_notes is None:
+        total_notes = len(notes)
+    
+    # Generar items de notas
+    note_items = "".join(render_item(note) for note in notes[:5])  # Solo mostrar 5
     
-    html = f"""
+    card_html = f"""
     <!DOCTYPE html>
     <html>
     <head>
@@ -205,7 +654,43 @@ def create_simple_card_html(notes: List[Dict[str, Any]]) -> str:
     </html>
     """
     
-    return html
+    return card_html
+
+
+card_renderer = store.subscribe(CardRenderer())
+
+# Consumidores de GET /notes/changes (Server-Sent Events)
+change_feed = store.subscribe(ChangeFeed(store))
+startup.mark("indexes")
+
+
+async def warm_up() -> None:
+    """
+    Deja hecho antes de la primera petición lo que esta pagaría: localizar y
+    preparar la plantilla del widget, renderizarlo con las notas actuales,
+    comprimirlo y codificar los resultados de los métodos MCP estáticos.
+    """
+    startup.mark("app")
+    await offload.start()
+    widget = await widget_cache.get()
+    compression.warm(widget.body, widget.etag)
+    startup.mark("widget")
+    await rpc.preload()
+    startup.mark("mcp")
+    # Lo creado en el arranque vive hasta el final: fuera de las pasadas del recolector
+    gc.freeze()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Ciclo de vida: precalienta antes de aceptar peticiones y persiste el log al apagar"""
+    await warm_up()
+    startup.ready = True
+    yield
+    startup.ready = False
+    await store_writer.join()
+    store.close()
+    offload.close()
 
 
 # Configurar FastAPI
@@ -213,6 +698,7 @@ app = FastAPI(
     title="Second Brain Server",
     description="Servidor para Second Brain - gestión de notas y conocimiento personal",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configurar CORS
@@ -222,13 +708,44 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Next-Cursor"],
 )
 
+
+class StoreRefreshMiddleware:
+    """
+    Con varios workers sobre un backend compartido, aplica antes de cada
+    petición los cambios escritos por los demás procesos. Pasan por los
+    listeners, así que índices y cachés de este worker quedan al día.
+    Mientras nadie más escribe, la comprobación es una sola consulta
+    (`PRAGMA data_version`); con un backend local no hace nada.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            store.refresh()
+        await self.app(scope, receive, send)
+
+
+if getattr(store.storage, "shared", False):
+    app.add_middleware(StoreRefreshMiddleware)
+
+# La más externa: mide también el tiempo de los demás middlewares
+app.add_middleware(metrics.MetricsMiddleware)
+
+metrics.REGISTRY.gauge("second_brain_notes", "Notas en el store", lambda: len(store))
+metrics.REGISTRY.gauge("second_brain_store_version", "Versión del store (crece con cada cambio)", lambda: store.version)
+metrics.REGISTRY.gauge("second_brain_sse_consumers", "Clientes conectados a /notes/changes", lambda: len(change_feed))
+
 # Montar directorio de assets estáticos
 if ASSETS_DIR.exists():
     assets_path = ASSETS_DIR / "assets"
     if assets_path.exists():
-        app.mount("/assets", StaticFiles(directory=str(assets_path)), name="assets")
+        # Variantes .br/.gz del build por Accept-Encoding; los ficheros con hash, inmutables
+        app.mount("/assets", PrecompressedStaticFiles(directory=str(assets_path)), name="assets")
 
 
 @app.get("/")
@@ -240,7 +757,11 @@ async def root():
         "status": "running",
         "endpoints": {
             "notes": "/notes",
+            "search": "/notes/search?q=",
+            "export": "/notes/export?format=ndjson",
             "widget": "/widget",
+            "graph": "/graph",
+            "ready": "/ready",
             "mcp_tools": "/mcp/tools",
             "mcp_call": "/mcp/call"
         }
@@ -250,356 +771,615 @@ async def root():
 @app.get("/health")
 async def health():
     """Health check"""
-    return {"status": "healthy", "notes_count": len(notes_db)}
+    return {"status": "healthy", "notes_count": len(store)}
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 503 hasta terminar el precalentamiento (y durante el apagado), con los tiempos de arranque"""
+    if not startup.ready:
+        return JSONResponse(status_code=503, content={"status": "starting", "startup": startup.phases})
+    return {"status": "ready", "notes_count": len(store), "version": store.version, "startup": startup.phases}
+
 
+@app.get("/metrics")
+async def get_metrics():
+    """Métricas en formato de exposición de Prometheus"""
+    return Response(content=metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
-@app.get("/notes", response_model=List[Note])
-async def get_notes():
-    """Obtener todas las notas"""
-    return notes_db
+
+@app.get("/metrics/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str):
+    """Perfil cProfile de una petición muestreada (id en la cabecera X-Profile-Id)"""
+    profile = metrics.profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return profile
+
+
+@app.get("/notes")
+async def get_notes(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en X-Next-Cursor"),
+    sort: Literal["createdAt", "title"] = "createdAt",
+    order: Literal["asc", "desc"] = "asc",
+    fields: Optional[str] = Query(None, description="Campos separados por comas, p. ej. id,title"),
+    category: Optional[List[str]] = Query(None, description="Categoría (repetible: cualquiera de ellas)"),
+    tag: Optional[List[str]] = Query(None, description="Etiqueta (repetible)"),
+    tag_mode: Literal["and", "or"] = Query("and", description="and: todas las etiquetas; or: alguna"),
+    date_from: Optional[str] = Query(None, alias="from", description="createdAt mínimo (YYYY-MM-DD, incluido)"),
+    date_to: Optional[str] = Query(None, alias="to", description="createdAt máximo (YYYY-MM-DD, incluido)"),
+    accept_encoding: Optional[str] = Header(None),
+):
+    """Obtener las notas paginadas (total en X-Total-Count, siguiente página en X-Next-Cursor)"""
+    field_list = fields.split(",") if fields else None
+    try:
+        if category or tag or date_from or date_to:
+            page = query_notes(category, tag, tag_mode, date_from, date_to, limit, cursor, sort, order, field_list)
+        else:
+            page = list_notes(limit, cursor, sort, order, field_list)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    
+    headers = {"X-Total-Count": str(page["total"])}
+    if page["nextCursor"]:
+        headers["X-Next-Cursor"] = page["nextCursor"]
+    if len(page["notes"]) >= OFFLOAD_MIN_NOTES:
+        body = await offload.dumps("notes", page["notes"])
+    else:
+        body = metrics.timed_dumps("notes", page["notes"])
+    return await compressed_response_async(body, accept_encoding, "application/json", headers, run=offload.run_pure)
 
 
 @app.post("/notes", response_model=Note)
 async def create_note(note: Note):
     """Crear una nueva nota"""
-    note.id = str(len(notes_db) + 1)
     if not note.createdAt:
         note.createdAt = datetime.now().strftime("%Y-%m-%d")
-    note_dict = note.model_dump()
-    notes_db.append(note_dict)
-    return note_dict
+    return await store_writer.create(note.model_dump())
+
+
+@app.post("/notes/bulk")
+async def create_notes_bulk(request: Request):
+    """
+    Importar un lote de notas: array JSON o NDJSON (Content-Type application/x-ndjson).
+    Devuelve solo los IDs asignados, en el orden recibido.
+    """
+    ndjson = "ndjson" in request.headers.get("content-type", "")
+    try:
+        notes = parse_bulk_notes(await request.body(), ndjson)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    ids = await import_notes(notes)
+    return Response(content=dumps({"ids": ids, "version": store.version}), media_type="application/json")
+
+
+@app.get("/notes/export")
+async def export_notes(format: Literal["ndjson", "json"] = "ndjson"):
+    """Exportar todas las notas en streaming (NDJSON o array JSON por bloques)"""
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    return StreamingResponse(
+        export_chunks(format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="second-brain.{format}"'},
+    )
+
+
+@app.get("/notes/changes")
+async def notes_changes(
+    request: Request,
+    since: Optional[int] = Query(None, description="Versión desde la que enviar cambios (por defecto, la actual)"),
+    last_event_id: Optional[str] = Header(None, description="Último id recibido; lo envía EventSource al reconectar"),
+):
+    """Cambios del store en tiempo real (Server-Sent Events), reanudables con Last-Event-ID"""
+    if last_event_id:
+        try:
+            since = int(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID inválido")
+    return StreamingResponse(
+        change_feed.stream(since, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/notes/search", response_model=List[SearchResult])
+async def search_notes_endpoint(q: str, limit: int = Query(10, ge=1, le=100)):
+    """Buscar notas por texto con ranking BM25"""
+    return search_notes(q, limit)
 
 
 @app.get("/notes/{note_id}", response_model=Note)
 async def get_note(note_id: str):
     """Obtener una nota específica"""
-    note = next((n for n in notes_db if n["id"] == note_id), None)
+    note = store.get(note_id)
     if not note:
         raise HTTPException(status_code=404, detail="Nota no encontrada")
     return note
 
 
+@app.get("/notes/{note_id}/related", response_model=List[RelatedResult])
+async def get_related_notes(note_id: str, limit: int = Query(DEFAULT_RELATED_LIMIT, ge=1, le=50)):
+    """Notas relacionadas con una nota (similitud TF-IDF)"""
+    if note_id not in store:
+        raise HTTPException(status_code=404, detail="Nota no encontrada")
+    return related_notes(note_id, limit)
+
+
 @app.delete("/notes/{note_id}")
 async def delete_note(note_id: str):
     """Eliminar una nota"""
-    note_index = None
-    for i, note in enumerate(notes_db):
-        if note["id"] == note_id:
-            note_index = i
-            break
-    
-    if note_index is None:
+    deleted_note = await store_writer.delete(note_id)
+    if deleted_note is None:
         raise HTTPException(status_code=404, detail="Nota no encontrada")
     
-    deleted_note = notes_db.pop(note_index)
     return {"message": f"Nota '{deleted_note['title']}' eliminada correctamente", "id": note_id}
 
 
+@app.get("/graph")
+async def get_graph(
+    nodes: int = Query(DEFAULT_GRAPH_NODES, ge=1, le=MAX_GRAPH_NODES, description="Etiquetas más frecuentes a incluir"),
+    edges: int = Query(DEFAULT_GRAPH_EDGES, ge=1, le=MAX_GRAPH_EDGES, description="Aristas de más peso de cada tipo"),
+    accept_encoding: Optional[str] = Header(None),
+):
+    """Grafo de conocimiento: etiquetas, categorías, co-ocurrencias y pertenencia a categorías"""
+    body = metrics.timed_dumps("graph", knowledge_graph(nodes, edges))
+    return compressed_response(body, accept_encoding, "application/json")
+
+
 @app.get("/widget", response_class=HTMLResponse)
-async def get_widget():
-    """Obtener el widget HTML con los datos actuales"""
-    widget_html = create_widget_html(notes_db)
-    return HTMLResponse(content=widget_html)
+async def get_widget(if_none_match: Optional[str] = Header(None), accept_encoding: Optional[str] = Header(None)):
+    """Obtener el widget HTML con los datos actuales (con ETag, respuesta 304 y compresión)"""
+    widget = await widget_cache.get()
+    # ETag débil: la versión comprimida y la sin comprimir son equivalentes
+    headers = {"ETag": "W/" + widget.etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, widget.etag):
+        return Response(status_code=304, headers=headers)
+    return await compressed_response_async(
+        widget.body, accept_encoding, "text/html; charset=utf-8", headers, key=widget.etag, run=offload.run_pure
+    )
 
 
 @app.get("/card", response_class=HTMLResponse)
-async def get_card():
+async def get_card(accept_encoding: Optional[str] = Header(None)):
     """Obtener una card HTML simple con las notas"""
-    card_html = create_simple_card_html(notes_db)
-    return HTMLResponse(content=card_html)
+    card_html = card_renderer.render()
+    return compressed_response(card_html.encode("utf-8"), accept_encoding, "text/html; charset=utf-8", key=f"card:{store.version}")
 
 
 # Endpoints compatibles con MCP (formato oficial OpenAI)
-@app.post("/mcp")
-async def mcp_handler(request: Dict[str, Any]):
-    """
-    Manejador principal MCP - Compatible con ChatGPT
-    Recibe mensajes en formato JSON-RPC 2.0
-    Formato oficial según la documentación de OpenAI Apps SDK
-    """
-    method = request.get("method", "")
-    params = request.get("params", {})
-    request_id = request.get("id")
-    
-    # Initialize
-    if method == "initialize":
-        return {
-            "jsonrpc": "2.0",
-            "id": request_id,
-            "result": {
-                "protocolVersion": "2024-11-05",
-                "capabilities": {
-                    "tools": {},
-                    "resources": {}
-                },
-                "serverInfo": {
-                    "name": "Second Brain MCP Server",
-                    "version": "1.0.0"
-                }
-            }
-        }
-    
-    # List Resources - CRÍTICO para widgets
-    elif method == "resources/list":
-        card_html = create_simple_card_html(notes_db)
-        return {
-            "jsonrpc": "2.0",
-            "id": request_id,
-            "result": {
-                "resources": [
-                    {
-                        "uri": "ui://widget/second-brain.html",
-                        "name": "Second Brain Widget",
-                        "description": "Widget interactivo para gestionar notas y conocimiento",
-                        "mimeType": "text/html+skybridge"
-                    }
-                ]
+WIDGET_URI = "ui://widget/second-brain.html"
+
+# Admisión de las llamadas caras (widget, listados, grafo): cada una admite como
+# mucho N ejecuciones a la vez y deja esperar a NOTES_ADMISSION_QUEUE; el resto
+# recibe "servidor ocupado". Las peticiones idénticas en vuelo se resuelven una vez
+HEAVY_CALL_LIMIT = int(os.environ.get("NOTES_HEAVY_CALL_LIMIT", "4"))
+WIDGET_CALL_LIMIT = int(os.environ.get("NOTES_WIDGET_CALL_LIMIT", "2"))
+ADMISSION_QUEUE = int(os.environ.get("NOTES_ADMISSION_QUEUE", "64"))
+
+rpc = Dispatcher(version=lambda: store.version, max_queue=ADMISSION_QUEUE, offload=offload)
+
+metrics.REGISTRY.gauge(
+    "second_brain_admission_queue_depth", "Peticiones JSON-RPC esperando turno por método y herramienta",
+    lambda: {labels: gate.waiting for labels, gate in rpc.gates.items()}, ("method", "tool"))
+metrics.REGISTRY.gauge(
+    "second_brain_admission_in_flight", "Peticiones JSON-RPC admitidas en ejecución por método y herramienta",
+    lambda: {labels: gate.active for labels, gate in rpc.gates.items()}, ("method", "tool"))
+
+
+def widget_tool_meta(invoking: str, invoked: str) -> Dict[str, Any]:
+    """Metadata de OpenAI Apps SDK para herramientas que muestran el widget"""
+    return {
+        "openai/outputTemplate": WIDGET_URI,
+        "openai/toolInvocation/invoking": invoking,
+        "openai/toolInvocation/invoked": invoked
+    }
+
+
+def tool_result(text: str, structured_content: Dict[str, Any]) -> Dict[str, Any]:
+    """Resultado de herramienta en el formato oficial OpenAI Apps SDK"""
+    return {
+        "content": [
+            {
+                "type": "text",
+                "text": text
             }
+        ],
+        "structuredContent": structured_content
+    }
+
+
+# Initialize
+@rpc.method("initialize", static=True)
+def mcp_initialize(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "protocolVersion": "2024-11-05",
+        "capabilities": {
+            "tools": {},
+            "resources": {}
+        },
+        "serverInfo": {
+            "name": "Second Brain MCP Server",
+            "version": "1.0.0"
         }
-    
-    # Read Resource - Devuelve el HTML del widget principal de React
-    elif method == "resources/read":
-        uri = params.get("uri")
-        if uri == "ui://widget/second-brain.html":
-            widget_html = create_widget_html(notes_db)
-            return {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "result": {
-                    "contents": [
-                        {
-                            "uri": "ui://widget/second-brain.html",
-                            "mimeType": "text/html+skybridge",
-                            "text": widget_html,
-                            "_meta": {
-                                "openai/widgetPrefersBorder": False
-                            }
-                        }
-                    ]
-                }
+    }
+
+
+# List Resources - CRÍTICO para widgets
+@rpc.method("resources/list", static=True)
+def mcp_resources_list(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "resources": [
+            {
+                "uri": WIDGET_URI,
+                "name": "Second Brain Widget",
+                "description": "Widget interactivo para gestionar notas y conocimiento",
+                "mimeType": "text/html+skybridge"
             }
-        else:
-            return {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "error": {
-                    "code": -32602,
-                    "message": f"Resource not found: {uri}"
+        ]
+    }
+
+
+# Read Resource - Devuelve el HTML del widget principal de React
+@rpc.method("resources/read", limit=WIDGET_CALL_LIMIT, coalesce=True)
+async def mcp_resources_read(params: Dict[str, Any]) -> Dict[str, Any]:
+    uri = params.get("uri")
+    if uri != WIDGET_URI:
+        raise RpcError(INVALID_PARAMS, f"Resource not found: {uri}")
+    widget = await widget_cache.get()
+    return {
+        "contents": [
+            {
+                "uri": WIDGET_URI,
+                "mimeType": "text/html+skybridge",
+                "text": widget.text,
+                "_meta": {
+                    "openai/widgetPrefersBorder": False,
+                    # El widget abre un EventSource contra /notes/changes
+                    "openai/widgetCSP": {
+                        "connect_domains": [BASE_URL],
+                        "resource_domains": [BASE_URL]
+                    }
                 }
             }
+        ]
+    }
+
+
+# List Tools - Con metadata oficial de OpenAI
+@rpc.method("tools/list", static=True)
+def mcp_tools_list(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {"tools": rpc.tool_definitions()}
+
+
+@rpc.tool(
+    "get_notes",
+    description="Obtiene las notas del Second Brain con un widget interactivo (paginadas)",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "limit": {"type": "integer", "minimum": 1, "maximum": MAX_PAGE_SIZE, "default": DEFAULT_PAGE_SIZE, "description": "Número máximo de notas por página"},
+            "cursor": {"type": "string", "description": "Cursor nextCursor de la página anterior"},
+            "sort": {"type": "string", "enum": ["createdAt", "title"], "default": "createdAt", "description": "Campo de ordenación"},
+            "order": {"type": "string", "enum": ["asc", "desc"], "default": "asc", "description": "Dirección de ordenación"},
+            "fields": {"type": "array", "items": {"type": "string", "enum": list(NOTE_FIELDS)}, "description": "Campos a devolver, p. ej. [\"id\", \"title\"]"},
+            "since": {"type": "integer", "description": "Versión que ya tiene el cliente: si es reciente se devuelven solo los cambios"},
+        },
+    },
+    meta=widget_tool_meta("Obteniendo notas", "Notas obtenidas"),
+    limit=HEAVY_CALL_LIMIT,
+    coalesce=True,
+)
+def tool_get_notes(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    # Un cliente con una versión reciente recibe solo los cambios
+    since = arguments.get("since")
+    delta = notes_delta(since) if isinstance(since, int) else None
+    if delta is not None:
+        return tool_result(
+            f"Tienes {delta['total']} nota(s) en tu Second Brain ({len(delta['changes'])} cambio(s) desde la versión {since}).",
+            delta,
+        )
     
-    # List Tools - Con metadata oficial de OpenAI
-    elif method == "tools/list":
-        return {
-            "jsonrpc": "2.0",
-            "id": request_id,
-            "result": {
-                "tools": [
-                    {
-                        "name": "get_notes",
-                        "description": "Obtiene todas las notas del Second Brain con un widget interactivo",
-                        "inputSchema": {
-                            "type": "object",
-                            "properties": {},
-                        },
-                        "_meta": {
-                            "openai/outputTemplate": "ui://widget/second-brain.html",
-                            "openai/toolInvocation/invoking": "Obteniendo notas",
-                            "openai/toolInvocation/invoked": "Notas obtenidas"
-                        }
-                    },
-                    {
-                        "name": "create_note",
-                        "description": "Crea una nueva nota en el Second Brain",
-                        "inputSchema": {
-                            "type": "object",
-                            "properties": {
-                                "title": {"type": "string", "description": "Título de la nota"},
-                                "description": {"type": "string", "description": "Contenido detallado de la nota"},
-                                "category": {"type": "string", "enum": ["general", "technology", "learning", "ideas"], "default": "general", "description": "Categoría de la nota"},
-                                "tags": {"type": "array", "items": {"type": "string"}, "description": "Lista de etiquetas"},
-                            },
-                            "required": ["title"],
-                        },
-                        "_meta": {
-                            "openai/outputTemplate": "ui://widget/second-brain.html",
-                            "openai/toolInvocation/invoking": "Creando nota",
-                            "openai/toolInvocation/invoked": "Nota creada"
-                        }
-                    },
-                    {
-                        "name": "get_note",
-                        "description": "Obtiene una nota específica por su ID",
-                        "inputSchema": {
-                            "type": "object",
-                            "properties": {
-                                "note_id": {"type": "string", "description": "ID de la nota"},
-                            },
-                            "required": ["note_id"],
-                        },
-                        "_meta": {
-                            "openai/outputTemplate": "ui://widget/second-brain.html",
-                            "openai/toolInvocation/invoking": "Buscando nota",
-                            "openai/toolInvocation/invoked": "Nota encontrada"
-                        }
+    try:
+        page = list_notes(
+            arguments.get("limit", DEFAULT_PAGE_SIZE),
+            arguments.get("cursor"),
+            arguments.get("sort", "createdAt"),
+            arguments.get("order", "asc"),
+            arguments.get("fields"),
+        )
+    except (TypeError, ValueError) as exc:
+        raise RpcError(INVALID_PARAMS, str(exc))
+    return tool_result(f"Tienes {page['total']} nota(s) en tu Second Brain.", page)
+
+
+@rpc.tool(
+    "query_notes",
+    description="Filtra notas por categoría, etiquetas y rango de fechas, con recuentos por categoría y etiqueta",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "category": {
+                "anyOf": [{"type": "string"}, {"type": "array", "items": {"type": "string"}}],
+                "description": "Categoría o lista de categorías (cualquiera de ellas)",
+            },
+            "tags": {"type": "array", "items": {"type": "string"}, "description": "Etiquetas a filtrar"},
+            "tagMode": {"type": "string", "enum": ["and", "or"], "default": "and", "description": "and: todas las etiquetas; or: alguna"},
+            "from": {"type": "string", "description": "createdAt mínimo (YYYY-MM-DD, incluido)"},
+            "to": {"type": "string", "description": "createdAt máximo (YYYY-MM-DD, incluido)"},
+            "limit": {"type": "integer", "minimum": 1, "maximum": MAX_PAGE_SIZE, "default": DEFAULT_PAGE_SIZE, "description": "Número máximo de notas por página"},
+            "cursor": {"type": "string", "description": "Cursor nextCursor de la página anterior"},
+            "sort": {"type": "string", "enum": ["createdAt", "title"], "default": "createdAt", "description": "Campo de ordenación"},
+            "order": {"type": "string", "enum": ["asc", "desc"], "default": "asc", "description": "Dirección de ordenación"},
+            "fields": {"type": "array", "items": {"type": "string", "enum": list(NOTE_FIELDS)}, "description": "Campos a devolver"},
+            "facetLimit": {"type": "integer", "minimum": 1, "default": DEFAULT_FACET_LIMIT, "description": "Valores más frecuentes a contar por faceta"},
+        },
+    },
+    meta=widget_tool_meta("Filtrando notas", "Notas filtradas"),
+    limit=HEAVY_CALL_LIMIT,
+    coalesce=True,
+)
+def tool_query_notes(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    # Una sola categoría o etiqueta puede llegar como cadena: iterarla daría sus caracteres
+    categories = arguments.get("category")
+    if isinstance(categories, str):
+        categories = [categories]
+    tags = arguments.get("tags")
+    if isinstance(tags, str):
+        tags = [tags]
+    try:
+        result = query_notes(
+            categories,
+            tags,
+            arguments.get("tagMode", "and"),
+            arguments.get("from"),
+            arguments.get("to"),
+            arguments.get("limit", DEFAULT_PAGE_SIZE),
+            arguments.get("cursor"),
+            arguments.get("sort", "createdAt"),
+            arguments.get("order", "asc"),
+            arguments.get("fields"),
+            arguments.get("facetLimit", DEFAULT_FACET_LIMIT),
+        )
+    except (TypeError, ValueError) as exc:
+        raise RpcError(INVALID_PARAMS, str(exc))
+    return tool_result(f"{result['total']} nota(s) coinciden con el filtro.", result)
+
+
+@rpc.tool(
+    "create_note",
+    description="Crea una nueva nota en el Second Brain",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "title": {"type": "string", "description": "Título de la nota"},
+            "description": {"type": "string", "description": "Contenido detallado de la nota"},
+            "category": {"type": "string", "enum": ["general", "technology", "learning", "ideas"], "default": "general", "description": "Categoría de la nota"},
+            "tags": {"type": "array", "items": {"type": "string"}, "description": "Lista de etiquetas"},
+            "response": RESPONSE_MODE_SCHEMA,
+        },
+        "required": ["title"],
+    },
+    meta=widget_tool_meta("Creando nota", "Nota creada"),
+    write=True,
+)
+async def tool_create_note(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    # Mismo modelo que POST /notes: un título o unas etiquetas de otro tipo no llegan al store
+    try:
+        note = Note.model_validate({
+            "title": arguments.get("title", "Nueva nota"),
+            "description": arguments.get("description"),
+            "createdAt": datetime.now().strftime("%Y-%m-%d"),
+            "category": arguments.get("category", "general"),
+            "tags": arguments.get("tags", []),
+        })
+    except ValidationError as exc:
+        raise RpcError(INVALID_PARAMS, validation_message(exc))
+    base_version = store.version
+    new_note = await store_writer.create(note.model_dump())
+    return tool_result(f"Nota creada: \"{new_note['title']}\".", mutation_content(arguments, base_version))
+
+
+@rpc.tool(
+    "create_notes",
+    description="Crea varias notas de una vez (importación); devuelve solo los IDs asignados",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "notes": {
+                "type": "array",
+                "maxItems": MAX_BULK_NOTES,
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "title": {"type": "string", "description": "Título de la nota"},
+                        "description": {"type": "string", "description": "Contenido detallado de la nota"},
+                        "createdAt": {"type": "string", "description": "Fecha de creación (YYYY-MM-DD); por defecto, hoy"},
+                        "category": {"type": "string", "default": "general", "description": "Categoría de la nota"},
+                        "tags": {"type": "array", "items": {"type": "string"}, "description": "Lista de etiquetas"},
                     },
-                    {
-                        "name": "delete_note",
-                        "description": "Elimina una nota del Second Brain por su ID",
-                        "inputSchema": {
-                            "type": "object",
-                            "properties": {
-                                "note_id": {"type": "string", "description": "ID de la nota a eliminar"},
-                            },
-                            "required": ["note_id"],
-                        },
-                        "_meta": {
-                            "openai/outputTemplate": "ui://widget/second-brain.html",
-                            "openai/toolInvocation/invoking": "Eliminando nota",
-                            "openai/toolInvocation/invoked": "Nota eliminada"
-                        }
-                    }
-                ]
-            }
-        }
-    
-    # Call Tool
-    elif method == "tools/call":
-        tool_name = params.get("name")
-        arguments = params.get("arguments", {})
-        
-        if tool_name == "get_notes":
-            total_notes = len(notes_db)
-            
-            # Formato oficial OpenAI Apps SDK
-            return {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "result": {
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": f"Tienes {total_notes} nota(s) en tu Second Brain."
-                        }
-                    ],
-                    "structuredContent": {
-                        "notes": notes_db
-                    }
-                }
-            }
-        
-        elif tool_name == "create_note":
-            new_note = {
-                "id": str(len(notes_db) + 1),
-                "title": arguments.get("title", "Nueva nota"),
-                "description": arguments.get("description"),
-                "createdAt": datetime.now().strftime("%Y-%m-%d"),
-                "category": arguments.get("category", "general"),
-                "tags": arguments.get("tags", []),
-            }
-            notes_db.append(new_note)
-            
-            # Formato oficial OpenAI Apps SDK
-            return {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "result": {
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": f"Nota creada: \"{new_note['title']}\"."
-                        }
-                    ],
-                    "structuredContent": {
-                        "notes": notes_db
-                    }
-                }
-            }
-        
-        elif tool_name == "get_note":
-            note_id = arguments.get("note_id")
-            note = next((n for n in notes_db if n["id"] == note_id), None)
-            
-            if not note:
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "error": {
-                        "code": -32602,
-                        "message": f"Nota {note_id} no encontrada"
-                    }
-                }
-            
-            # Formato oficial OpenAI Apps SDK
-            return {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "result": {
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": f"Nota encontrada: \"{note['title']}\"."
-                        }
-                    ],
-                    "structuredContent": {
-                        "notes": [note]
-                    }
-                }
-            }
-        
-        elif tool_name == "delete_note":
-            note_id = arguments.get("note_id")
-            note_index = None
-            
-            # Buscar la nota por ID
-            for i, note in enumerate(notes_db):
-                if note["id"] == note_id:
-                    note_index = i
-                    break
-            
-            if note_index is None:
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "error": {
-                        "code": -32602,
-                        "message": f"Nota {note_id} no encontrada"
-                    }
-                }
-            
-            # Guardar el título antes de eliminar para el mensaje
-            deleted_note = notes_db[note_index]
-            deleted_title = deleted_note["title"]
-            
-            # Eliminar la nota
-            notes_db.pop(note_index)
-            
-            # Formato oficial OpenAI Apps SDK
-            return {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "result": {
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": f"Nota eliminada: \"{deleted_title}\"."
-                        }
-                    ],
-                    "structuredContent": {
-                        "notes": notes_db
-                    }
-                }
-            }
+                    "required": ["title"],
+                },
+            },
+        },
+        "required": ["notes"],
+    },
+    write=True,
+)
+async def tool_create_notes(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    notes = arguments.get("notes")
+    if not isinstance(notes, list):
+        raise RpcError(INVALID_PARAMS, "notes debe ser un array")
+    if len(notes) > MAX_BULK_NOTES:
+        raise RpcError(INVALID_PARAMS, f"Como máximo {MAX_BULK_NOTES} notas por lote")
+    try:
+        validated = NOTE_LIST.validate_python(notes)
+    except ValidationError as exc:
+        raise RpcError(INVALID_PARAMS, validation_message(exc))
+    ids = await import_notes(validated)
+    return tool_result(f"{len(ids)} nota(s) creadas.", {"ids": ids, "version": store.version})
+
+
+@rpc.tool(
+    "get_note",
+    description="Obtiene una nota específica por su ID",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "note_id": {"type": "string", "description": "ID de la nota"},
+        },
+        "required": ["note_id"],
+    },
+    meta=widget_tool_meta("Buscando nota", "Nota encontrada"),
+)
+def tool_get_note(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    note_id = note_id_argument(arguments)
+    note = store.get(note_id)
+    if not note:
+        raise RpcError(INVALID_PARAMS, f"Nota {note_id} no encontrada")
+    content: Dict[str, Any] = {"notes": [note]}
+    # Las relacionadas son un extra: si su índice falla, la nota se devuelve igual
+    try:
+        content["related"] = [
+            {"id": r["note"]["id"], "title": r["note"]["title"], "category": r["note"].get("category"), "score": r["score"]}
+            for r in related_notes(note_id)
+        ]
+    except Exception:
+        logger.exception("Error calculando las notas relacionadas con %s", note_id)
+    return tool_result(f"Nota encontrada: \"{note['title']}\".", content)
+
+
+@rpc.tool(
+    "find_related_notes",
+    description="Encuentra las notas más relacionadas con una nota (por título, contenido y etiquetas)",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "note_id": {"type": "string", "description": "ID de la nota de referencia"},
+            "limit": {"type": "integer", "minimum": 1, "maximum": 50, "default": DEFAULT_RELATED_LIMIT, "description": "Número máximo de resultados"},
+        },
+        "required": ["note_id"],
+    },
+    meta=widget_tool_meta("Buscando notas relacionadas", "Notas relacionadas encontradas"),
+)
+def tool_find_related_notes(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    note_id = note_id_argument(arguments)
+    note = store.get(note_id)
+    if not note:
+        raise RpcError(INVALID_PARAMS, f"Nota {note_id} no encontrada")
+    try:
+        limit = max(1, min(int(arguments.get("limit", DEFAULT_RELATED_LIMIT)), 50))
+    except (TypeError, ValueError):
+        raise RpcError(INVALID_PARAMS, "limit debe ser un entero")
+    results = related_notes(note_id, limit)
+    return tool_result(
+        f"{len(results)} nota(s) relacionadas con \"{note['title']}\".",
+        {
+            "notes": [r["note"] for r in results],
+            "scores": {r["note"]["id"]: r["score"] for r in results},
+            "source": note_id
+        },
+    )
+
+
+@rpc.tool(
+    "search_notes",
+    description="Busca notas por texto en título, contenido y etiquetas (ignora acentos)",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "query": {"type": "string", "description": "Texto a buscar"},
+            "limit": {"type": "integer", "minimum": 1, "maximum": 100, "default": 10, "description": "Número máximo de resultados"},
+        },
+        "required": ["query"],
+    },
+    meta=widget_tool_meta("Buscando notas", "Búsqueda completada"),
+)
+def tool_search_notes(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    query = arguments.get("query", "")
+    try:
+        limit = max(1, min(int(arguments.get("limit", 10)), 100))
+    except (TypeError, ValueError):
+        raise RpcError(INVALID_PARAMS, "limit debe ser un entero")
+    results = search_notes(query, limit)
+    return tool_result(
+        f"{len(results)} nota(s) encontradas para \"{query}\".",
+        {
+            "notes": [r["note"] for r in results],
+            "scores": {r["note"]["id"]: r["score"] for r in results}
+        },
+    )
+
+
+@rpc.tool(
+    "get_graph",
+    description="Obtiene el mapa de conocimiento: etiquetas y categorías más frecuentes y qué etiquetas aparecen juntas",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "nodes": {"type": "integer", "minimum": 1, "maximum": MAX_GRAPH_NODES, "default": DEFAULT_GRAPH_NODES, "description": "Etiquetas más frecuentes a incluir"},
+            "edges": {"type": "integer", "minimum": 1, "maximum": MAX_GRAPH_EDGES, "default": DEFAULT_GRAPH_EDGES, "description": "Aristas de más peso de cada tipo"},
+        },
+    },
+    limit=HEAVY_CALL_LIMIT,
+    coalesce=True,
+)
+def tool_get_graph(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        nodes = max(1, min(int(arguments.get("nodes", DEFAULT_GRAPH_NODES)), MAX_GRAPH_NODES))
+        edges = max(1, min(int(arguments.get("edges", DEFAULT_GRAPH_EDGES)), MAX_GRAPH_EDGES))
+    except (TypeError, ValueError):
+        raise RpcError(INVALID_PARAMS, "nodes y edges deben ser enteros")
+    graph = knowledge_graph(nodes, edges)
+    top_tags = [n["label"] for n in graph["nodes"] if n["type"] == "tag"][:5]
+    text = f"{graph['totals']['tags']} etiqueta(s) en {graph['totals']['categories']} categoría(s)."
+    if top_tags:
+        text += " Más frecuentes: " + ", ".join(top_tags) + "."
+    return tool_result(text, graph)
+
+
+@rpc.tool(
+    "delete_note",
+    description="Elimina una nota del Second Brain por su ID",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "note_id": {"type": "string", "description": "ID de la nota a eliminar"},
+            "response": RESPONSE_MODE_SCHEMA,
+        },
+        "required": ["note_id"],
+    },
+    meta=widget_tool_meta("Eliminando nota", "Nota eliminada"),
+    write=True,
+)
+async def tool_delete_note(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    note_id = note_id_argument(arguments)
+    base_version = store.version
+    deleted_note = await store_writer.delete(note_id)
+    if deleted_note is None:
+        raise RpcError(INVALID_PARAMS, f"Nota {note_id} no encontrada")
+    return tool_result(f"Nota eliminada: \"{deleted_note['title']}\".", mutation_content(arguments, base_version))
+
+
+@app.post("/mcp")
+async def mcp_handler(request: Request):
+    """
+    Manejador principal MCP - Compatible con ChatGPT
+    Recibe mensajes en formato JSON-RPC 2.0, individuales o en lote
+    Formato oficial según la documentación de OpenAI Apps SDK
+    """
+    try:
+        payload = loads(await request.body())
+    except ValueError:
+        return Response(content=dumps(error_response(None, PARSE_ERROR, "JSON inválido")), media_type="application/json")
     
-    # Método no soportado
-    return {
-        "jsonrpc": "2.0",
-        "id": request_id,
-        "error": {
-            "code": -32601,
-            "message": f"Método no soportado: {method}"
-        }
-    }
+    # Las respuestas ya vienen codificadas: sin pasar por jsonable_encoder
+    body = await rpc.dispatch(payload)
+    if body is None:
+        # Solo notificaciones: no hay nada que responder
+        return Response(status_code=202)
+    return await compressed_response_async(body, request.headers.get("accept-encoding"), "application/json", run=offload.run_pure)
 
 
 @app.options("/mcp")
@@ -613,7 +1393,7 @@ async def mcp_options():
 async def list_tools_get():
     """Lista las herramientas disponibles (para debugging)"""
     return {
-        "tools": ["get_notes", "create_note", "get_note", "delete_note"],
+        "tools": list(rpc.tools),
         "note": "Use POST /mcp with JSON-RPC 2.0 format for actual MCP communication"
     }
 
@@ -622,4 +1402,14 @@ if __name__ == "__main__":
     import uvicorn
     import os
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    if offload.mode == "process":
+        # Los procesos del pool importarían de nuevo este módulo (y cargarían otro store)
+        raise SystemExit("NOTES_OFFLOAD=process requiere arrancar con uvicorn: uvicorn server_python.main:app")
+    if workers > 1:
+        # Cada worker es un proceso con su propio store: solo comparten notas vía SQLite
+        if not os.environ.get("NOTES_SQLITE_PATH"):
+            raise SystemExit("WEB_CONCURRENCY > 1 requiere NOTES_SQLITE_PATH (store compartido)")
+        uvicorn.run("server_python.main:app", host="0.0.0.0", port=port, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,266 @@
+"""
+Métricas del servidor en formato de exposición de Prometheus
+Contadores, histogramas y gauges mínimos, sin dependencias externas
+"""
+
+import bisect
+import io
+import itertools
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .serialization import dumps
+
+# Latencias de 100 µs a 10 s; tamaños de 128 B a 64 MB
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = tuple(128 * 4 ** i for i in range(10))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    """
+    Histograma con cubos fijos. Cada observación incrementa un solo cubo
+    (búsqueda binaria); los acumulados que pide Prometheus se calculan al exportar.
+    """
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...], labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = labelnames
+        # etiquetas -> [observaciones por cubo..., por encima del último, suma, total]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def samples(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, series in sorted(self._series.items()):
+            cumulative = itertools.accumulate(series[:len(self.buckets) + 1])
+            for bound, count in zip(self.buckets + (float("inf"),), cumulative):
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {count}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-2])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}"
+
+
+class Gauge:
+    """Valor calculado al exportar: `callback` devuelve un número o {etiquetas: número}"""
+
+    def __init__(self, name: str, help: str, callback: Callable[[], Any], labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.labelnames = labelnames
+
+    def samples(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        value = self.callback()
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for labels, number in sorted(items):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(number)}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: "OrderedDict[str, Any]" = OrderedDict()
+
+    def _register(self, metric: Any) -> Any:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...], labelnames: Tuple[str, ...] = ()) -> Histogram:
+        return self._register(Histogram(name, help, buckets, labelnames))
+
+    def gauge(self, name: str, help: str, callback: Callable[[], Any], labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help, callback, labelnames))
+
+    def render(self) -> bytes:
+        lines = itertools.chain.from_iterable(metric.samples() for metric in self.metrics.values())
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+REGISTRY = Registry()
+
+http_requests = REGISTRY.counter(
+    "second_brain_http_requests_total", "Peticiones HTTP por método, ruta y estado", ("method", "path", "status"))
+http_latency = REGISTRY.histogram(
+    "second_brain_http_request_duration_seconds", "Duración de las peticiones HTTP", LATENCY_BUCKETS, ("method", "path"))
+http_response_size = REGISTRY.histogram(
+    "second_brain_http_response_size_bytes", "Tamaño del cuerpo de las respuestas HTTP", SIZE_BUCKETS, ("path",))
+
+rpc_requests = REGISTRY.counter(
+    "second_brain_mcp_requests_total", "Peticiones JSON-RPC por método y herramienta", ("method", "tool"))
+rpc_errors = REGISTRY.counter(
+    "second_brain_mcp_errors_total", "Respuestas JSON-RPC con error por método, herramienta y código", ("method", "tool", "code"))
+rpc_latency = REGISTRY.histogram(
+    "second_brain_mcp_request_duration_seconds", "Duración de cada petición JSON-RPC (sin serializar)", LATENCY_BUCKETS, ("method", "tool"))
+rpc_response_size = REGISTRY.histogram(
+    "second_brain_mcp_response_size_bytes", "Tamaño de cada respuesta JSON-RPC", SIZE_BUCKETS, ("method", "tool"))
+
+serialization_time = REGISTRY.histogram(
+    "second_brain_serialization_duration_seconds", "Tiempo de codificación a JSON", LATENCY_BUCKETS, ("what",))
+
+admission_shed = REGISTRY.counter(
+    "second_brain_admission_shed_total", "Peticiones JSON-RPC descartadas con la cola de admisión llena", ("method", "tool"))
+coalesced_requests = REGISTRY.counter(
+    "second_brain_coalesced_requests_total", "Peticiones JSON-RPC resueltas con una ejecución idéntica en vuelo", ("method", "tool"))
+
+cache_requests = REGISTRY.counter(
+    "second_brain_cache_requests_total", "Consultas a cachés internas por resultado (hit/miss)", ("cache", "result"))
+
+
+def _hit_ratios() -> Dict[Tuple[str], float]:
+    caches = {labels[0] for labels in cache_requests._values}
+    ratios = {}
+    for cache in caches:
+        hits, misses = cache_requests.value(cache, "hit"), cache_requests.value(cache, "miss")
+        ratios[(cache,)] = hits / (hits + misses) if hits + misses else 0.0
+    return ratios
+
+
+REGISTRY.gauge("second_brain_cache_hit_ratio", "Proporción de aciertos de cada caché", _hit_ratios, ("cache",))
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    cache_requests.inc(cache, "hit" if hit else "miss")
+
+
+def timed_dumps(what: str, obj: Any) -> bytes:
+    """`dumps` midiendo el tiempo de serialización"""
+    start = time.perf_counter()
+    data = dumps(obj)
+    serialization_time.observe(time.perf_counter() - start, what)
+    return data
+
+
+# Perfiles por petición (cabecera X-Profile), muestreados con NOTES_PROFILE_SAMPLE_RATE
+PROFILE_SAMPLE_RATE = float(os.environ.get("NOTES_PROFILE_SAMPLE_RATE", "0"))
+PROFILES_KEPT = 20
+profiles: "OrderedDict[str, str]" = OrderedDict()
+_profile_ids = itertools.count(1)
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI: cuenta y cronometra cada petición HTTP por plantilla de
+    ruta (p. ej. /notes/{note_id}, para no disparar la cardinalidad) y mide
+    el tamaño del cuerpo enviado.
+
+    Si la petición trae la cabecera `X-Profile` y sale en el muestreo, se
+    perfila con cProfile; el resultado se guarda (los últimos PROFILES_KEPT)
+    y la respuesta indica su id en `X-Profile-Id`. Con la tasa a 0 (por
+    defecto) la cabecera se ignora. El perfil cubre todo el bucle de eventos
+    mientras dura la petición, incluidas otras peticiones concurrentes.
+    """
+
+    def __init__(self, app: Any, sample_rate: Optional[float] = None):
+        self.app = app
+        self.sample_rate = PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+        self._profiling = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+        profile_id = None
+        if self.sample_rate > 0 and not self._profiling and any(name == b"x-profile" for name, _ in scope["headers"]):
+            if random.random() < self.sample_rate:
+                profile_id = str(next(_profile_ids))
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profile_id is not None:
+                    message = dict(message, headers=list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())])
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        profiler = None
+        if profile_id is not None:
+            # Importación diferida: cProfile y pstats solo hacen falta al perfilar
+            import cProfile
+
+            self._profiling = True
+            profiler = cProfile.Profile()
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+                self._store_profile(profile_id, scope, elapsed, profiler)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or ("unmatched" if status == 404 else "other")
+            http_requests.inc(scope["method"], path, str(status))
+            http_latency.observe(elapsed, scope["method"], path)
+            http_response_size.observe(size, path)
+
+    @staticmethod
+    def _store_profile(profile_id: str, scope: Any, elapsed: float, profiler: Any) -> None:
+        import pstats
+
+        out = io.StringIO()
+        out.write(f"{scope['method']} {scope['path']} en {elapsed * 1000:.2f} ms\n\n")
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(40)
+        profiles[profile_id] = out.getvalue()
+        while len(profiles) > PROFILES_KEPT:
+            profiles.popitem(last=False)
@@ -0,0 +1,120 @@
+"""
+Trabajo de CPU fuera del bucle de eventos
+Renderizado, codificación JSON y compresión de respuestas grandes en un pool de hilos o de procesos
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+
+from . import metrics
+from .serialization import dumps
+
+OFFLOAD_MODES = ("inline", "thread", "process")
+
+
+def _timed_dumps(obj: Any) -> Tuple[bytes, float]:
+    start = time.perf_counter()
+    return dumps(obj), time.perf_counter() - start
+
+
+def available_cpus() -> int:
+    """CPUs que puede usar este proceso (en un contenedor, menos que las de la máquina)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _ping() -> None:
+    """Tarea vacía para arrancar los procesos del pool antes de la primera petición"""
+
+
+class Offloader:
+    """
+    Ejecuta el trabajo caro de una petición sin bloquear el bucle de eventos,
+    según `mode`:
+
+        inline   en el propio bucle, como antes (para comparar o depurar)
+        thread   en un pool de hilos; la compresión y los hashes sueltan el
+                 GIL, el resto lo comparte con el bucle en turnos cortos, así
+                 que incluso con una sola CPU una petición corta no espera a
+                 que acabe un renderizado entero
+        process  lo que solo recibe bytes y cadenas (`run_pure`: plantillas,
+                 compresión) en un pool de procesos, que sí usa otras CPUs;
+                 lo demás, en el de hilos
+
+    `run` es para funciones que leen objetos del servidor (snapshots, vistas
+    de notas): mandarlas a otro proceso obligaría a copiarlas, y eso cuesta
+    tanto como el trabajo que se quería repartir. Las funciones de `run_pure`
+    deben ser de módulo (se envían por nombre) y sus argumentos serializables.
+    Los procesos se crean con spawn e importan el módulo principal del padre:
+    el servidor debe arrancarse con uvicorn (`uvicorn server_python.main:app`).
+    """
+
+    def __init__(self, mode: str = "thread", workers: Optional[int] = None):
+        if mode not in OFFLOAD_MODES:
+            raise ValueError(f"Modo de offload desconocido: {mode} (usa {', '.join(OFFLOAD_MODES)})")
+        self.mode = mode
+        self.workers = workers
+        self._threads: Optional[Executor] = None
+        self._processes: Optional[Executor] = None
+
+    def _thread_pool(self) -> Executor:
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(self.workers, thread_name_prefix="offload")
+        return self._threads
+
+    def _process_pool(self) -> Executor:
+        if self._processes is None:
+            # spawn: un fork copiaría el store entero y los hilos del proceso padre
+            self._processes = ProcessPoolExecutor(self.process_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._processes
+
+    @property
+    def process_workers(self) -> int:
+        return self.workers or min(4, available_cpus())
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.mode == "inline":
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._thread_pool(), fn, *args)
+
+    async def run_pure(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.mode == "process":
+            return await asyncio.get_running_loop().run_in_executor(self._process_pool(), fn, *args)
+        return await self.run(fn, *args)
+
+    async def dumps(self, what: str, obj: Any) -> bytes:
+        """`metrics.timed_dumps` en el pool (en hilos: el objeto puede tener vistas de notas)"""
+        if self.mode == "inline":
+            return metrics.timed_dumps(what, obj)
+        data, elapsed = await self.run(_timed_dumps, obj)
+        # Las métricas se actualizan solo desde el bucle
+        metrics.serialization_time.observe(elapsed, what)
+        return data
+
+    async def start(self) -> None:
+        """Arranca los procesos del pool (si los hay) en el arranque y no en la primera petición"""
+        if self.mode == "process":
+            pool = self._process_pool()
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(loop.run_in_executor(pool, _ping) for _ in range(self.process_workers)))
+
+    def close(self) -> None:
+        for pool in (self._threads, self._processes):
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+        self._threads = self._processes = None
+
+
+def create_offloader_from_env() -> Offloader:
+    """
+    Offloader según NOTES_OFFLOAD (inline, thread o process; por defecto
+    thread) y NOTES_OFFLOAD_WORKERS (por defecto, lo que elija cada pool)
+    """
+    mode = os.environ.get("NOTES_OFFLOAD", "thread")
+    workers = int(os.environ.get("NOTES_OFFLOAD_WORKERS", "0")) or None
+    return Offloader(mode, workers)
@@ -0,0 +1,176 @@
+"""
+Notas relacionadas para Second Brain
+Similitud coseno entre vectores TF-IDF de título, descripción y etiquetas (con NumPy si está instalado)
+"""
+
+import heapq
+import math
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from .search import note_terms
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional: sin él se puntúa en Python puro, bastante más lento
+    np = None
+
+
+def idf(df: int, n_docs: int) -> float:
+    """IDF suavizado: un término presente en todas las notas sigue pesando 1"""
+    return math.log((1 + n_docs) / (1 + df)) + 1
+
+
+class RelatedIndex:
+    """
+    Matriz dispersa nota x término guardada por columnas: para cada término,
+    las filas (slots de nota) en que aparece y su frecuencia, ponderada por
+    campo como en la búsqueda (FIELD_WEIGHTS). Las columnas son `array`
+    compactos: un alta añade al final de cada columna de sus términos y una
+    baja intercambia su entrada con la última, así que ambas son
+    incrementales. Con NumPy, cada columna se lee como vista sin copia.
+
+    La similitud de dos notas es el coseno de sus vectores tf·idf. Solo las
+    columnas de los términos de la nota consultada intervienen, y el top-k se
+    elige por selección, sin ordenar todas las puntuaciones.
+
+    Las normas de los vectores dependen del idf, que cambia con cada alta o
+    baja; se recalculan todas solo cuando el número de notas se desvía más de
+    un 10% del usado la última vez (las notas nuevas se calculan al consultar).
+    """
+
+    def __init__(self):
+        self._vocab: Dict[str, int] = {}
+        self._rows: List[array] = []
+        self._weights: List[array] = []
+        self._slots: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._free: List[int] = []
+        # slot -> (columnas, frecuencias) de la nota
+        self._vectors: List[Optional[Tuple[Tuple[int, ...], Tuple[int, ...]]]] = []
+        self._norms = array("d")
+        self._norm_docs = 0
+        self._pending: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def notes_added(self, notes: List[Dict[str, Any]]) -> None:
+        for note in notes:
+            note_id = note["id"]
+            if note_id in self._slots:
+                self._remove(note_id)
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot = len(self._ids)
+                self._ids.append(None)
+                self._vectors.append(None)
+                self._norms.append(0.0)
+            columns = []
+            terms = note_terms(note)
+            for term, tf in terms.items():
+                column = self._vocab.get(term)
+                if column is None:
+                    column = self._vocab[term] = len(self._rows)
+                    self._rows.append(array("i"))
+                    self._weights.append(array("f"))
+                self._rows[column].append(slot)
+                self._weights[column].append(tf)
+                columns.append(column)
+            self._slots[note_id] = slot
+            self._ids[slot] = note_id
+            self._vectors[slot] = (tuple(columns), tuple(terms.values()))
+            self._pending.append(slot)
+
+    def notes_removed(self, notes: List[Dict[str, Any]]) -> None:
+        for note in notes:
+            if note["id"] in self._slots:
+                self._remove(note["id"])
+
+    def _remove(self, note_id: str) -> None:
+        slot = self._slots.pop(note_id)
+        for column in self._vectors[slot][0]:
+            rows, weights = self._rows[column], self._weights[column]
+            i = rows.index(slot)
+            rows[i], weights[i] = rows[-1], weights[-1]
+            rows.pop()
+            weights.pop()
+        self._ids[slot] = None
+        self._vectors[slot] = None
+        self._norms[slot] = 0.0
+        self._free.append(slot)
+
+    def _norm(self, slot: int, n_docs: int) -> float:
+        rows = self._rows
+        columns, tfs = self._vectors[slot]
+        return math.sqrt(sum((tf * idf(len(rows[c]), n_docs)) ** 2 for c, tf in zip(columns, tfs)))
+
+    def _refresh_norms(self) -> None:
+        n_docs = len(self._slots)
+        if abs(n_docs - self._norm_docs) > 0.1 * self._norm_docs or not self._norm_docs:
+            slots = [slot for slot, vector in enumerate(self._vectors) if vector is not None]
+            self._norm_docs = n_docs
+        else:
+            slots = [slot for slot in self._pending if self._vectors[slot] is not None]
+        for slot in slots:
+            self._norms[slot] = self._norm(slot, self._norm_docs)
+        self._pending.clear()
+
+    def related(self, note_id: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """Hasta `limit` pares (id, similitud coseno) de las notas más parecidas a `note_id`"""
+        slot = self._slots.get(note_id)
+        if slot is None or limit < 1:
+            return []
+        self._refresh_norms()
+        norm = self._norms[slot]
+        n_docs = len(self._slots)
+        # Producto escalar: solo cuentan los términos compartidos con alguna otra nota
+        query = []
+        for column, tf in zip(*self._vectors[slot]):
+            df = len(self._rows[column])
+            if df > 1:
+                weight = idf(df, n_docs)
+                query.append((column, tf * weight * weight))
+        if not query or not norm:
+            return []
+        if np is not None:
+            return self._related_numpy(slot, norm, query, limit)
+        return self._related_python(slot, norm, query, limit)
+
+    def _related_numpy(self, slot: int, norm: float, query: List[Tuple[int, float]], limit: int) -> List[Tuple[str, float]]:
+        size = len(self._ids)
+        scores = np.zeros(size)
+        for column, factor in query:
+            rows = np.frombuffer(self._rows[column], dtype=np.intc)
+            weights = np.frombuffer(self._weights[column], dtype=np.float32) * factor
+            scores += np.bincount(rows, weights=weights, minlength=size)
+        norms = np.frombuffer(self._norms, dtype=np.float64)
+        np.divide(scores, norms * norm, out=scores, where=norms > 0)
+        scores[slot] = 0.0
+
+        # Top-k sin ordenar todo: el k-ésimo valor por selección (introselect) y
+        # las notas por encima de él. Se selecciona sobre los valores y no con
+        # argpartition porque con muchos empates (notas casi iguales) este último
+        # degenera: 5 ms frente a 0,75 ms con 100k notas. Los empates en el
+        # k-ésimo valor se resuelven por orden de alta.
+        k = min(limit, size)
+        kth = np.partition(scores, size - k)[size - k]
+        if kth <= 0:
+            top = np.flatnonzero(scores > 0)
+        else:
+            top = np.flatnonzero(scores > kth)
+            top = np.concatenate((top, np.flatnonzero(scores == kth)[:k - len(top)]))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self._ids[i], float(scores[i])) for i in top.tolist()]
+
+    def _related_python(self, slot: int, norm: float, query: List[Tuple[int, float]], limit: int) -> List[Tuple[str, float]]:
+        scores: Dict[int, float] = {}
+        for column, factor in query:
+            get = scores.get
+            for row, weight in zip(self._rows[column], self._weights[column]):
+                scores[row] = get(row, 0.0) + weight * factor
+        scores.pop(slot, None)
+        norms = self._norms
+        top = heapq.nlargest(limit, ((score / (norms[row] * norm), row) for row, score in scores.items() if norms[row]))
+        return [(self._ids[row], score) for score, row in top]
@@ -0,0 +1,70 @@
+"""
+Renderizado del widget a partir de su plantilla y las notas ya codificadas
+Funciones puras (solo cadenas y bytes): se pueden ejecutar en otro hilo o en otro proceso
+"""
+
+import hashlib
+import re
+from typing import NamedTuple
+
+# Rutas de los assets en el HTML compilado: absolutas (/assets/) o relativas (./assets/),
+# entre comillas dobles o simples, en src o en href
+_ASSET_URL = re.compile(r"""\b(src|href)=(["'])\.?/assets/""")
+
+
+class RenderedWidget(NamedTuple):
+    version: int
+    text: str
+    body: bytes
+    etag: str
+
+
+class WidgetTemplate(NamedTuple):
+    """
+    HTML del widget ya preparado, partido por los huecos de los datos:
+    prefix + versión + middle + notas + suffix. Todo en bytes, así que
+    renderizarlo es solo unir trozos.
+    """
+    prefix: bytes
+    middle: bytes
+    suffix: bytes
+
+
+def rewrite_asset_urls(html_content: str, base_url: str) -> str:
+    """Cambia las rutas de los assets por URLs completas con `base_url` (una sola pasada)"""
+    return _ASSET_URL.sub(lambda match: f"{match[1]}={match[2]}{base_url}/assets/", html_content)
+
+
+def compile_widget(html_content: str, base_url: str) -> WidgetTemplate:
+    """Prepara el HTML compilado del widget para `render_widget`"""
+    html_content = rewrite_asset_urls(html_content, base_url)
+    head, closing, rest = html_content.partition("</head>")
+    if not closing:
+        # Sin <head> (la página de error) el script va al principio
+        head, rest = "", html_content
+
+    # Script en el head para que los datos estén disponibles antes de que React se monte
+    script_start = f"""
+    <script>
+        // Asegurar que los datos estén disponibles antes de que React se monte
+        window.__NOTES_CHANGES_URL__ = "{base_url}/notes/changes";
+        window.__NOTES_VERSION__ = """
+    script_middle = """;
+        window.__NOTES_DATA__ = """
+    script_end = """;
+        console.log('Second Brain: Notes data loaded', window.__NOTES_DATA__);
+    </script>
+    """
+    return WidgetTemplate(
+        (head + script_start).encode("utf-8"),
+        script_middle.encode("utf-8"),
+        (script_end + closing + rest).encode("utf-8"),
+    )
+
+
+def render_widget(template: WidgetTemplate, notes_json: bytes, version: int) -> RenderedWidget:
+    """Widget con las notas (un array JSON ya codificado) de la versión `version`, con su ETag"""
+    # "</" escapado para que ningún texto de nota pueda cerrar el <script>
+    notes_json = notes_json.replace(b"</", b"<\\/")
+    body = b"".join((template.prefix, str(version).encode(), template.middle, notes_json, template.suffix))
+    return RenderedWidget(version, body.decode("utf-8"), body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
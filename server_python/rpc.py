@@ -0,0 +1,327 @@
+"""
+Despachador JSON-RPC 2.0 para el endpoint MCP
+Registro de métodos y herramientas (búsqueda O(1)), lotes, notificaciones y admisión de las llamadas caras
+"""
+
+import asyncio
+import inspect
+import logging
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from . import metrics
+from .admission import AdmissionGate, Overloaded, SingleFlight
+from .serialization import dumps
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+# Rango reservado a errores del servidor (-32000 a -32099)
+SERVER_BUSY = -32000
+
+logger = logging.getLogger(__name__)
+
+
+class RpcError(Exception):
+    """Error JSON-RPC que el despachador convierte en respuesta `error`"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def error_response(request_id: Any, code: int, message: str) -> Dict[str, Any]:
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {
+            "code": code,
+            "message": message
+        }
+    }
+
+
+def result_body(request_id: Any, encoded: bytes) -> bytes:
+    """Respuesta JSON-RPC con un `result` ya codificado"""
+    return b'{"jsonrpc":"2.0","id":' + dumps(request_id) + b',"result":' + encoded + b"}"
+
+
+class Tool:
+    def __init__(self, name: str, handler: Callable, definition: Dict[str, Any], write: bool):
+        self.name = name
+        self.handler = handler
+        self.definition = definition
+        self.write = write
+
+
+class Dispatcher:
+    """
+    Tabla de métodos JSON-RPC y de herramientas MCP.
+
+    Los handlers reciben `params` (métodos) o `arguments` (herramientas),
+    pueden ser síncronos o async, y devuelven el `result`; para responder
+    con un error lanzan RpcError.
+
+    En un lote, las peticiones de lectura consecutivas se ejecutan a la vez
+    y cada escritura espera a que termine todo lo anterior, así que las
+    escrituras se aplican en el orden en que llegaron. Las notificaciones
+    (sin `id`) se ejecutan pero no generan respuesta.
+
+    Los métodos `static` devuelven siempre el mismo resultado: se codifica
+    a bytes la primera vez y después solo se inserta el `id` de cada petición.
+
+    Los métodos y herramientas caros se registran con `limit`: como mucho
+    `limit` a la vez cada uno, una cola de espera de `max_queue` y, con la
+    cola llena, error SERVER_BUSY sin ejecutarlos. Las que esperan turno no
+    ocupan el bucle de eventos, así que en una ráfaga las llamadas baratas
+    (`initialize`, `tools/list`...) solo esperan a las pocas admitidas. Con
+    `coalesce`, las peticiones idénticas (mismos parámetros y misma
+    `version()` del store) que llegan mientras otra está en vuelo comparten
+    su resultado ya codificado, que se codifica con `offload` si lo hay.
+    """
+
+    def __init__(self, version: Callable[[], Any] = lambda: None, max_queue: int = 64, offload: Any = None):
+        self.methods: Dict[str, Callable] = {}
+        self.write_methods = set()
+        self.static_methods = set()
+        self.tools: Dict[str, Tool] = {}
+        self._encoded_results: Dict[str, bytes] = {}
+        self.version = version
+        self.max_queue = max_queue
+        # Offloader (server_python.offload) con el que codificar los resultados de las llamadas caras
+        self.offload = offload
+        # Por etiquetas (método, herramienta), las mismas de las métricas
+        self.gates: Dict[Tuple[str, str], AdmissionGate] = {}
+        self.coalesced: Set[Tuple[str, str]] = set()
+        self._flights = SingleFlight()
+
+    def _admission(self, labels: Tuple[str, str], limit: Optional[int], coalesce: bool) -> None:
+        self.gates.pop(labels, None)
+        self.coalesced.discard(labels)
+        if limit is not None:
+            self.gates[labels] = AdmissionGate(limit, self.max_queue)
+        if coalesce:
+            self.coalesced.add(labels)
+
+    def method(
+        self,
+        name: str,
+        write: bool = False,
+        static: bool = False,
+        limit: Optional[int] = None,
+        coalesce: bool = False,
+    ) -> Callable:
+        def register(handler: Callable) -> Callable:
+            self.methods[name] = handler
+            if write:
+                self.write_methods.add(name)
+            if static:
+                self.static_methods.add(name)
+            self._encoded_results.pop(name, None)
+            self._admission((name, ""), limit, coalesce)
+            return handler
+        return register
+
+    def tool(
+        self,
+        name: str,
+        description: str,
+        input_schema: Dict[str, Any],
+        meta: Optional[Dict[str, Any]] = None,
+        write: bool = False,
+        limit: Optional[int] = None,
+        coalesce: bool = False,
+    ) -> Callable:
+        def register(handler: Callable) -> Callable:
+            definition = {"name": name, "description": description, "inputSchema": input_schema}
+            if meta:
+                definition["_meta"] = meta
+            self.tools[name] = Tool(name, handler, definition, write)
+            self._encoded_results.clear()
+            self._admission(("tools/call", name), limit, coalesce)
+            return handler
+        return register
+
+    def tool_definitions(self) -> List[Dict[str, Any]]:
+        return [tool.definition for tool in self.tools.values()]
+
+    def is_write(self, message: Any) -> bool:
+        if not isinstance(message, dict):
+            return False
+        method = message.get("method")
+        if method == "tools/call":
+            params = message.get("params")
+            name = params.get("name") if isinstance(params, dict) else None
+            # Solo nombres de texto: una lista u objeto no es hashable y haría fallar la búsqueda
+            tool = self.tools.get(name) if isinstance(name, str) else None
+            return tool is not None and tool.write
+        return isinstance(method, str) and method in self.write_methods
+
+    async def call_tool(self, params: Dict[str, Any]) -> Any:
+        name = params.get("name")
+        tool = self.tools.get(name) if isinstance(name, str) else None
+        if tool is None:
+            raise RpcError(INVALID_PARAMS, f"Herramienta no soportada: {params.get('name')}")
+        arguments = params.get("arguments") or {}
+        if not isinstance(arguments, dict):
+            raise RpcError(INVALID_PARAMS, "arguments debe ser un objeto")
+        result = tool.handler(arguments)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def handle(self, message: Any) -> Optional[Dict[str, Any]]:
+        """Ejecuta una petición; devuelve None si era una notificación"""
+        if not isinstance(message, dict) or not isinstance(message.get("method"), str):
+            return error_response(None, INVALID_REQUEST, "Petición JSON-RPC inválida")
+
+        is_notification = "id" not in message
+        request_id = message.get("id")
+        method = message["method"]
+        params = message.get("params") or {}
+
+        try:
+            if not isinstance(params, dict):
+                raise RpcError(INVALID_PARAMS, "params debe ser un objeto")
+            if method == "tools/call":
+                result = await self.call_tool(params)
+            else:
+                handler = self.methods.get(method)
+                if handler is None:
+                    raise RpcError(METHOD_NOT_FOUND, f"Método no soportado: {method}")
+                result = handler(params)
+                if inspect.isawaitable(result):
+                    result = await result
+        except RpcError as exc:
+            response = error_response(request_id, exc.code, exc.message)
+        except Exception:
+            # Un fallo inesperado no debe tumbar el resto del lote
+            logger.exception("Error procesando %s", method)
+            response = error_response(request_id, INTERNAL_ERROR, "Error interno del servidor")
+        else:
+            response = {"jsonrpc": "2.0", "id": request_id, "result": result}
+        return None if is_notification else response
+
+    def metric_labels(self, message: Any) -> Tuple[str, str]:
+        """Etiquetas (método, herramienta) acotadas a lo registrado, para no disparar la cardinalidad"""
+        if not isinstance(message, dict):
+            return "invalid", ""
+        method = message.get("method")
+        if not isinstance(method, str):
+            return "invalid", ""
+        if method == "tools/call":
+            params = message.get("params")
+            name = params.get("name") if isinstance(params, dict) else None
+            return method, name if isinstance(name, str) and name in self.tools else "unknown"
+        return (method if method in self.methods else "unknown"), ""
+
+    async def handle_encoded(self, message: Any) -> Optional[bytes]:
+        """Como `handle`, pero devuelve la respuesta ya codificada a JSON (y la mide)"""
+        start = time.perf_counter()
+        labels = self.metric_labels(message)
+        metrics.rpc_requests.inc(*labels)
+
+        # Antes de que `handle` valide el mensaje: un método no hashable no se puede buscar
+        named = isinstance(message, dict) and isinstance(message.get("method"), str)
+        if named and "id" in message and message["method"] in self.static_methods:
+            encoded = self._encoded_results.get(message["method"])
+            metrics.cache_lookup("mcp_static", encoded is not None)
+            if encoded is not None:
+                body = result_body(message["id"], encoded)
+                metrics.rpc_latency.observe(time.perf_counter() - start, *labels)
+                metrics.rpc_response_size.observe(len(body), *labels)
+                return body
+
+        if isinstance(message, dict) and "id" in message and (labels in self.gates or labels in self.coalesced):
+            body = await self._handle_admitted(message, labels)
+            metrics.rpc_latency.observe(time.perf_counter() - start, *labels)
+            metrics.rpc_response_size.observe(len(body), *labels)
+            return body
+
+        response = await self.handle(message)
+        metrics.rpc_latency.observe(time.perf_counter() - start, *labels)
+        if response is None:
+            return None
+        if "error" in response:
+            metrics.rpc_errors.inc(*labels, str(response["error"]["code"]))
+        elif message["method"] in self.static_methods:
+            self._encoded_results[message["method"]] = dumps(response["result"])
+        body = metrics.timed_dumps("mcp", response)
+        metrics.rpc_response_size.observe(len(body), *labels)
+        return body
+
+    async def _handle_admitted(self, message: Dict[str, Any], labels: Tuple[str, str]) -> bytes:
+        """Petición de un método con límite o coalescencia, ya codificada"""
+        if labels in self.coalesced:
+            # Los mismos parámetros en otro orden no se reconocen como iguales: solo se pierde la coalescencia
+            key = (labels, self.version(), dumps(message.get("params")))
+            (encoded, error), shared = await self._flights.do(key, lambda: self._admitted_outcome(message, labels))
+            if shared:
+                metrics.coalesced_requests.inc(*labels)
+        else:
+            encoded, error = await self._admitted_outcome(message, labels)
+        if error is not None:
+            metrics.rpc_errors.inc(*labels, str(error["code"]))
+            return dumps({"jsonrpc": "2.0", "id": message["id"], "error": error})
+        return result_body(message["id"], encoded)
+
+    async def _admitted_outcome(
+        self, message: Dict[str, Any], labels: Tuple[str, str]
+    ) -> Tuple[Optional[bytes], Optional[Dict[str, Any]]]:
+        """(resultado codificado, None) o (None, error): lo que comparten las peticiones coalescidas"""
+        gate = self.gates.get(labels)
+        try:
+            async with gate.slot() if gate is not None else nullcontext():
+                # Los handlers son síncronos: sin ceder una vez el turno, cada petición se
+                # ejecutaría entera al llegar y no habría nada en vuelo que compartir ni que poner en cola
+                await asyncio.sleep(0)
+                response = await self.handle(message)
+                if "error" in response:
+                    return None, response["error"]
+                if self.offload is not None:
+                    return await self.offload.dumps("mcp", response["result"]), None
+                return metrics.timed_dumps("mcp", response["result"]), None
+        except Overloaded:
+            metrics.admission_shed.inc(*labels)
+            return None, {"code": SERVER_BUSY, "message": "Servidor ocupado: reintenta en unos segundos"}
+
+    async def preload(self) -> None:
+        """Codifica de antemano los resultados de los métodos `static` (arranque del servidor)"""
+        for name in self.static_methods:
+            if name not in self._encoded_results:
+                result = self.methods[name]({})
+                if inspect.isawaitable(result):
+                    result = await result
+                self._encoded_results[name] = dumps(result)
+
+    async def handle_batch(self, messages: List[Any]) -> List[bytes]:
+        results: List[Optional[bytes]] = [None] * len(messages)
+        pending: List[int] = []
+
+        async def flush() -> None:
+            responses = await asyncio.gather(*(self.handle_encoded(messages[i]) for i in pending))
+            for i, response in zip(pending, responses):
+                results[i] = response
+            pending.clear()
+
+        for i, message in enumerate(messages):
+            if self.is_write(message):
+                await flush()
+                results[i] = await self.handle_encoded(message)
+            else:
+                pending.append(i)
+        await flush()
+        return [r for r in results if r is not None]
+
+    async def dispatch(self, payload: Any) -> Optional[bytes]:
+        """Petición individual o lote, codificada a JSON; None si no hay nada que responder"""
+        if isinstance(payload, list):
+            if not payload:
+                return dumps(error_response(None, INVALID_REQUEST, "Lote JSON-RPC vacío"))
+            responses = await self.handle_batch(payload)
+            return b"[" + b",".join(responses) + b"]" if responses else None
+        return await self.handle_encoded(payload)
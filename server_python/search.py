@@ -0,0 +1,291 @@
+"""
+Búsqueda de texto completo para Second Brain
+Índice invertido incremental sobre título, descripción y etiquetas, con ranking BM25
+"""
+
+import bisect
+import functools
+import heapq
+import math
+import re
+import unicodedata
+from array import array
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional: sin él las consultas de varios términos frecuentes van por el umbral
+    np = None
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Palabras vacías frecuentes en español e inglés: no aportan al ranking
+STOPWORDS = frozenset("""
+    a al algo como con de del el en es esta este la las lo los mas me mi mis muy no o para pero
+    por que se sin sobre su sus te tu un una uno unos unas y ya
+    an and are as at be by for from in is it of on or the this to with
+""".split())
+
+# Peso de cada campo (las coincidencias en título y etiquetas cuentan doble)
+FIELD_WEIGHTS = (("title", 2), ("description", 1), ("tags", 2))
+
+
+def fold(text: str) -> str:
+    """Normaliza a minúsculas y sin acentos: "Programación" -> "programacion" """
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+# Las palabras se repiten mucho entre notas: normalizar cada una solo una vez
+_fold_token = functools.lru_cache(maxsize=1 << 16)(fold)
+
+
+def tokenize(text: str) -> List[str]:
+    if text.isascii():
+        tokens = TOKEN_RE.findall(text.lower())
+    else:
+        tokens = [_fold_token(t) for t in TOKEN_RE.findall(unicodedata.normalize("NFC", text))]
+    return [t for t in tokens if t not in STOPWORDS]
+
+
+def note_terms(note: Dict[str, Any]) -> Counter:
+    """Frecuencia ponderada de cada término de la nota"""
+    terms: Counter = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        value = note.get(field)
+        if not value:
+            continue
+        # Notas guardadas antes de validar los argumentos de create_note pueden traer otros tipos
+        if isinstance(value, list):
+            value = " ".join(map(str, value))
+        for term in tokenize(str(value)):
+            terms[term] += weight
+    return terms
+
+
+class SearchIndex:
+    """
+    Índice invertido término -> {id de nota: frecuencia}.
+
+    Se mantiene de forma incremental como listener del NoteStore, así que
+    buscar nunca recorre las notas: solo las listas de los términos de la consulta.
+
+    Las listas largas (términos frecuentes) guardan además una copia ordenada
+    por impacto BM25 que permite cortar la búsqueda en cuanto el top-k ya no
+    puede cambiar (algoritmo de umbral de Fagin). Esa copia se mantiene con
+    inserciones ordenadas y se reconstruye solo si la longitud media de las
+    notas se desvía más de un 10% de la usada al calcularla.
+
+    El umbral corta pronto con un término frecuente, pero con varios de
+    frecuencia parecida puede tener que bajar miles de posiciones (más de
+    10 ms con 100k notas). Si pasa de `THRESHOLD_DEPTH_MAX` y hay NumPy, la
+    consulta puntúa de una vez todas las entradas de sus listas sobre
+    columnas compactas (slots de nota y frecuencias en `array`, como en
+    RelatedIndex), con un coste que depende solo de su longitud.
+    """
+
+    # Listas con menos entradas se puntúan completas, sin copia ordenada
+    SORTED_MIN = 256
+    # Profundidad del umbral a partir de la que se puntúan las listas completas con NumPy
+    THRESHOLD_DEPTH_MAX = 128
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._terms: Dict[str, Tuple[str, ...]] = {}
+        self._total_length = 0
+        # término -> [impactos negados ascendentes, ids, entradas obsoletas]
+        self._sorted: Dict[str, List[Any]] = {}
+        self._avg_length = 0.0
+        # Columnas para puntuar con NumPy: término -> (slots, frecuencias), y por slot su longitud
+        self._columns: Dict[str, Tuple[array, array]] = {}
+        self._slots: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._slot_lengths = array("d")
+        self._free: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def notes_added(self, notes: List[Dict[str, Any]]) -> None:
+        if len(notes) >= self.SORTED_MIN:
+            # Un lote grande sale más barato reconstruyendo las copias ordenadas al buscar
+            self._sorted.clear()
+        for note in notes:
+            note_id = note["id"]
+            if note_id in self._lengths:
+                self._remove(note_id)
+            terms = note_terms(note)
+            length = sum(terms.values())
+            slot = self._new_slot(note_id, length)
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[note_id] = tf
+                column = self._columns.get(term)
+                if column is None:
+                    column = self._columns[term] = (array("i"), array("f"))
+                column[0].append(slot)
+                column[1].append(tf)
+                cached = self._sorted.get(term)
+                if cached is not None:
+                    key = -self._impact(tf, length)
+                    pos = bisect.bisect_left(cached[0], key)
+                    cached[0].insert(pos, key)
+                    cached[1].insert(pos, note_id)
+            self._lengths[note_id] = length
+            self._terms[note_id] = tuple(terms)
+            self._total_length += length
+
+    def notes_removed(self, notes: List[Dict[str, Any]]) -> None:
+        for note in notes:
+            if note["id"] in self._lengths:
+                self._remove(note["id"])
+
+    def _new_slot(self, note_id: str, length: int) -> int:
+        if self._free:
+            slot = self._free.pop()
+            self._ids[slot] = note_id
+            self._slot_lengths[slot] = length
+        else:
+            slot = len(self._ids)
+            self._ids.append(note_id)
+            self._slot_lengths.append(length)
+        self._slots[note_id] = slot
+        return slot
+
+    def _remove(self, note_id: str) -> None:
+        slot = self._slots.pop(note_id)
+        self._ids[slot] = None
+        self._free.append(slot)
+        for term in self._terms.pop(note_id):
+            postings = self._postings[term]
+            del postings[note_id]
+            if not postings:
+                del self._postings[term]
+                del self._columns[term]
+            else:
+                # Baja en la columna: su entrada se cambia por la última
+                slots, tfs = self._columns[term]
+                i = slots.index(slot)
+                slots[i], tfs[i] = slots[-1], tfs[-1]
+                slots.pop()
+                tfs.pop()
+            cached = self._sorted.get(term)
+            if cached is not None:
+                # Las entradas obsoletas se saltan al buscar; si abundan, se descarta la copia
+                cached[2] += 1
+                if cached[2] * 2 > len(cached[1]):
+                    del self._sorted[term]
+        self._total_length -= self._lengths.pop(note_id)
+
+    def _impact(self, tf: int, length: int) -> float:
+        """Parte de la puntuación BM25 que depende de la nota (sin el IDF del término)"""
+        k1 = self.k1
+        return tf * (k1 + 1) / (tf + k1 * (1 - self.b + self.b * length / self._avg_length))
+
+    def _sorted_postings(self, term: str, postings: Dict[str, int]) -> List[Any]:
+        cached = self._sorted.get(term)
+        if cached is None:
+            lengths = self._lengths
+            pairs = sorted((-self._impact(tf, lengths[i]), i) for i, tf in postings.items())
+            cached = [[p[0] for p in pairs], [p[1] for p in pairs], 0]
+            self._sorted[term] = cached
+        return cached
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """Devuelve hasta `limit` pares (id, puntuación BM25) ordenados por relevancia"""
+        n_docs = len(self._lengths)
+        if not n_docs or limit < 1:
+            return []
+        avg_length = self._total_length / n_docs
+        if abs(avg_length - self._avg_length) > 0.1 * self._avg_length:
+            self._avg_length = avg_length
+            self._sorted.clear()
+
+        terms = []
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if postings:
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                terms.append((term, idf, postings))
+        if not terms:
+            return []
+
+        lengths = self._lengths
+        impact = self._impact
+        if all(len(postings) < self.SORTED_MIN for _, _, postings in terms):
+            scores: Dict[str, float] = {}
+            for _, idf, postings in terms:
+                get = scores.get
+                for note_id, tf in postings.items():
+                    scores[note_id] = get(note_id, 0.0) + idf * impact(tf, lengths[note_id])
+            return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        # Algoritmo de umbral: recorrer las listas por impacto descendente y
+        # puntuar cada nota nueva completa hasta que el top-k quede fijado
+        cursors = []
+        for term, idf, postings in terms:
+            if len(postings) >= self.SORTED_MIN:
+                neg_impacts, ids, _ = self._sorted_postings(term, postings)
+            else:
+                pairs = sorted((-impact(tf, lengths[i]), i) for i, tf in postings.items())
+                neg_impacts, ids = [p[0] for p in pairs], [p[1] for p in pairs]
+            cursors.append((idf, neg_impacts, ids))
+
+        top: List[Tuple[float, str]] = []
+        seen = set()
+        depth = 0
+        while True:
+            threshold = 0.0
+            active = False
+            for idf, neg_impacts, ids in cursors:
+                if depth >= len(ids):
+                    continue
+                active = True
+                threshold -= idf * neg_impacts[depth]
+                note_id = ids[depth]
+                if note_id in seen or note_id not in lengths:
+                    continue
+                seen.add(note_id)
+                length = lengths[note_id]
+                score = 0.0
+                for _, term_idf, postings in terms:
+                    tf = postings.get(note_id)
+                    if tf:
+                        score += term_idf * impact(tf, length)
+                if len(top) < limit:
+                    heapq.heappush(top, (score, note_id))
+                elif score > top[0][0]:
+                    heapq.heapreplace(top, (score, note_id))
+            if not active or (len(top) == limit and top[0][0] >= threshold):
+                break
+            depth += 1
+            if depth == self.THRESHOLD_DEPTH_MAX and np is not None:
+                # El umbral no baja lo bastante (varios términos frecuentes): todo de una vez
+                return self._search_numpy(terms, limit)
+        return [(note_id, score) for score, note_id in sorted(top, reverse=True)]
+
+    def _search_numpy(self, terms: List[Tuple[str, float, Dict[str, int]]], limit: int) -> List[Tuple[str, float]]:
+        """BM25 de todas las entradas de las listas de `terms` a la vez (mismo resultado que el umbral)"""
+        size = len(self._ids)
+        scores = np.zeros(size)
+        lengths = np.frombuffer(self._slot_lengths, dtype=np.float64)
+        k1, b, avg_length = self.k1, self.b, self._avg_length
+        for term, idf, _ in terms:
+            slots, tfs = self._columns[term]
+            rows = np.frombuffer(slots, dtype=np.intc)
+            tf = np.frombuffer(tfs, dtype=np.float32).astype(np.float64)
+            # Cada nota aparece una vez por columna: la suma por índice no pierde entradas
+            scores[rows] += idf * (tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths[rows] / avg_length)))
+
+        # Top-k por selección, como en RelatedIndex: el k-ésimo valor y las notas por encima
+        k = min(limit, size)
+        kth = np.partition(scores, size - k)[size - k]
+        if kth <= 0:
+            top = np.flatnonzero(scores > 0)
+        else:
+            top = np.flatnonzero(scores > kth)
+            top = np.concatenate((top, np.flatnonzero(scores == kth)[:k - len(top)]))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self._ids[i], float(scores[i])) for i in top.tolist()]
@@ -0,0 +1,44 @@
+"""
+Serialización JSON rápida para las respuestas del servidor
+Usa orjson si está instalado y, si no, el módulo json estándar
+"""
+
+import json
+from collections.abc import Mapping
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+def to_builtin(obj: Any) -> Any:
+    """
+    Lo que el codificador JSON no conoce: las vistas de notas del store (y
+    cualquier otro Mapping) se materializan como dict justo al serializar
+    """
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is not None:
+        return to_dict()
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"Tipo no serializable a JSON: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    """Codifica a JSON compacto en UTF-8"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=to_builtin)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=to_builtin).encode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    """Decodifica JSON (str, bytes o memoryview); lanza ValueError si no es válido"""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
@@ -0,0 +1,1079 @@
+"""
+Almacenamiento de notas para Second Brain
+Motor enchufable: en memoria, con log de escritura anticipada (WAL) + snapshots,
+o SQLite compartido entre varios procesos worker
+"""
+
+import asyncio
+import gc
+import itertools
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .columns import NoteBlock, NoteCodec, NoteView
+from .serialization import dumps, loads, to_builtin
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(record: Dict[str, Any]) -> bytes:
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=to_builtin) + "\n").encode("utf-8")
+
+
+def _fsync_dir(directory: Path) -> None:
+    """Persiste los renombrados dentro del directorio (no disponible en Windows)"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def paused_gc() -> Iterator[None]:
+    """
+    Suspende el recolector de ciclos mientras se crean muchos objetos de golpe
+    (cargar el store, construir un índice): sin ciclos que recoger, sus pasadas
+    solo recorren una y otra vez los objetos recién creados.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class StorageConflict(Exception):
+    """Otro proceso ya escribió el `seq` que se intentaba escribir (backend compartido)"""
+
+
+class MemoryStorage:
+    """Backend sin persistencia: todo se pierde al reiniciar (comportamiento original)"""
+
+    def load(self) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        return None
+
+    def append(self, records: List[Dict[str, Any]]) -> None:
+        pass
+
+    def poll(self, seq: int) -> Optional[List[Dict[str, Any]]]:
+        return []
+
+    def wants_snapshot(self) -> bool:
+        return False
+
+    def snapshot(self, header: Dict[str, Any], notes: List[Dict[str, Any]]) -> None:
+        pass
+
+    def sync(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class LogStorage:
+    """
+    Backend persistente basado en un log append-only.
+
+    Cada escritura es un único append secuencial de una línea JSON al WAL.
+    Con `fsync_interval=0` (por defecto) cada append hace su propio fsync;
+    en el servidor ya es un group commit, porque WriteQueue junta en un solo
+    append las escrituras que llegan a la vez. Con `fsync_interval > 0` un
+    hilo de fondo agrupa además los fsync de appends de varios hilos cada
+    `fsync_interval` segundos. En los dos casos `append` no vuelve hasta que
+    su escritura está en disco: lo confirmado sobrevive a una caída (por eso
+    el backend es `blocking`).
+    Cada `snapshot_every` registros se escribe un snapshot compactado en
+    segundo plano y el log se rota, de modo que el arranque solo reproduce
+    el snapshot más la cola del log.
+
+    Ficheros dentro de `directory`:
+        notes.snapshot   snapshot NDJSON: cabecera {"seq", "count", "next_id"} + una nota por línea
+        notes.wal        log activo
+        notes.wal.prev   log rotado, se borra cuando el snapshot queda persistido
+    """
+
+    SNAPSHOT = "notes.snapshot"
+    WAL = "notes.wal"
+    WAL_PREV = "notes.wal.prev"
+    # append espera al fsync: el servidor async lo llama desde otro hilo
+    blocking = True
+
+    def __init__(self, directory: str, fsync_interval: float = 0.0, snapshot_every: int = 10_000):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._file = None
+        self._dirty = False
+        # Appends escritos y appends ya persistidos con fsync (para el group commit)
+        self._written = 0
+        self._synced = 0
+        self._closed = False
+        self._since_snapshot = 0
+        self._snapshot_thread: Optional[threading.Thread] = None
+        self._flusher: Optional[threading.Thread] = None
+
+    @property
+    def _wal_path(self) -> Path:
+        return self.directory / self.WAL
+
+    # Recuperación
+
+    def load(self) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        """
+        Devuelve (cabecera del snapshot, notas del snapshot, registros del log posteriores)
+        o None si el directorio no contiene datos todavía.
+        """
+        snapshot_path = self.directory / self.SNAPSHOT
+        logs = [self.directory / self.WAL_PREV, self._wal_path]
+        if not snapshot_path.exists() and not any(p.exists() for p in logs):
+            self._open_log()
+            return None
+
+        header, notes = {"seq": 0}, []
+        if snapshot_path.exists():
+            header, notes = self._read_snapshot(snapshot_path)
+
+        records: List[Dict[str, Any]] = []
+        for path in logs:
+            if path.exists():
+                records.extend(r for r in self._read_log(path) if r["seq"] > header["seq"])
+        self._since_snapshot = len(records)
+        self._open_log()
+        return header, notes, records
+
+    @staticmethod
+    def _read_snapshot(path: Path) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Lee el snapshot proyectado en memoria (mmap): cada línea se decodifica
+        directamente desde las páginas del fichero, sin copiarlo entero a un
+        buffer ni trocearlo en objetos bytes intermedios.
+        """
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise RuntimeError(f"Snapshot incompleto: {path}")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    end = mapped.find(b"\n")
+                    header = loads(view[:end])
+                    notes = []
+                    start = end + 1
+                    while start < len(mapped):
+                        end = mapped.find(b"\n", start)
+                        if end < 0:
+                            end = len(mapped)
+                        notes.append(loads(view[start:end]))
+                        start = end + 1
+                finally:
+                    view.release()
+        if len(notes) != header["count"]:
+            raise RuntimeError(f"Snapshot incompleto: {path}")
+        return header, notes
+
+    @staticmethod
+    def _read_log(path: Path) -> Iterable[Dict[str, Any]]:
+        good = 0
+        with open(path, "rb") as f:
+            data = f.read()
+        for line in data.splitlines(keepends=True):
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("línea incompleta")
+                record = loads(line)
+            except ValueError:
+                # Escritura interrumpida al final del log: se descarta la cola rota
+                if good + len(line) < len(data):
+                    raise RuntimeError(f"Log corrupto en {path} (byte {good})")
+                with open(path, "r+b") as f:
+                    f.truncate(good)
+                break
+            good += len(line)
+            yield record
+
+    def _open_log(self) -> None:
+        self._file = open(self._wal_path, "ab")
+        if self.fsync_interval > 0 and self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="notes-wal-fsync", daemon=True)
+            self._flusher.start()
+
+    # Escritura
+
+    def append(self, records: List[Dict[str, Any]]) -> None:
+        data = b"".join(_encode(r) for r in records)
+        with self._lock:
+            self._file.write(data)
+            self._file.flush()
+            self._since_snapshot += len(records)
+            if self.fsync_interval > 0:
+                self._written += 1
+                ticket = self._written
+                self._dirty = True
+                self._wakeup.notify_all()
+                # Esperar al fsync del grupo que incluye esta escritura
+                while self._synced < ticket and not self._closed:
+                    self._wakeup.wait()
+                return
+            os.fsync(self._file.fileno())
+
+    def poll(self, seq: int) -> Optional[List[Dict[str, Any]]]:
+        """El log pertenece a un único proceso: nunca hay cambios ajenos"""
+        return []
+
+    def _flush_loop(self) -> None:
+        with self._lock:
+            while not self._closed:
+                if not self._dirty:
+                    self._wakeup.wait()
+                    continue
+                # Dejar que se acumulen más escrituras en el mismo fsync (las
+                # que llegan despiertan el hilo, pero la ventana se respeta)
+                deadline = time.monotonic() + self.fsync_interval
+                while not self._closed and (remaining := deadline - time.monotonic()) > 0:
+                    self._wakeup.wait(remaining)
+                if self._dirty and self._file is not None:
+                    os.fsync(self._file.fileno())
+                    self._mark_synced()
+
+    def _mark_synced(self) -> None:
+        """Todo lo escrito hasta ahora está en disco: despierta a los appends que esperan"""
+        self._dirty = False
+        self._synced = self._written
+        self._wakeup.notify_all()
+
+    def sync(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._mark_synced()
+
+    # Snapshots
+
+    def wants_snapshot(self) -> bool:
+        running = self._snapshot_thread is not None and self._snapshot_thread.is_alive()
+        return self._since_snapshot >= self.snapshot_every and not running
+
+    def snapshot(self, header: Dict[str, Any], notes: List[Dict[str, Any]], background: bool = True) -> None:
+        """Rota el log y escribe el snapshot de `notes` (estado exacto en `header["seq"]`)"""
+        with self._lock:
+            prev = self.directory / self.WAL_PREV
+            if prev.exists():
+                # Un snapshot anterior no llegó a completarse: sus registros siguen en prev
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                with open(prev, "ab") as dst, open(self._wal_path, "rb") as src:
+                    dst.write(src.read())
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                os.remove(self._wal_path)
+            else:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                os.replace(self._wal_path, prev)
+            self._file = open(self._wal_path, "ab")
+            _fsync_dir(self.directory)
+            self._since_snapshot = 0
+            self._mark_synced()
+
+        if background:
+            self._snapshot_thread = threading.Thread(
+                target=self._write_snapshot, args=(header, notes), name="notes-snapshot", daemon=True
+            )
+            self._snapshot_thread.start()
+        else:
+            self._write_snapshot(header, notes)
+
+    def _write_snapshot(self, header: Dict[str, Any], notes: List[Dict[str, Any]]) -> None:
+        path = self.directory / self.SNAPSHOT
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(_encode(dict(header, count=len(notes))))
+            remaining = iter(notes)
+            while True:
+                block = list(itertools.islice(remaining, 1000))
+                if not block:
+                    break
+                f.write(b"".join(_encode(n) for n in block))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        _fsync_dir(self.directory)
+        prev = self.directory / self.WAL_PREV
+        if prev.exists():
+            os.remove(prev)
+
+    def close(self) -> None:
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        self.sync()
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify_all()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+
+
+class SQLiteStorage:
+    """
+    Backend compartido por varios procesos worker: una base SQLite en modo WAL.
+
+    La tabla `changes` es el log común; su `seq` (clave primaria) es la
+    versión global del store. Cada worker escribe el `seq` siguiente al
+    último que conoce: si otro worker se le adelantó, la inserción choca con
+    la clave primaria y se lanza StorageConflict para que el store se ponga
+    al día y reintente. Así todos los procesos ven los cambios en el mismo orden.
+
+    La tabla `notes` guarda el estado actual para arrancar sin reproducir el
+    log, que se recorta a los últimos `changes_kept` registros. Un worker
+    descubre cambios ajenos con `poll`, que solo consulta `PRAGMA data_version`
+    (un contador en memoria compartida) mientras nadie más haya escrito.
+
+    `append` usa su propia conexión para poder ejecutarse en otro hilo
+    mientras se sigue leyendo; por eso `poll` también ve como ajenas las
+    escrituras propias, que el store descarta por su `seq`.
+    """
+
+    shared = True
+    # append espera al disco (commit síncrono): el store lo ejecuta fuera del bucle de eventos
+    blocking = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY,
+            record TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS notes (
+            id TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            note TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, changes_kept: int = 10_000, busy_timeout: float = 30.0):
+        # Importación diferida: sin varios workers el arranque no carga sqlite3
+        import sqlite3
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.changes_kept = changes_kept
+        self._db = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+        self._writer = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._writer.execute("PRAGMA synchronous=NORMAL")
+        self._data_version: Optional[int] = None
+        self._appended = 0
+
+    def _read_data_version(self) -> int:
+        return self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    # Recuperación
+
+    def load(self) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        """
+        Estado actual como (cabecera, notas, []). Solo el primer proceso que
+        abre una base nueva recibe None (y carga las notas semilla): la
+        comprobación se hace bajo el bloqueo de escritura.
+        """
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if db.execute("SELECT 1 FROM meta WHERE key = 'initialized'").fetchone() is None:
+                db.execute("INSERT INTO meta (key, value) VALUES ('initialized', 1), ('next_id', 1)")
+                db.execute("COMMIT")
+                self._data_version = self._read_data_version()
+                return None
+            state = self._read_state()
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        self._data_version = self._read_data_version()
+        return state
+
+    def _read_state(self) -> Tuple[Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]]]:
+        db = self._db
+        seq = db.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+        next_id = db.execute("SELECT value FROM meta WHERE key = 'next_id'").fetchone()[0]
+        notes = [loads(row[0]) for row in db.execute("SELECT note FROM notes ORDER BY seq")]
+        return {"seq": seq, "next_id": next_id}, notes, []
+
+    def read_state(self) -> Tuple[Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Estado actual completo, leído en una única transacción consistente"""
+        db = self._db
+        db.execute("BEGIN")
+        try:
+            return self._read_state()
+        finally:
+            db.execute("COMMIT")
+
+    # Escritura
+
+    def append(self, records: List[Dict[str, Any]]) -> None:
+        db = self._writer
+        next_id = 0
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(
+                "INSERT INTO changes (seq, record) VALUES (?, ?)",
+                [(r["seq"], json.dumps(r, ensure_ascii=False, separators=(",", ":"))) for r in records],
+            )
+            for record in records:
+                if record["op"] == "put":
+                    note = record["note"]
+                    db.execute(
+                        "INSERT OR REPLACE INTO notes (id, seq, note) VALUES (?, ?, ?)",
+                        (note["id"], record["seq"], json.dumps(note, ensure_ascii=False, separators=(",", ":"))),
+                    )
+                    if note["id"].isdigit():
+                        next_id = max(next_id, int(note["id"]) + 1)
+                elif record["op"] == "del":
+                    db.execute("DELETE FROM notes WHERE id = ?", (record["id"],))
+            if next_id:
+                db.execute("UPDATE meta SET value = MAX(value, ?) WHERE key = 'next_id'", (next_id,))
+            self._appended += len(records)
+            if self._appended >= self.changes_kept // 10:
+                self._appended = 0
+                db.execute("DELETE FROM changes WHERE seq <= ?", (records[-1]["seq"] - self.changes_kept,))
+            db.execute("COMMIT")
+        except db.IntegrityError:
+            db.execute("ROLLBACK")
+            raise StorageConflict(f"seq {records[0]['seq']} ya escrito por otro proceso") from None
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def poll(self, seq: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Registros escritos por otros procesos después de `seq`, en orden.
+        Devuelve None si el log ya se recortó por encima de `seq` y hay que
+        releer el estado completo con `read_state`.
+        """
+        data_version = self._read_data_version()
+        if data_version == self._data_version:
+            return []
+        rows = self._db.execute("SELECT seq, record FROM changes WHERE seq > ? ORDER BY seq", (seq,)).fetchall()
+        self._data_version = data_version
+        if rows and rows[0][0] != seq + 1:
+            return None
+        return [loads(record) for _, record in rows]
+
+    def wants_snapshot(self) -> bool:
+        # La tabla `notes` ya es el estado compactado
+        return False
+
+    def snapshot(self, header: Dict[str, Any], notes: List[Dict[str, Any]]) -> None:
+        pass
+
+    def sync(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self._writer.close()
+        self._db.close()
+
+
+class EncodedBlocks:
+    """
+    JSON ya codificado de bloques sellados (sin los corchetes), con LRU
+    acotado en bytes. Un bloque no cambia nunca y su JSON tampoco, así que
+    tras un cambio volver a codificar todas las notas solo materializa los
+    bloques nuevos. La clave es el propio bloque: la caché lo mantiene vivo
+    hasta expulsarlo.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[NoteBlock, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, block: NoteBlock) -> bytes:
+        with self._lock:
+            encoded = self._entries.get(block)
+            if encoded is not None:
+                self._entries.move_to_end(block)
+                return encoded
+        encoded = dumps(block.materialize())[1:-1]
+        with self._lock:
+            if block not in self._entries and len(encoded) <= self.max_bytes:
+                self._entries[block] = encoded
+                self._size += len(encoded)
+                while self._size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+        return encoded
+
+
+encoded_blocks = EncodedBlocks()
+
+
+class Snapshot:
+    """
+    Las notas de una versión del store, inmutables: quien la tiene puede
+    recorrerla (en cualquier hilo, sin bloqueos) mientras el store sigue
+    cambiando, y nunca ve un cambio a medias.
+
+    Son los bloques inmutables del store (NoteBlock), compartidos entre
+    versiones, más una tupla con las notas del bloque abierto: publicar una
+    versión nueva cuesta O(n / CHUNK + CHUNK) y no copia la lista completa.
+    """
+
+    __slots__ = ("version", "chunks", "_count")
+
+    def __init__(self, version: int, chunks: Tuple[Sequence[Mapping[str, Any]], ...], count: int):
+        self.version = version
+        self.chunks = chunks
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Mapping[str, Any]]:
+        """Las notas en orden de inserción"""
+        return itertools.chain.from_iterable(self.chunks)
+
+    def latest(self, n: int) -> List[Mapping[str, Any]]:
+        """Las `n` notas más recientes, de la más nueva a la más antigua"""
+        newest = itertools.chain.from_iterable(reversed(chunk) for chunk in reversed(self.chunks))
+        return list(itertools.islice(newest, n))
+
+    def encode(self) -> bytes:
+        """Las notas como array JSON, codificado bloque a bloque (los sellados, desde EncodedBlocks)"""
+        encoded = (
+            encoded_blocks.get(chunk) if isinstance(chunk, NoteBlock) else dumps(chunk)[1:-1]
+            for chunk in self.chunks if chunk
+        )
+        return b"[" + b",".join(encoded) + b"]"
+
+
+class IdAllocator:
+    """Asigna IDs numéricos monótonos: nunca reutiliza un ID, ni siquiera tras borrar"""
+
+    def __init__(self, start: int = 1):
+        self._lock = threading.Lock()
+        self._next = start
+
+    @property
+    def next_id(self) -> int:
+        return self._next
+
+    def allocate(self) -> str:
+        with self._lock:
+            note_id = self._next
+            self._next += 1
+        return str(note_id)
+
+    def allocate_block(self, n: int) -> List[str]:
+        """Reserva `n` IDs consecutivos de una vez"""
+        with self._lock:
+            start = self._next
+            self._next += n
+        return [str(i) for i in range(start, start + n)]
+
+    def observe(self, note_id: str) -> None:
+        """Avanza el contador por encima de un ID ya existente (recuperación)"""
+        if note_id.isdigit():
+            with self._lock:
+                self._next = max(self._next, int(note_id) + 1)
+
+
+class NoteStore:
+    """
+    Notas en memoria respaldadas por un backend de almacenamiento.
+
+    Las notas se guardan en orden de inserción en bloques columnares
+    inmutables de CHUNK notas (columns.NoteBlock), más un bloque abierto con
+    las últimas, y un dict de ID a posición hace get y delete O(1). Lo que
+    devuelven get, all y latest son vistas de solo lectura (NoteView) que se
+    usan como el dict de la nota; solo se materializan dicts al serializar.
+    Con muchas bajas los bloques se recompactan.
+
+    Los índices secundarios se registran con `subscribe` y reciben cada
+    cambio de forma incremental a través de `notes_added(notes)` y
+    `notes_removed(notes)`.
+
+    `version` crece con cada cambio y los últimos `changes_kept` cambios se
+    conservan para que los clientes se pongan al día con deltas
+    (`changes_since`) en lugar de volver a descargar todas las notas.
+
+    Tras cada cambio se publica en `snapshot` la versión nueva como Snapshot
+    inmutable (copy-on-write por bloques): los lectores que necesitan todas
+    las notas la usan en lugar de copiarlas.
+    """
+
+    # Notas por bloque
+    CHUNK = 512
+
+    def __init__(self, storage=None, changes_kept: int = 1000):
+        self.storage = storage or MemoryStorage()
+        self.ids = IdAllocator()
+        self.codec = NoteCodec()
+        self._listeners: List[Any] = []
+        self._changes: deque = deque(maxlen=changes_kept)
+        self.version = 0
+        # Bloques sellados, bloque abierto (None = nota borrada) y posición de
+        # cada nota: bloque * CHUNK + posición dentro del bloque
+        self._chunks: List[NoteBlock] = []
+        self._tail: List[Optional[Mapping[str, Any]]] = []
+        self._where: Dict[str, int] = {}
+        self.snapshot = Snapshot(0, (), 0)
+
+    def open(self, seed: Optional[List[Dict[str, Any]]] = None) -> "NoteStore":
+        """Recupera el estado del backend; si está vacío, carga las notas semilla"""
+        with paused_gc():
+            state = self.storage.load()
+        if state is None:
+            for note in seed or []:
+                self.create(note)
+            return self
+
+        header, notes, records = state
+        self.version = header["seq"]
+        self.ids = IdAllocator(header.get("next_id", 1))
+        with paused_gc():
+            for note in notes:
+                self.ids.observe(note["id"])
+            self._rebuild(notes)
+            for record in records:
+                self._apply(record)
+                self.version = record["seq"]
+        self._publish_snapshot()
+        return self
+
+    def close(self) -> None:
+        self.storage.close()
+
+    def subscribe(self, listener: Any) -> Any:
+        """Registra un índice y lo alimenta con las notas existentes"""
+        self._listeners.append(listener)
+        # Un índice perezoso aún sin construir las leerá él mismo al construirse:
+        # no hace falta materializarlas ahora
+        if getattr(listener, "built", True):
+            with paused_gc():
+                listener.notes_added(self.all())
+        return listener
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, note_id: str) -> bool:
+        return note_id in self._where
+
+    def _iter(self) -> Iterator[Mapping[str, Any]]:
+        open_notes = (note for note in self._tail if note is not None)
+        return itertools.chain(itertools.chain.from_iterable(self._chunks), open_notes)
+
+    def all(self) -> List[Dict[str, Any]]:
+        """
+        Todas las notas en orden de inserción, como dicts nuevos: para
+        recorrerlas todas (construir un índice) materializar bloque a bloque
+        es más rápido que leer campo a campo de las vistas
+        """
+        notes: List[Dict[str, Any]] = []
+        for chunk in self._chunks:
+            notes.extend(chunk.materialize())
+        notes.extend(note if isinstance(note, dict) else dict(note) for note in self._tail if note is not None)
+        return notes
+
+    def get(self, note_id: str) -> Optional[Mapping[str, Any]]:
+        location = self._where.get(note_id)
+        if location is None:
+            return None
+        index, position = divmod(location, self.CHUNK)
+        if index == len(self._chunks):
+            return self._tail[position]
+        return NoteView(self._chunks[index], position)
+
+    def latest(self, n: int) -> List[Mapping[str, Any]]:
+        """Las `n` notas añadidas más recientemente, de la más nueva a la más antigua"""
+        open_notes = (note for note in reversed(self._tail) if note is not None)
+        sealed = itertools.chain.from_iterable(reversed(chunk) for chunk in reversed(self._chunks))
+        return list(itertools.islice(itertools.chain(open_notes, sealed), n))
+
+    def changes_since(self, version: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Cambios posteriores a `version` en orden, como
+        {"version", "op": "add", "note"} o {"version", "op": "remove", "id"}.
+        Devuelve None si `version` es demasiado antigua (o futura) para reconstruirse.
+        """
+        if version == self.version:
+            return []
+        if version > self.version or not self._changes:
+            return None
+        first = self._changes[0]["version"]
+        if first > version + 1:
+            return None
+        return list(itertools.islice(self._changes, version + 1 - first, None))
+
+    def refresh(self) -> None:
+        """
+        Aplica los cambios que otros procesos escribieron en un backend
+        compartido, a través de los mismos listeners que los cambios locales.
+        Con un backend local no hace nada.
+        """
+        records = self.storage.poll(self.version)
+        if records is None:
+            self._reload()
+            return
+        if not records:
+            # Nada nuevo (siempre, con un backend local): no se rehace la instantánea
+            return
+        self._publish(records)
+
+    def create(self, note: Dict[str, Any]) -> Dict[str, Any]:
+        """Añade una nota asignándole un ID nuevo"""
+        while True:
+            created = dict(note, id=self.ids.allocate())
+            try:
+                self._commit({"op": "put", "note": created})
+                return created
+            except StorageConflict:
+                # Otro worker escribió antes: ponerse al día (y con él, el contador de IDs)
+                self.refresh()
+
+    def create_many(self, notes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Añade un lote de notas con IDs consecutivos: una sola escritura en el
+        backend y una sola notificación a cada listener para todo el lote.
+        """
+        if not notes:
+            return []
+        while True:
+            ids = self.ids.allocate_block(len(notes))
+            created = [dict(note, id=note_id) for note, note_id in zip(notes, ids)]
+            try:
+                self._commit_many([{"op": "put", "note": note} for note in created])
+                return created
+            except StorageConflict:
+                self.refresh()
+
+    def delete(self, note_id: str) -> Optional[Mapping[str, Any]]:
+        """Elimina una nota; devuelve la nota eliminada o None si no existe"""
+        while True:
+            note = self.get(note_id)
+            if note is None:
+                return None
+            try:
+                self._commit({"op": "del", "id": note_id})
+                return note
+            except StorageConflict:
+                self.refresh()
+
+    def _commit(self, record: Dict[str, Any]) -> None:
+        self._commit_many([record])
+
+    def _commit_many(self, records: List[Dict[str, Any]]) -> None:
+        for seq, record in enumerate(records, self.version + 1):
+            record["seq"] = seq
+        self.storage.append(records)
+        self._committed(records)
+
+    async def commit_async(self, records: List[Dict[str, Any]]) -> None:
+        """
+        Como `_commit_many`, pero si el backend bloquea al escribir
+        (`storage.blocking`) la escritura va a otro hilo: mientras tanto el
+        bucle de eventos sigue atendiendo lecturas, que ven la versión anterior.
+        Solo debe usarla un escritor (WriteQueue): nadie más puede escribir
+        mientras espera, o los `seq` chocarían.
+        """
+        for seq, record in enumerate(records, self.version + 1):
+            record["seq"] = seq
+        if getattr(self.storage, "blocking", False):
+            await asyncio.to_thread(self.storage.append, records)
+        else:
+            self.storage.append(records)
+        self._committed(records)
+
+    def _committed(self, records: List[Dict[str, Any]]) -> None:
+        self._publish(records)
+        if self.storage.wants_snapshot():
+            header = {"seq": self.version, "next_id": self.ids.next_id}
+            self.storage.snapshot(header, self.snapshot)
+
+    def _publish(self, records: List[Dict[str, Any]]) -> None:
+        """
+        Aplica registros ya persistidos y los notifica a los listeners,
+        agrupando las altas y bajas consecutivas en una sola llamada.
+        Los registros ya aplicados (p. ej. por un `refresh` mientras se
+        escribían) se ignoran. El snapshot se publica antes de notificar:
+        un listener que lo consulte ya ve los cambios.
+        """
+        groups: List[Tuple[Optional[str], List[Dict[str, Any]]]] = []
+        batch: List[Dict[str, Any]] = []
+        batch_op = None
+        for record in records:
+            if record["seq"] <= self.version:
+                continue
+            note = self._apply(record)
+            self.version = record["seq"]
+            if note is None:
+                continue
+            if record["op"] == "put":
+                self._changes.append({"version": self.version, "op": "add", "note": note})
+            else:
+                self._changes.append({"version": self.version, "op": "remove", "id": note["id"]})
+            if record["op"] != batch_op:
+                groups.append((batch_op, batch))
+                batch, batch_op = [], record["op"]
+            batch.append(note)
+        groups.append((batch_op, batch))
+        self._publish_snapshot()
+        for op, notes in groups:
+            self._notify(op, notes)
+
+    def _notify(self, op: Optional[str], notes: List[Dict[str, Any]]) -> None:
+        if not notes:
+            return
+        for listener in self._listeners:
+            # Los cambios ya están persistidos y publicados: el fallo de un
+            # listener se registra, pero no impide avisar a los demás
+            try:
+                if op == "put":
+                    listener.notes_added(notes)
+                else:
+                    listener.notes_removed(notes)
+            except Exception:
+                logger.exception("Error notificando cambios a %s", type(listener).__name__)
+
+    def _reload(self) -> None:
+        """Relee el estado completo cuando el log compartido ya no cubre la versión local"""
+        header, notes, _ = self.storage.read_state()
+        fresh = {note["id"]: note for note in notes}
+        removed = [note for note in self._iter() if note["id"] not in fresh]
+        added = [note for note_id, note in fresh.items() if note_id not in self._where]
+        self.version = header["seq"]
+        self.ids.observe(str(header["next_id"] - 1))
+        self._rebuild(fresh.values())
+        self._publish_snapshot()
+        # Los deltas anteriores ya no son reconstruibles: los clientes recargarán
+        self._changes.clear()
+        self._notify("del", removed)
+        self._notify("put", added)
+
+    def _apply(self, record: Dict[str, Any]) -> Optional[Mapping[str, Any]]:
+        """Aplica un registro del log y devuelve la nota afectada"""
+        if record["op"] == "put":
+            note = record["note"]
+            location = self._where.get(note["id"])
+            if location is None:
+                self._where[note["id"]] = len(self._chunks) * self.CHUNK + len(self._tail)
+                self._append(note)
+            else:
+                self._replace(location, note)
+            self.ids.observe(note["id"])
+            return note
+        if record["op"] == "del":
+            location = self._where.pop(record["id"], None)
+            if location is None:
+                return None
+            return self._remove(location)
+        return None
+
+    # Bloques
+
+    def _append(self, note: Mapping[str, Any]) -> None:
+        self._tail.append(note)
+        if len(self._tail) == self.CHUNK:
+            self._chunks.append(NoteBlock.build(self.codec, self._tail))
+            self._tail = []
+
+    def _replace(self, location: int, note: Mapping[str, Any]) -> None:
+        index, position = divmod(location, self.CHUNK)
+        if index == len(self._chunks):
+            self._tail[position] = note
+        else:
+            self._chunks[index] = self._chunks[index].replace(position, note)
+
+    def _remove(self, location: int) -> Mapping[str, Any]:
+        """Quita la nota de `location` y la devuelve (una vista del bloque anterior, que no cambia)"""
+        index, position = divmod(location, self.CHUNK)
+        if index == len(self._chunks):
+            note = self._tail[position]
+            self._tail[position] = None
+        else:
+            block = self._chunks[index]
+            note = block.view(position)
+            self._chunks[index] = block.without(position)
+        # Con muchas bajas quedan bloques con huecos: recompactar de vez en cuando
+        if len(self._chunks) * self.CHUNK + len(self._tail) > 2 * len(self._where) + 8 * self.CHUNK:
+            self._rebuild(self._iter())
+        return note
+
+    def _rebuild(self, notes: Iterable[Mapping[str, Any]]) -> None:
+        """Rehace todos los bloques con `notes` en orden (arranque, recarga, compactación)"""
+        chunks: List[NoteBlock] = []
+        tail: List[Optional[Mapping[str, Any]]] = []
+        where: Dict[str, int] = {}
+        for note in notes:
+            where[note["id"]] = len(chunks) * self.CHUNK + len(tail)
+            tail.append(note)
+            if len(tail) == self.CHUNK:
+                chunks.append(NoteBlock.build(self.codec, tail))
+                tail = []
+        self._chunks, self._tail, self._where = chunks, tail, where
+
+    def _publish_snapshot(self) -> None:
+        # Una sola asignación: un lector ve la versión anterior o la nueva, nunca una mezcla
+        chunks: Tuple[Sequence[Mapping[str, Any]], ...] = tuple(self._chunks)
+        open_notes = tuple(note for note in self._tail if note is not None)
+        if open_notes:
+            chunks += (open_notes,)
+        self.snapshot = Snapshot(self.version, chunks, len(self._where))
+
+
+class WriteQueue:
+    """
+    Escritor único del store para el servidor async.
+
+    Las escrituras se encolan y una sola tarea las aplica en orden de
+    llegada. Las que se acumulan mientras se escribe un lote forman el
+    lote siguiente, que va al backend en un solo `append` (group commit);
+    con un backend que bloquea, ese append se hace fuera del bucle de
+    eventos y las lecturas siguen atendiéndose con la versión anterior.
+
+    Los IDs se asignan al preparar el lote; si otro worker escribió antes
+    (StorageConflict), el store se pone al día y el lote se prepara de nuevo.
+    La tarea solo existe mientras hay escrituras pendientes.
+    """
+
+    def __init__(self, store: "NoteStore", max_batch: int = 1000):
+        self.store = store
+        self.max_batch = max_batch
+        self._pending: deque = deque()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    # Los argumentos se validan al encolar: uno inválido dentro del lote
+    # haría fallar también las escrituras de los demás
+
+    async def create(self, note: Dict[str, Any]) -> Dict[str, Any]:
+        """Añade una nota asignándole un ID nuevo"""
+        return (await self.create_many([note]))[0]
+
+    async def create_many(self, notes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Añade un lote de notas con IDs consecutivos"""
+        if not notes:
+            return []
+        if not all(isinstance(note, dict) for note in notes):
+            raise TypeError("Cada nota debe ser un diccionario")
+        return await self._submit("create", notes)
+
+    async def delete(self, note_id: str) -> Optional[Dict[str, Any]]:
+        """Elimina una nota; devuelve la nota eliminada o None si no existe"""
+        if not isinstance(note_id, str):
+            raise TypeError(f"El ID de nota debe ser un texto, no {type(note_id).__name__}")
+        return await self._submit("delete", note_id)
+
+    async def join(self) -> None:
+        """Espera a que se apliquen todas las escrituras pendientes"""
+        while self._task is not None:
+            await asyncio.shield(self._task)
+
+    def _submit(self, op: str, payload: Any) -> "asyncio.Future[Any]":
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((op, payload, future))
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return future
+
+    async def _run(self) -> None:
+        try:
+            while self._pending:
+                count = min(len(self._pending), self.max_batch)
+                batch = [self._pending.popleft() for _ in range(count)]
+                try:
+                    results = await self._commit(batch)
+                except Exception as exc:
+                    for _, _, future in batch:
+                        if not future.done():
+                            future.set_exception(exc)
+                    continue
+                for (_, _, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            self._task = None
+
+    async def _commit(self, batch: List[Tuple[str, Any, Any]]) -> List[Any]:
+        store = self.store
+        while True:
+            records: List[Dict[str, Any]] = []
+            results: List[Any] = []
+            # Efecto de las operaciones anteriores del mismo lote: id -> nota (o None si se borró)
+            overlay: Dict[str, Optional[Dict[str, Any]]] = {}
+            for op, payload, _ in batch:
+                if op == "create":
+                    ids = store.ids.allocate_block(len(payload))
+                    created = [dict(note, id=note_id) for note, note_id in zip(payload, ids)]
+                    records.extend({"op": "put", "note": note} for note in created)
+                    overlay.update((note["id"], note) for note in created)
+                    results.append(created)
+                else:
+                    note = overlay[payload] if payload in overlay else store.get(payload)
+                    if note is not None:
+                        records.append({"op": "del", "id": payload})
+                        overlay[payload] = None
+                    results.append(note)
+            if not records:
+                return results
+            try:
+                await store.commit_async(records)
+                return results
+            except StorageConflict:
+                store.refresh()
+
+
+def create_store_from_env() -> NoteStore:
+    """
+    Crea el store según la configuración:
+        NOTES_SQLITE_PATH       base SQLite compartida (necesaria con varios workers)
+        NOTES_DATA_DIR          directorio de datos (sin él, las notas viven solo en memoria)
+        NOTES_FSYNC_INTERVAL_MS ventana de group commit entre hilos en ms (0 = fsync en cada lote)
+        NOTES_SNAPSHOT_EVERY    registros del log entre snapshots
+    """
+    sqlite_path = os.environ.get("NOTES_SQLITE_PATH")
+    if sqlite_path:
+        return NoteStore(SQLiteStorage(sqlite_path))
+    data_dir = os.environ.get("NOTES_DATA_DIR")
+    if not data_dir:
+        return NoteStore()
+    return NoteStore(LogStorage(
+        data_dir,
+        fsync_interval=float(os.environ.get("NOTES_FSYNC_INTERVAL_MS", "0")) / 1000,
+        snapshot_every=int(os.environ.get("NOTES_SNAPSHOT_EVERY", "10000")),
+    ))
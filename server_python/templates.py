@@ -0,0 +1,145 @@
+"""
+Plantillas de los widgets compilados en dist/
+Se buscan y preparan una vez y se recargan cuando cambia el fichero (un nuevo `npm run build`)
+"""
+
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+import aiofiles
+
+from .admission import SingleFlight
+from .rendering import WidgetTemplate, compile_widget
+
+# (mtime, tamaño, inodo): un build nuevo cambia al menos uno
+FileStamp = Tuple[int, int, int]
+
+
+def file_stamp(path: Path) -> Optional[FileStamp]:
+    """Huella del fichero para saber si ha cambiado, o None si ya no existe"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def find_widget_file(directory: Path, widget_name: str) -> Tuple[Optional[Path], List[Path]]:
+    """HTML compilado del widget (o None) y las rutas donde se ha buscado"""
+    # Buscar en directorios comunes donde puede estar el widget
+    possible_paths = [
+        directory / f"{widget_name}.html",
+        directory / widget_name / "index.html",
+        directory / "src" / widget_name / "index.html",
+    ]
+
+    # También buscar recursivamente por si está en otra ubicación
+    html_files = list(directory.glob(f"**/*{widget_name}*/index.html"))
+    possible_paths.extend(html_files)
+
+    # Buscar archivos que contengan el nombre del widget
+    html_files_by_name = list(directory.glob(f"**/{widget_name}*.html"))
+    possible_paths.extend(html_files_by_name)
+
+    # Encontrar el primer archivo que existe
+    for path in possible_paths:
+        if path.exists() and path.is_file():
+            return path, possible_paths
+    return None, possible_paths
+
+
+def widget_not_found_html(directory: Path, widget_name: str, possible_paths: List[Path]) -> str:
+    """Página de error con las rutas buscadas y los HTML disponibles en dist/"""
+    # Mostrar rutas para debug
+    all_html = list(directory.glob("**/*.html"))
+    return f"""
+        <div style="padding: 20px; font-family: monospace; background: #fee; border: 2px solid #f00; border-radius: 8px;">
+            <h3>❌ Widget '{widget_name}' no encontrado</h3>
+            <p><strong>Directorio base:</strong> {directory}</p>
+            <p><strong>Rutas buscadas:</strong></p>
+            <ul style="background: #fff; padding: 10px; border-radius: 4px;">
+                {''.join(f'<li>{p}</li>' for p in possible_paths[:3])}
+            </ul>
+            <p><strong>Archivos HTML disponibles:</strong></p>
+            <ul style="background: #fff; padding: 10px; border-radius: 4px;">
+                {''.join(f'<li>{f.relative_to(directory)}</li>' for f in all_html) if all_html else '<li>Ninguno encontrado</li>'}
+            </ul>
+            <p><strong>✅ Solución:</strong> Ejecuta <code>npm run build</code></p>
+        </div>
+        """
+
+
+class TemplateCache:
+    """
+    Plantilla preparada (`WidgetTemplate`) de un widget de `directory`. Se
+    busca y se compila una sola vez; después, como mucho una vez cada
+    `check_interval` segundos, un stat del fichero dice si hay que recargarla
+    (y si ha desaparecido, se vuelve a buscar). Sin build, `get` devuelve
+    None y se sigue buscando en cada comprobación, así que el widget aparece
+    en cuanto se ejecuta `npm run build`, sin reiniciar.
+
+    `generation` cambia con cada recarga: lo renderizado con una plantilla
+    vieja se tira aunque las notas no hayan cambiado.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        widget_name: str,
+        base_url: str,
+        check_interval: float = 1.0,
+        run: Optional[Callable[..., Awaitable[Any]]] = None,
+    ):
+        self.directory = directory
+        self.widget_name = widget_name
+        self.base_url = base_url
+        self.check_interval = check_interval
+        # Dónde compilar la plantilla (p. ej. `offload.run_pure`); por defecto, en el bucle
+        self._run = run
+        self.path: Optional[Path] = None
+        self.stamp: Optional[FileStamp] = None
+        self.template: Optional[WidgetTemplate] = None
+        self.searched: List[Path] = []
+        self.generation = 0
+        self._next_check = 0.0
+        self._loads = SingleFlight()
+
+    async def get(self) -> Optional[WidgetTemplate]:
+        """La plantilla al día, o None si no hay build del widget"""
+        if time.monotonic() < self._next_check:
+            return self.template
+        template, _ = await self._loads.do(None, self._refresh)
+        return template
+
+    async def missing_page(self) -> str:
+        """HTML de error para cuando no se encuentra el widget"""
+        return await asyncio.to_thread(widget_not_found_html, self.directory, self.widget_name, self.searched)
+
+    async def _refresh(self) -> Optional[WidgetTemplate]:
+        stamp = file_stamp(self.path) if self.path is not None else None
+        if stamp is None or stamp != self.stamp:
+            if stamp is None:
+                self.path, self.searched = await asyncio.to_thread(find_widget_file, self.directory, self.widget_name)
+                stamp = file_stamp(self.path) if self.path is not None else None
+            template = None
+            if stamp is not None:
+                try:
+                    template = await self._load(self.path)
+                except OSError:
+                    # Borrado a medias de un build: se vuelve a buscar en la próxima comprobación
+                    self.path = stamp = None
+            if template is not None or self.template is not None:
+                self.generation += 1
+            self.stamp, self.template = stamp, template
+        self._next_check = time.monotonic() + self.check_interval
+        return self.template
+
+    async def _load(self, path: Path) -> WidgetTemplate:
+        async with aiofiles.open(path, encoding="utf-8") as f:
+            html_content = await f.read()
+        if self._run is None:
+            return compile_widget(html_content, self.base_url)
+        return await self._run(compile_widget, html_content, self.base_url)
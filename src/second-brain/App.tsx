@@ -1,4 +1,4 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { Badge } from "@openai/apps-sdk-ui/components/Badge";
 import { Button } from "@openai/apps-sdk-ui/components/Button";
 import { Calendar, Circle } from "@openai/apps-sdk-ui/components/Icon";
@@ -12,19 +12,75 @@ interface Note {
   tags?: string[];
 }
 
+type NoteChange =
+  | { version: number; op: "add"; note: Note }
+  | { version: number; op: "remove"; id: string };
+
+// structuredContent de las herramientas: lista completa, delta desde baseVersion
+// o `reset` (el delta ya no está disponible: hay que recargar las notas)
+interface NotesOutput {
+  notes?: Note[];
+  version?: number;
+  baseVersion?: number;
+  changes?: NoteChange[];
+  nextCursor?: string | null;
+  reset?: boolean;
+}
+
+// Tamaño máximo de página que admiten get_notes y GET /notes
+const PAGE_LIMIT = 1000;
+
+// Páginas siguientes de get_notes a partir de `cursor`, hasta la última
+async function remainingToolPages(cursor: string): Promise<Note[]> {
+  const notes: Note[] = [];
+  let next: string | null | undefined = cursor;
+  while (next) {
+    const res = await window.openai!.callTool!("get_notes", { cursor: next, limit: PAGE_LIMIT });
+    const page: NotesOutput = res?.structuredContent ?? res;
+    notes.push(...(page?.notes ?? []));
+    next = page?.nextCursor;
+  }
+  return notes;
+}
+
+// Todas las notas por REST, siguiendo X-Next-Cursor hasta la última página
+async function fetchAllNotes(notesUrl: string): Promise<Note[]> {
+  const notes: Note[] = [];
+  let cursor: string | null = null;
+  do {
+    const query: string = `?limit=${PAGE_LIMIT}` + (cursor ? `&cursor=${encodeURIComponent(cursor)}` : "");
+    const res: Response = await fetch(notesUrl + query);
+    notes.push(...((await res.json()) as Note[]));
+    cursor = res.headers.get("X-Next-Cursor");
+  } while (cursor);
+  return notes;
+}
+
 // Extender el tipo Window para incluir openai
 declare global {
   interface Window {
     __NOTES_DATA__?: Note[];
+    __NOTES_VERSION__?: number;
+    __NOTES_CHANGES_URL__?: string;
     openai?: {
-      toolOutput?: {
-        notes?: Note[];
-      };
+      toolOutput?: NotesOutput;
       callTool?: (name: string, args: any) => Promise<any>;
     };
   }
 }
 
+function applyChanges(notes: Note[], changes: NoteChange[]): Note[] {
+  let result = notes;
+  for (const change of changes) {
+    if (change.op === "add") {
+      result = [...result.filter((n) => n.id !== change.note.id), change.note];
+    } else {
+      result = result.filter((n) => n.id !== change.id);
+    }
+  }
+  return result;
+}
+
 const categoryColors = {
   technology: "info" as const,
   learning: "success" as const,
@@ -66,12 +122,29 @@ const defaultNotes: Note[] = [
   },
 ];
 
+// La salida trae todas las notas: ni es solo la primera página ni pide recargar
+function isCompleteList(output?: NotesOutput): output is NotesOutput & { notes: Note[] } {
+  return !!output?.notes && !output.nextCursor && !output.reset;
+}
+
+function initialVersion(): number {
+  if (typeof window === "undefined") return -1;
+  const output = window.openai?.toolOutput;
+  if (isCompleteList(output)) return output.version ?? -1;
+  if (window.__NOTES_DATA__) return window.__NOTES_VERSION__ ?? -1;
+  return output?.notes && !output.reset ? output.version ?? -1 : -1;
+}
+
 export function App() {
   // Inicializar desde window.openai.toolOutput o __NOTES_DATA__ o defaults
   const [notes, setNotes] = useState<Note[]>(() => {
     if (typeof window !== "undefined") {
-      const data = window.openai?.toolOutput?.notes ||
+      // Una página de get_notes (o un `reset`) no es la lista completa: mejor
+      // __NOTES_DATA__, que sí lo es; sin él, la página se completa al montar
+      const output = window.openai?.toolOutput;
+      const data = (isCompleteList(output) && output.notes) ||
         window.__NOTES_DATA__ ||
+        (!output?.reset && output?.notes) ||
         defaultNotes;
       console.log('Second Brain App: Initializing with notes', data);
       return data;
@@ -79,13 +152,91 @@ export function App() {
     return defaultNotes;
   });
 
+  // Versión del store que reflejan las notas locales (-1 = desconocida)
+  const versionRef = useRef<number>(initialVersion());
+
+  // Recargar las notas cuando la versión local ya no admite deltas (si llega
+  // la lista completa, handleOutput pide el resto de páginas)
+  const resync = (version?: number) => {
+    if (window.openai?.callTool) {
+      window.openai
+        .callTool("get_notes", { since: versionRef.current, limit: PAGE_LIMIT })
+        .then((res) => handleOutput(res?.structuredContent ?? res))
+        .catch((err) => console.error("Second Brain: resync failed", err));
+      return;
+    }
+
+    // Fuera de ChatGPT (página /widget): pedir la lista por REST
+    const changesUrl = window.__NOTES_CHANGES_URL__;
+    if (!changesUrl || version === undefined) return;
+    fetchAllNotes(changesUrl.replace(/\/changes$/, ""))
+      .then((data) => {
+        versionRef.current = version;
+        setNotes(data);
+      })
+      .catch((err) => console.error("Second Brain: resync failed", err));
+  };
+
+  const handleOutput = (output?: NotesOutput) => {
+    if (!output) return;
+
+    if (output.reset) {
+      if (output.version !== undefined && output.version <= versionRef.current) return; // Ya al día
+      resync(output.version);
+      return;
+    }
+
+    if (output.changes && output.baseVersion !== undefined && output.version !== undefined) {
+      if (output.version <= versionRef.current) return; // Ya aplicado
+
+      if (output.baseVersion === versionRef.current) {
+        const changes = output.changes;
+        versionRef.current = output.version;
+        setNotes((current) => applyChanges(current, changes));
+        return;
+      }
+
+      // Versión local demasiado antigua para aplicar el delta: pedir lo que falta
+      resync();
+      return;
+    }
+
+    if (output.notes) {
+      const version = output.version ?? -1;
+      if (output.nextCursor) {
+        // Solo la primera página: sustituir la lista con ella perdería las demás notas
+        if (!window.openai?.callTool) {
+          resync(output.version);
+          return;
+        }
+        const first = output.notes;
+        remainingToolPages(output.nextCursor)
+          .then((rest) => {
+            if (version >= 0 && versionRef.current > version) return; // Ya llegó algo más nuevo
+            versionRef.current = version;
+            setNotes([...first, ...rest]);
+          })
+          .catch((err) => console.error("Second Brain: loading notes failed", err));
+        return;
+      }
+      versionRef.current = version;
+      setNotes(output.notes);
+    }
+  };
+
+  // Aplicar la salida inicial si es un delta o un reset, o completarla si es
+  // una página sin __NOTES_DATA__ (la lista completa ya se usó arriba)
+  useEffect(() => {
+    const output = window.openai?.toolOutput;
+    if (output?.changes || output?.reset || (output?.nextCursor && !window.__NOTES_DATA__)) {
+      handleOutput(output);
+    }
+  }, []);
+
   // Escuchar eventos de actualización desde ChatGPT
   useEffect(() => {
     const handleSetGlobals = (event: any) => {
-      const globals = event.detail?.globals;
-      if (globals?.toolOutput?.notes) {
-        setNotes(globals.toolOutput.notes);
-      }
+      handleOutput(event.detail?.globals?.toolOutput);
     };
 
     window.addEventListener("openai:set_globals", handleSetGlobals);
@@ -95,6 +246,23 @@ export function App() {
     };
   }, []);
 
+  // Cambios hechos desde otras conversaciones o clientes, en tiempo real (SSE)
+  useEffect(() => {
+    const changesUrl = window.__NOTES_CHANGES_URL__;
+    if (!changesUrl || typeof EventSource === "undefined") return;
+
+    const since = versionRef.current >= 0 ? `?since=${versionRef.current}` : "";
+    const source = new EventSource(changesUrl + since);
+    source.addEventListener("changes", (event) => {
+      handleOutput(JSON.parse((event as MessageEvent).data));
+    });
+    source.addEventListener("reset", (event) => {
+      resync(JSON.parse((event as MessageEvent).data).version);
+    });
+
+    return () => source.close();
+  }, []);
+
   return (
     <div className="w-full max-w-2xl">
       <div className="rounded-2xl border border-default bg-surface shadow-lg p-6">
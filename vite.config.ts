@@ -1,8 +1,39 @@
 import react from '@vitejs/plugin-react';
-import { defineConfig } from 'vite';
+import { readFileSync, writeFileSync } from 'node:fs';
+import { join } from 'node:path';
+import { brotliCompressSync, constants, gzipSync } from 'node:zlib';
+import { defineConfig, type Plugin } from 'vite';
+
+const COMPRESSIBLE = /\.(js|mjs|css|html|svg|json|txt)$/;
+const MIN_SIZE = 1024;
+
+// Genera junto a cada fichero del build sus variantes .br y .gz (niveles máximos:
+// se comprime una sola vez) para que el servidor las sirva por Accept-Encoding
+function precompress(): Plugin {
+  return {
+    name: 'precompress',
+    apply: 'build',
+    writeBundle(options, bundle) {
+      const outDir = options.dir ?? 'dist';
+      for (const fileName of Object.keys(bundle)) {
+        if (!COMPRESSIBLE.test(fileName)) continue;
+        const filePath = join(outDir, fileName);
+        const data = readFileSync(filePath);
+        if (data.length < MIN_SIZE) continue;
+        writeFileSync(`${filePath}.br`, brotliCompressSync(data, {
+          params: {
+            [constants.BROTLI_PARAM_QUALITY]: constants.BROTLI_MAX_QUALITY,
+            [constants.BROTLI_PARAM_SIZE_HINT]: data.length,
+          },
+        }));
+        writeFileSync(`${filePath}.gz`, gzipSync(data, { level: 9 }));
+      }
+    },
+  };
+}
 
 export default defineConfig({
-  plugins: [react()],
+  plugins: [react(), precompress()],
   server: {
     port: 5173,
     cors: true,
@@ -28,4 +59,3 @@ export default defineConfig({
     }
   }
 });
-